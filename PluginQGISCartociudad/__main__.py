@@ -0,0 +1,7 @@
+# Permite ejecutar la geocodificación por lotes sin QGIS: python -m PluginQGISCartociudad geocode entrada.csv salida.gpkg
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
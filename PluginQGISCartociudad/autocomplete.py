@@ -0,0 +1,170 @@
+# Sugerencias mientras se escribe en el campo de localización a partir del servicio candidates o, si se puede,
+# del nomenclátor sin conexión
+
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from qgis.PyQt.QtCore import QObject, QTimer, QStringListModel
+from qgis.PyQt.QtWidgets import QCompleter, QLineEdit
+
+from .compat import CompatQt as CQt
+from .network import GeocoderResponse, LatestRequest
+from .core import Candidate, GeocoderError, candidates_url, parse_candidates
+
+
+# Declaración de constantes
+DELAY_MS = 300
+MIN_PREFIX = 3
+SUGGESTION_LIMIT = 10
+CACHE_ENTRIES = 256
+
+
+# Texto en minúsculas, sin tildes y con los espacios normalizados
+def _fold(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ' '.join(''.join(c for c in text if not unicodedata.combining(c)).split())
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r'\w+', _fold(text))
+
+
+# Indica si cada palabra escrita es el principio de alguna palabra de la sugerencia
+def _matches(suggestion: str, typed_words: List[str]) -> bool:
+    words = _words(suggestion)
+    return all(any(word.startswith(typed) for word in words) for typed in typed_words)
+
+
+# Sugerencias ya recibidas por texto buscado (y filtros aplicados), con expulsión LRU.
+# Si un texto más corto devolvió menos sugerencias que el límite, la lista estaba completa
+# y las de cualquier texto que lo amplíe se obtienen filtrándola sin volver a preguntar al servicio
+class SuggestionCache:
+    def __init__(self, max_entries: int = CACHE_ENTRIES, limit: int = SUGGESTION_LIMIT) -> None:
+        self.max_entries = max_entries
+        self.limit = limit
+        self._entries: 'OrderedDict[Tuple[str, str], List[str]]' = OrderedDict()
+
+    def put(self, text: str, params: str, suggestions: List[str]) -> None:
+        key = (_fold(text), params)
+        self._entries[key] = suggestions
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # Devuelve (sugerencias, completa). completa=False indica que son provisionales y conviene preguntar
+    def get(self, text: str, params: str) -> Tuple[Optional[List[str]], bool]:
+        folded = _fold(text)
+        exact = self._entries.get((folded, params))
+        if exact is not None:
+            self._entries.move_to_end((folded, params))
+            return exact, True
+
+        # Prefijo más largo ya consultado
+        for end in range(len(folded) - 1, 0, -1):
+            suggestions = self._entries.get((folded[:end], params))
+            if suggestions is None:
+                continue
+            typed_words = _words(folded)
+            refined = [s for s in suggestions if _matches(s, typed_words)]
+            return refined, len(suggestions) < self.limit
+        return None, False
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Autocompletado del QLineEdit: espera a que el usuario deje de escribir, exige un mínimo de
+# caracteres, cancela la petición anterior si ha quedado superada y sirve lo posible desde la caché
+class LocationCompleter(QObject):
+    def __init__(
+        self,
+        line_edit: QLineEdit,
+        params_provider: Callable[[], Optional[str]],
+        local_provider: Optional[Callable[[str], Optional[List[Candidate]]]] = None
+    ) -> None:
+        super().__init__(line_edit)
+        self.line_edit = line_edit
+        self.params_provider = params_provider
+        self.local_provider = local_provider
+        self.cache = SuggestionCache()
+        self.request = LatestRequest()
+
+        self.model = QStringListModel(self)
+        self.completer = QCompleter(self.model, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.setCaseSensitivity(CQt.CaseInsensitive)
+        self.completer.setMaxVisibleItems(SUGGESTION_LIMIT)
+        line_edit.setCompleter(self.completer)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DELAY_MS)
+        self.timer.timeout.connect(self.suggest)
+        # textEdited solo se emite al escribir, no al elegir una sugerencia ni con setText
+        line_edit.textEdited.connect(self.on_text_edited)
+
+    def on_text_edited(self, text: str) -> None:
+        self.request.abort()
+        if len(text.strip()) < MIN_PREFIX:
+            self.timer.stop()
+            self._show([])
+            return
+        self.timer.start()
+
+    # Busca sugerencias para el texto actual: desde la caché si está completa y, si no, en el servicio
+    def suggest(self) -> None:
+        text = self.line_edit.text().strip()
+        params = self.params_provider()
+        if len(text) < MIN_PREFIX or params is None:
+            return
+
+        # Si la búsqueda se puede responder sin conexión no hace falta esperar al servicio
+        candidates = self.local_provider(text) if self.local_provider is not None else None
+        if candidates:
+            self._show(self._addresses(candidates)[:SUGGESTION_LIMIT])
+            return
+
+        suggestions, complete = self.cache.get(text, params)
+        if suggestions is not None:
+            self._show(suggestions)
+            if complete:
+                return
+
+        url = candidates_url(text, params, SUGGESTION_LIMIT)
+        self.request.get(url, lambda reply, t=text, p=params: self.on_suggestions(reply, t, p))
+
+    def on_suggestions(self, reply: GeocoderResponse, text: str, params: str) -> None:
+        if not reply.ok():
+            return
+        try:
+            candidates = parse_candidates(reply.data)
+        except GeocoderError:
+            return
+        suggestions = self._addresses(candidates)
+        self.cache.put(text, params, suggestions)
+        # Solo se muestran si el texto no ha cambiado mientras llegaba la respuesta
+        if self.line_edit.text().strip() == text:
+            self._show(suggestions)
+
+    @staticmethod
+    def _addresses(candidates: List[Candidate]) -> List[str]:
+        suggestions = []
+        for candidate in candidates:
+            if candidate.address and candidate.address not in suggestions:
+                suggestions.append(candidate.address)
+        return suggestions
+
+    def _show(self, suggestions: List[str]) -> None:
+        self.model.setStringList(suggestions)
+        if suggestions and self.line_edit.hasFocus():
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+
+    # Cancela las sugerencias pendientes, por ejemplo al lanzar la búsqueda completa
+    def cancel(self) -> None:
+        self.timer.stop()
+        self.request.abort()
+        self.completer.popup().hide()
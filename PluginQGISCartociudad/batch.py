@@ -0,0 +1,582 @@
+# Geocodificación por lotes (directa desde un CSV o capa vectorial e inversa desde una capa de puntos)
+
+import csv
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from qgis.PyQt.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QRadioButton, QComboBox,
+    QSpinBox, QProgressBar, QLabel, QPushButton, QMessageBox, QButtonGroup
+)
+from qgis.PyQt.QtCore import QObject, QMetaType, pyqtSignal
+
+from qgis.gui import QgsFileWidget, QgsMapLayerComboBox, QgsFieldComboBox
+from qgis.core import (
+    Qgis, QgsProject, QgsVectorLayer, QgsFeature, QgsFields, QgsField, QgsGeometry,
+    QgsWkbTypes, QgsCoordinateReferenceSystem, QgsCoordinateTransform
+)
+
+from .errors import _get_error_message
+from .layers import result_field
+from .network import GeocoderResponse, geocoder_client
+from .core import (
+    DEFAULT_MAX_IN_FLIGHT, MAX_CONCURRENCY, RESULT_FIELDS, REVERSE_RESULT_FIELDS, GeocoderError, candidates_url,
+    find_url, parse_candidates, parse_location, result_values
+)
+
+
+# Declaración de constantes
+WRITE_CHUNK = 200
+PointRow = Tuple[int, List[Any], QgsGeometry, Optional[float], Optional[float]]
+
+
+# Detecta el delimitador mirando solo la cabecera del CSV
+def _sniff_delimiter(path: str) -> str:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        first = f.readline()
+    return ';' if first.count(';') > first.count(',') else ','
+
+
+# Devuelve los nombres de columna de un CSV
+def read_csv_header(path: str) -> List[str]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f, delimiter=_sniff_delimiter(path))
+        header = next(reader, [])
+    return [h.strip() for h in header]
+
+
+# Cuenta las filas de datos de un CSV sin cargarlo en memoria
+def count_csv_rows(path: str) -> int:
+    with open(path, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+# Recorre el CSV fila a fila devolviendo (dirección, valores de la fila)
+def iter_csv_rows(path: str, column: str) -> Iterator[Tuple[str, List[Any]]]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f, delimiter=_sniff_delimiter(path))
+        header = [h.strip() for h in next(reader, [])]
+        col_index = header.index(column)
+        for row in reader:
+            if not row:
+                continue
+            row = row + [''] * (len(header) - len(row))
+            yield row[col_index].strip(), row[:len(header)]
+
+
+# Recorre las entidades de una capa devolviendo (dirección, atributos)
+def iter_layer_rows(layer: QgsVectorLayer, column: str) -> Iterator[Tuple[str, List[Any]]]:
+    col_index = layer.fields().indexOf(column)
+    for feature in layer.getFeatures():
+        attrs = feature.attributes()
+        # Los atributos nulos llegan como NULL (no como None): se tratan como dirección vacía, igual que en Processing
+        yield str(attrs[col_index] or '').strip(), attrs
+
+
+# Reduce la geometría de find a un punto para que todos los resultados quepan en una sola capa. La usan también
+# los algoritmos de Processing
+def to_point(geom: QgsGeometry) -> QgsGeometry:
+    if geom.isNull() or geom.isEmpty():
+        return geom
+    if QgsWkbTypes.flatType(geom.wkbType()) == QgsWkbTypes.Point:
+        return geom
+    return geom.pointOnSurface()
+
+
+# Base común de los procesos por lotes: mantiene un número máximo de peticiones simultáneas,
+# cuenta el progreso y escribe los resultados en bloques
+class BatchRunner(QObject):
+    progress = pyqtSignal(int, int, float)
+    finished = pyqtSignal(int, int)
+
+    def __init__(self, rows: Iterator[Any], total: int, concurrency: int = DEFAULT_MAX_IN_FLIGHT) -> None:
+        super().__init__()
+        self.rows = rows
+        self.total = total
+        self.concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+        self.in_flight: Dict[int, Any] = {}
+        self.done = 0
+        self.located = 0
+        self.pending_writes = 0
+        self.next_row = 0
+        self.exhausted = False
+        self.cancelled = False
+        self.started_at = 0.0
+
+    # Arranca el proceso llenando las peticiones simultáneas permitidas
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._pump()
+
+    # Cancela el proceso, aborta las peticiones pendientes y guarda lo ya procesado
+    def cancel(self) -> None:
+        if self.cancelled:
+            return
+        self.cancelled = True
+        for reply in list(self.in_flight.values()):
+            reply.abort()
+        self.in_flight.clear()
+        self._finish()
+
+    # Lanza nuevas filas mientras haya hueco en la cola de peticiones
+    def _pump(self) -> None:
+        while not self.cancelled and not self.exhausted and len(self.in_flight) < self.concurrency:
+            try:
+                item = next(self.rows)
+            except StopIteration:
+                self.exhausted = True
+                break
+            row_id = self.next_row
+            self.next_row += 1
+            self._dispatch(row_id, item)
+
+        if not self.cancelled and self.exhausted and not self.in_flight:
+            self._finish()
+
+    # Lanza la petición de una fila; la implementa cada tipo de proceso
+    def _dispatch(self, row_id: int, item: Any) -> None:
+        raise NotImplementedError
+
+    # Hace una petición asociada a una fila y la registra como pendiente
+    def _request(self, row_id: int, url: str, handler: Callable[[GeocoderResponse], None]) -> None:
+        self.in_flight[row_id] = geocoder_client().get(url, handler)
+
+    # Comprueba si la respuesta de una fila sigue siendo esperada y la retira de las pendientes
+    def _accept(self, row_id: int) -> bool:
+        return not self.cancelled and self.in_flight.pop(row_id, None) is not None
+
+    # Marca una fila como terminada, vacía el búfer si está lleno y notifica el progreso
+    def _row_done(self, located: bool) -> None:
+        self.done += 1
+        self.pending_writes += 1
+        if located:
+            self.located += 1
+        if self.pending_writes >= WRITE_CHUNK:
+            self._flush()
+            self.pending_writes = 0
+        elapsed = time.monotonic() - self.started_at
+        self.progress.emit(self.done, self.total, self.done / elapsed if elapsed > 0 else 0.0)
+
+    # Escribe de una vez los resultados acumulados; la implementa cada tipo de proceso
+    def _flush(self) -> None:
+        raise NotImplementedError
+
+    def _finish(self) -> None:
+        self._flush()
+        self.finished.emit(self.done, self.located)
+
+
+# Texto breve del error de red para guardarlo en el campo de estado
+def _error_state(reply: GeocoderResponse) -> str:
+    return f'error: {_get_error_message(reply.error).splitlines()[0]}'
+
+
+# Interpreta una respuesta correcta con la función del núcleo indicada, o None si no lo es
+def _parse(reply: GeocoderResponse, parser: Callable[[bytes], Any]) -> Any:
+    if not reply.ok():
+        return None
+    try:
+        return parser(reply.data)
+    except GeocoderError:
+        return None
+
+
+# Geocodificación por lotes: candidates + find por fila sobre una única capa de salida
+class BatchGeocoder(BatchRunner):
+    def __init__(
+        self,
+        rows: Iterator[Tuple[str, List[Any]]],
+        total: int,
+        output_layer: QgsVectorLayer,
+        filter_params: str = '',
+        concurrency: int = DEFAULT_MAX_IN_FLIGHT
+    ) -> None:
+        super().__init__(rows, total, concurrency)
+        self.layer = output_layer
+        self.fields = output_layer.fields()
+        self.filter_params = filter_params
+        self.buffer: List[QgsFeature] = []
+
+    def _dispatch(self, row_id: int, item: Tuple[str, List[Any]]) -> None:
+        address, attrs = item
+        if not address:
+            self._write(row_id, attrs, 'sin_direccion')
+            return
+        url = candidates_url(address, self.filter_params, 1)
+        self._request(row_id, url, lambda r, i=row_id, a=attrs: self._on_candidates(i, a, r))
+
+    # Recibe el mejor candidato de una fila y pide su localización completa
+    def _on_candidates(self, row_id: int, attrs: List[Any], reply: GeocoderResponse) -> None:
+        if not self._accept(row_id):
+            return
+        candidates = _parse(reply, parse_candidates)
+        if not candidates:
+            self._write(row_id, attrs, 'sin_resultados' if reply.ok() else _error_state(reply))
+            self._pump()
+            return
+
+        url = find_url(candidates[0].id, candidates[0].type)
+        self._request(row_id, url, lambda r, i=row_id, a=attrs: self._on_find(i, a, r))
+
+    # Recibe la localización de una fila y la añade a la capa de salida
+    def _on_find(self, row_id: int, attrs: List[Any], reply: GeocoderResponse) -> None:
+        if not self._accept(row_id):
+            return
+        location = _parse(reply, parse_location)
+        if location and location.geom:
+            self._write(row_id, attrs, 'ok', location.raw)
+        else:
+            self._write(row_id, attrs, 'sin_geometria' if reply.ok() else _error_state(reply))
+        self._pump()
+
+    # Prepara la entidad de salida y la deja en el búfer de escritura
+    def _write(
+        self,
+        row_id: int,
+        attrs: List[Any],
+        estado: str,
+        location: Optional[Dict[str, Any]] = None
+    ) -> None:
+        location = location or {}
+        feature = QgsFeature(self.fields)
+        if location.get('geom'):
+            feature.setGeometry(to_point(QgsGeometry.fromWkt(location['geom'])))
+        feature.setAttributes([row_id] + list(attrs) + [estado] + result_values(location, RESULT_FIELDS))
+        self.buffer.append(feature)
+        self._row_done(estado == 'ok')
+
+    # Escribe de una vez las entidades acumuladas
+    def _flush(self) -> None:
+        if self.buffer:
+            self.layer.dataProvider().addFeatures(self.buffer)
+            self.buffer = []
+            self.layer.updateExtents()
+            self.layer.triggerRepaint()
+
+
+# Recorre las entidades de una capa de puntos devolviendo (id, atributos, geometría, lon, lat) con lon/lat
+# en EPSG:4326, usando una única transformación de coordenadas para toda la capa
+def iter_layer_points(layer: QgsVectorLayer) -> Iterator[PointRow]:
+    transform = QgsCoordinateTransform(
+        layer.crs(), QgsCoordinateReferenceSystem.fromEpsgId(4326), QgsProject.instance()
+    )
+    for feature in layer.getFeatures():
+        geom = feature.geometry()
+        if geom is None or geom.isNull() or geom.isEmpty():
+            yield feature.id(), feature.attributes(), geom, None, None
+            continue
+        point = geom.centroid().asPoint() if geom.isMultipart() else geom.asPoint()
+        point = transform.transform(point)
+        yield feature.id(), feature.attributes(), geom, point.x(), point.y()
+
+
+# Geocodificación inversa por lotes de una capa de puntos, escribiendo el resultado
+# en campos nuevos de la propia capa o en una capa nueva
+class BatchReverseGeocoder(BatchRunner):
+    def __init__(
+        self,
+        rows: Iterator[PointRow],
+        total: int,
+        source_layer: QgsVectorLayer,
+        output_layer: Optional[QgsVectorLayer] = None,
+        concurrency: int = DEFAULT_MAX_IN_FLIGHT
+    ) -> None:
+        super().__init__(rows, total, concurrency)
+        self.source = source_layer
+        self.output = output_layer
+        self.fields = output_layer.fields() if output_layer is not None else None
+        self.buffer: List[QgsFeature] = []
+        self.changes: Dict[int, Dict[int, Any]] = {}
+        if output_layer is None:
+            self.result_indexes = [source_layer.fields().indexOf(name) for name in REVERSE_RESULT_FIELDS]
+
+    def _dispatch(self, row_id: int, item: PointRow) -> None:
+        lon, lat = item[3], item[4]
+        if lon is None or lat is None:
+            self._write(item, 'sin_geometria')
+            return
+        # Los puntos a menos de la tolerancia de uno ya resuelto se sirven desde la caché espacial sin ir a la red
+        self.in_flight[row_id] = geocoder_client().get_reverse(
+            lon, lat, lambda r, i=row_id, it=item: self._on_reverse(i, it, r)
+        )
+
+    # Recibe la dirección de un punto y la guarda
+    def _on_reverse(self, row_id: int, item: PointRow, reply: GeocoderResponse) -> None:
+        if not self._accept(row_id):
+            return
+        location = _parse(reply, parse_location)
+        if location:
+            self._write(item, 'ok', location.raw)
+        else:
+            self._write(item, 'sin_resultados' if reply.ok() else _error_state(reply))
+        self._pump()
+
+    # Prepara el resultado de un punto y lo deja en el búfer de escritura
+    def _write(self, item: PointRow, estado: str, data: Optional[Dict[str, Any]] = None) -> None:
+        fid, attrs, geom = item[0], item[1], item[2]
+        values = [estado] + result_values(data or {}, REVERSE_RESULT_FIELDS)
+        if self.output is None:
+            self.changes[fid] = dict(zip(self.result_indexes, values))
+        else:
+            feature = QgsFeature(self.fields)
+            feature.setGeometry(geom)
+            feature.setAttributes(list(attrs) + values)
+            self.buffer.append(feature)
+        self._row_done(estado == 'ok')
+
+    # Escribe de una vez los resultados acumulados
+    def _flush(self) -> None:
+        if self.changes:
+            self.source.dataProvider().changeAttributeValues(self.changes)
+            self.changes = {}
+            self.source.triggerRepaint()
+        if self.buffer:
+            self.output.dataProvider().addFeatures(self.buffer)
+            self.buffer = []
+            self.output.updateExtents()
+            self.output.triggerRepaint()
+
+
+# Crea la capa de salida con los campos de entrada más los campos del resultado
+def create_output_layer(
+    name: str,
+    input_fields: QgsFields,
+    result_fields: List[str] = RESULT_FIELDS,
+    geometry: str = "Point",
+    crs: Optional[QgsCoordinateReferenceSystem] = None,
+    row_field: bool = True
+) -> QgsVectorLayer:
+    layer = QgsVectorLayer(geometry, name, "memory")
+    layer.setCrs(crs if crs is not None else QgsCoordinateReferenceSystem.fromEpsgId(4326))
+    fields = QgsFields()
+    if row_field:
+        fields.append(QgsField('fila', QMetaType.Type.Int))
+    for field in input_fields:
+        fields.append(QgsField(field))
+    for name_field in result_fields:
+        fields.append(result_field(name_field))
+    layer.dataProvider().addAttributes(fields)
+    layer.updateFields()
+    return layer
+
+
+# Añade a una capa los campos del resultado que le falten. Devuelve False si la capa no admite cambios
+def add_result_fields(layer: QgsVectorLayer, result_fields: List[str]) -> bool:
+    provider = layer.dataProvider()
+    caps = provider.capabilities()
+    if not (caps & Qgis.VectorProviderCapability.AddAttributes) or \
+            not (caps & Qgis.VectorProviderCapability.ChangeAttributeValues):
+        return False
+    missing = [
+        result_field(name)
+        for name in result_fields
+        if layer.fields().indexOf(name) < 0
+    ]
+    if missing:
+        provider.addAttributes(missing)
+        layer.updateFields()
+    return True
+
+
+# Base de los dialogos por lotes: concurrencia, barra de progreso y botones de iniciar, cancelar y cerrar
+class BatchDialog(QDialog):
+    def __init__(self, title: str, parent=None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.runner: Optional[BatchRunner] = None
+
+        self.main_layout = QVBoxLayout(self)
+        self.form = QFormLayout()
+        self.main_layout.addLayout(self.form)
+
+    # Añade los controles comunes debajo del formulario propio de cada dialogo
+    def add_run_controls(self) -> None:
+        self.concurrency = QSpinBox()
+        self.concurrency.setRange(1, MAX_CONCURRENCY)
+        # Por defecto, el límite de peticiones simultáneas de la configuración (sin límite: el valor por defecto)
+        self.concurrency.setValue(geocoder_client().max_in_flight or DEFAULT_MAX_IN_FLIGHT)
+        self.form.addRow("Peticiones simultáneas:", self.concurrency)
+
+        self.progress_bar = QProgressBar()
+        self.main_layout.addWidget(self.progress_bar)
+        self.status_label = QLabel("")
+        self.main_layout.addWidget(self.status_label)
+
+        buttons_layout = QHBoxLayout()
+        self.btn_start = QPushButton("Iniciar")
+        self.btn_start.clicked.connect(self.start)
+        buttons_layout.addWidget(self.btn_start)
+        self.btn_cancel = QPushButton("Cancelar")
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.clicked.connect(self.cancel)
+        buttons_layout.addWidget(self.btn_cancel)
+        btn_close = QPushButton("Cerrar")
+        btn_close.clicked.connect(self.close)
+        buttons_layout.addWidget(btn_close)
+        self.main_layout.addLayout(buttons_layout)
+
+    # Prepara el proceso; la implementa cada dialogo
+    def start(self) -> None:
+        raise NotImplementedError
+
+    # Conecta el proceso con la barra de progreso y lo arranca
+    def run(self, runner: BatchRunner) -> None:
+        self.progress_bar.setRange(0, max(runner.total, 1))
+        self.progress_bar.setValue(0)
+        self.btn_start.setEnabled(False)
+        self.btn_cancel.setEnabled(True)
+
+        self.runner = runner
+        self.runner.progress.connect(self.on_progress)
+        self.runner.finished.connect(self.on_finished)
+        self.runner.start()
+
+    def cancel(self) -> None:
+        if self.runner is not None:
+            self.runner.cancel()
+
+    # Actualiza la barra de progreso y el contador de filas por segundo
+    def on_progress(self, done: int, total: int, rate: float) -> None:
+        self.progress_bar.setValue(done)
+        self.status_label.setText(f"{done} de {total} filas ({rate:.1f} filas/s)")
+
+    def on_finished(self, done: int, located: int) -> None:
+        self.btn_start.setEnabled(True)
+        self.btn_cancel.setEnabled(False)
+        estado = "cancelado" if self.runner is not None and self.runner.cancelled else "terminado"
+        self.status_label.setText(f"Proceso {estado}: {done} filas procesadas, {located} localizadas.")
+        self.runner = None
+
+    # Cancela el proceso si se cierra el dialogo con peticiones pendientes
+    def closeEvent(self, event) -> None:
+        self.cancel()
+        super().closeEvent(event)
+
+
+# Dialogo para configurar y seguir la geocodificación por lotes
+class BatchGeocodeDialog(BatchDialog):
+    def __init__(self, filter_params_provider: Callable[[], Optional[str]], parent=None) -> None:
+        super().__init__("Geocodificación por lotes", parent)
+        self.filter_params_provider = filter_params_provider
+
+        self.radio_csv = QRadioButton("Archivo CSV")
+        self.radio_layer = QRadioButton("Capa vectorial")
+        self.radio_csv.setChecked(True)
+        source_group = QButtonGroup(self)
+        source_group.addButton(self.radio_csv)
+        source_group.addButton(self.radio_layer)
+        source_layout = QHBoxLayout()
+        source_layout.addWidget(self.radio_csv)
+        source_layout.addWidget(self.radio_layer)
+        self.form.addRow("Origen:", source_layout)
+
+        self.file_widget = QgsFileWidget()
+        self.file_widget.setFilter("CSV (*.csv *.txt)")
+        self.file_widget.fileChanged.connect(self.on_file_changed)
+        self.form.addRow("CSV:", self.file_widget)
+
+        self.csv_column = QComboBox()
+        self.form.addRow("Columna de dirección (CSV):", self.csv_column)
+
+        self.layer_combo = QgsMapLayerComboBox()
+        self.layer_combo.setFilters(Qgis.LayerFilter.VectorLayer)
+        self.form.addRow("Capa:", self.layer_combo)
+
+        self.layer_column = QgsFieldComboBox()
+        self.layer_column.setLayer(self.layer_combo.currentLayer())
+        self.layer_combo.layerChanged.connect(self.layer_column.setLayer)
+        self.form.addRow("Campo de dirección (capa):", self.layer_column)
+
+        self.add_run_controls()
+
+    # Rellena el desplegable de columnas al elegir un CSV
+    def on_file_changed(self, path: str) -> None:
+        self.csv_column.clear()
+        try:
+            self.csv_column.addItems(read_csv_header(path))
+        except (OSError, UnicodeDecodeError) as e:
+            QMessageBox.warning(self, "Error", f"No se pudo leer el CSV: {e}")
+
+    # Prepara el origen de datos y arranca la geocodificación
+    def start(self) -> None:
+        filter_params = self.filter_params_provider()
+        if filter_params is None:
+            return
+
+        if self.radio_csv.isChecked():
+            path = self.file_widget.filePath()
+            column = self.csv_column.currentText()
+            if not path or not column:
+                QMessageBox.warning(self, "Campos incompletos", "Seleccione un CSV y la columna de dirección.")
+                return
+            input_fields = QgsFields()
+            for name in read_csv_header(path):
+                input_fields.append(QgsField(name, QMetaType.Type.QString))
+            rows = iter_csv_rows(path, column)
+            total = count_csv_rows(path)
+        else:
+            layer = self.layer_combo.currentLayer()
+            column = self.layer_column.currentField()
+            if layer is None or not column:
+                QMessageBox.warning(self, "Campos incompletos", "Seleccione una capa y el campo de dirección.")
+                return
+            input_fields = layer.fields()
+            rows = iter_layer_rows(layer, column)
+            total = layer.featureCount()
+
+        output = create_output_layer("Geocodificacion_lote", input_fields)
+        QgsProject.instance().addMapLayer(output)
+
+        self.run(BatchGeocoder(rows, total, output, filter_params, self.concurrency.value()))
+
+
+# Dialogo para configurar y seguir la geocodificación inversa por lotes de una capa de puntos
+class BatchReverseDialog(BatchDialog):
+    def __init__(self, parent=None) -> None:
+        super().__init__("Geocodificación inversa por lotes", parent)
+
+        self.layer_combo = QgsMapLayerComboBox()
+        self.layer_combo.setFilters(Qgis.LayerFilter.PointLayer)
+        self.form.addRow("Capa de puntos:", self.layer_combo)
+
+        self.radio_new_layer = QRadioButton("Crear capa nueva")
+        self.radio_in_place = QRadioButton("Añadir campos a la capa")
+        self.radio_new_layer.setChecked(True)
+        output_group = QButtonGroup(self)
+        output_group.addButton(self.radio_new_layer)
+        output_group.addButton(self.radio_in_place)
+        output_layout = QHBoxLayout()
+        output_layout.addWidget(self.radio_new_layer)
+        output_layout.addWidget(self.radio_in_place)
+        self.form.addRow("Resultado:", output_layout)
+
+        self.add_run_controls()
+
+    # Prepara la capa de salida y arranca la geocodificación inversa
+    def start(self) -> None:
+        layer = self.layer_combo.currentLayer()
+        if layer is None:
+            QMessageBox.warning(self, "Campos incompletos", "Seleccione una capa de puntos.")
+            return
+
+        output = None
+        if self.radio_in_place.isChecked():
+            if not add_result_fields(layer, REVERSE_RESULT_FIELDS):
+                QMessageBox.warning(
+                    self, "¡Atención!",
+                    "La capa no permite añadir ni modificar campos. Elija crear una capa nueva."
+                )
+                return
+        else:
+            output = create_output_layer(
+                f"{layer.name()}_reverse",
+                layer.fields(),
+                REVERSE_RESULT_FIELDS,
+                QgsWkbTypes.displayString(layer.wkbType()),
+                layer.crs(),
+                row_field=False
+            )
+            QgsProject.instance().addMapLayer(output)
+
+        rows = iter_layer_points(layer)
+        self.run(BatchReverseGeocoder(rows, layer.featureCount(), layer, output, self.concurrency.value()))
@@ -0,0 +1,254 @@
+# Consulta sin conexión de la unidad administrativa (municipio, provincia y comunidad autónoma) de un punto a partir
+# de un paquete con los polígonos de los límites administrativos. El paquete se construye con los polígonos que
+# devuelve find para cada unidad de los CSV de los filtros
+
+import os
+from typing import Any, Dict, List, Optional
+
+from qgis.PyQt.QtCore import QMetaType
+from qgis.core import (
+    QgsApplication, QgsVectorLayer, QgsVectorFileWriter, QgsSpatialIndex, QgsGeometry, QgsPoint, QgsRectangle,
+    QgsFeature, QgsFeatureSink, QgsField, QgsFields, QgsWkbTypes, QgsFeatureRequest,
+    QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsCoordinateTransformContext, QgsProject
+)
+
+from .filters import load_local_table
+
+
+# Declaración de constantes
+BOUNDARY_PACK_FILE = 'limites_administrativos.gpkg'
+
+# Capa del paquete para cada nivel (con el nombre del grupo de capas de find para ese tipo), sus campos de nombre
+# y código, las claves de la respuesta de CartoCiudad en las que se devuelven y, para construirlo, el tipo de
+# elemento del servicio y el CSV de filtros y su columna de código
+BOUNDARY_LEVELS = [
+    {
+        'layer': 'Municipios', 'name': 'nombre', 'code': 'codigo', 'key': 'muni', 'code_key': 'muniCode',
+        'type': 'municipio', 'filter': 'municipio', 'column': 'ine_mun'
+    },
+    {
+        'layer': 'Provincias', 'name': 'nombre', 'code': 'codigo', 'key': 'province', 'code_key': 'provinceCode',
+        'type': 'provincia', 'filter': 'provincia', 'column': 'ine_prov'
+    },
+    {
+        'layer': 'Comunidades_sim', 'name': 'nombre', 'code': 'codigo',
+        'key': 'comunidadAutonoma', 'code_key': 'comunidadAutonomaCode',
+        'type': 'comunidad autonoma', 'filter': 'comunidad_autonoma', 'column': 'id_com'
+    },
+]
+
+
+# Directorio del perfil donde se guarda el paquete construido
+def boundaries_dir() -> str:
+    return os.path.join(QgsApplication.qualifiedSettingsDirPath(), 'cartociudad', 'limites')
+
+
+def boundary_pack_path() -> str:
+    return os.path.join(boundaries_dir(), BOUNDARY_PACK_FILE)
+
+
+# Unidad administrativa de los CSV de filtros que hay que pedir a find; filters acota la búsqueda de los municipios
+# a su provincia, porque hay muchos nombres repetidos
+class BoundaryUnit:
+    __slots__ = ('name', 'code', 'filters')
+
+    def __init__(self, name: str, code: str, filters: Optional[Dict[str, List[str]]] = None) -> None:
+        self.name = name
+        self.code = code
+        self.filters = filters
+
+
+# Unidades de un nivel a partir de la tabla de su filtro. Devuelve una lista vacía si no hay CSV
+def boundary_units(config: Dict[str, str]) -> List[BoundaryUnit]:
+    table = load_local_table(config['filter'])
+    if table is None or config['column'] not in table.columns:
+        return []
+    provinces: Dict[str, str] = {}
+    if config['filter'] == 'municipio':
+        provincia = load_local_table('provincia')
+        if provincia is not None:
+            provinces = provincia.display_by('ine_prov')
+    units = []
+    for row in range(table.row_count):
+        name = table.value(table.display_column, row)
+        code = table.value(config['column'], row)
+        if not name or not code:
+            continue
+        province = provinces.get(table.value('ine_prov', row)) if provinces else None
+        units.append(BoundaryUnit(name, code, {'provincia': [province]} if province else None))
+    return units
+
+
+# Escribe el paquete nivel a nivel en un archivo temporal, que sustituye al destino solo al terminar (commit),
+# de modo que un paquete a medio construir nunca reemplaza al anterior
+class BoundaryPackWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.tmp_path = path + '.part.gpkg'
+        self.writer: Optional[QgsVectorFileWriter] = None
+        self.fields = QgsFields()
+        self.layers = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    # Crea la capa de un nivel; la anterior se cierra
+    def start_level(self, config: Dict[str, str]) -> None:
+        self._close_writer()
+        self.fields = QgsFields()
+        self.fields.append(QgsField(config['name'], QMetaType.Type.QString))
+        self.fields.append(QgsField(config['code'], QMetaType.Type.QString))
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.layerName = config['layer']
+        options.actionOnExistingFile = (
+            QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteLayer if self.layers
+            else QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteFile
+        )
+        self.writer = QgsVectorFileWriter.create(
+            self.tmp_path, self.fields, QgsWkbTypes.Type.MultiPolygon,
+            QgsCoordinateReferenceSystem.fromEpsgId(4326), QgsCoordinateTransformContext(), options
+        )
+        if self.writer.hasError() != QgsVectorFileWriter.WriterError.NoError:
+            raise OSError(self.writer.errorMessage())
+        self.layers += 1
+
+    def add(self, name: str, code: str, geom: QgsGeometry) -> None:
+        geom.convertToMultiType()
+        feature = QgsFeature(self.fields)
+        feature.setGeometry(geom)
+        feature.setAttributes([name, code])
+        self.writer.addFeature(feature, QgsFeatureSink.Flag.FastInsert)
+
+    # Cierra el archivo temporal y lo mueve al destino
+    def commit(self) -> None:
+        self._close_writer()
+        os.replace(self.tmp_path, self.path)
+
+    # Descarta el archivo temporal si no se ha llegado a commit
+    def close(self) -> None:
+        self._close_writer()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def _close_writer(self) -> None:
+        if self.writer is not None:
+            # El archivo se termina de escribir al destruir el escritor
+            del self.writer
+            self.writer = None
+
+
+# Polígonos de un nivel en EPSG:4326 con su índice espacial. Los motores de geometría preparada se crean la primera
+# vez que un punto cae en la envolvente de cada polígono, y se prueba antes que ninguno el último polígono acertado,
+# porque los puntos de una capa suelen llegar agrupados por zonas
+class BoundaryLevel:
+    __slots__ = ('key', 'code_key', 'index', 'geometries', 'engines', 'names', 'codes', 'last')
+
+    def __init__(self, layer: QgsVectorLayer, config: Dict[str, str]) -> None:
+        self.key = config['key']
+        self.code_key = config['code_key']
+        self.index = QgsSpatialIndex()
+        self.geometries: List[QgsGeometry] = []
+        self.engines: List[Any] = []
+        self.names: List[str] = []
+        self.codes: List[str] = []
+        self.last = -1
+
+        fields = layer.fields()
+        name_index = fields.indexOf(config['name'])
+        code_index = fields.indexOf(config['code'])
+        transform = None
+        if layer.crs() != QgsCoordinateReferenceSystem.fromEpsgId(4326):
+            transform = QgsCoordinateTransform(
+                layer.crs(), QgsCoordinateReferenceSystem.fromEpsgId(4326), QgsProject.instance()
+            )
+
+        request = QgsFeatureRequest().setSubsetOfAttributes([i for i in (name_index, code_index) if i >= 0])
+        for feature in layer.getFeatures(request):
+            geom = feature.geometry()
+            if geom is None or geom.isEmpty():
+                continue
+            if transform is not None:
+                geom.transform(transform)
+            slot = len(self.geometries)
+            self.geometries.append(geom)
+            self.engines.append(None)
+            self.names.append(str(feature[name_index]) if name_index >= 0 else '')
+            self.codes.append(str(feature[code_index]) if code_index >= 0 else '')
+            self.index.addFeature(slot, geom.boundingBox())
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def _contains(self, slot: int, point: QgsPoint) -> bool:
+        engine = self.engines[slot]
+        if engine is None:
+            engine = QgsGeometry.createGeometryEngine(self.geometries[slot].constGet())
+            engine.prepareGeometry()
+            self.engines[slot] = engine
+        return engine.intersects(point)
+
+    # Posición del polígono que contiene el punto, o -1 si no está en ninguno
+    def locate(self, x: float, y: float) -> int:
+        point = QgsPoint(x, y)
+        last = self.last
+        if last >= 0 and self._contains(last, point):
+            return last
+        for slot in self.index.intersects(QgsRectangle(x, y, x, y)):
+            if slot != last and self._contains(slot, point):
+                self.last = slot
+                return slot
+        return -1
+
+
+# Índice de todos los niveles del paquete
+class BoundaryIndex:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.levels: List[BoundaryLevel] = []
+        for config in BOUNDARY_LEVELS:
+            layer = QgsVectorLayer(f"{path}|layername={config['layer']}", config['layer'], 'ogr')
+            if not layer.isValid():
+                print(f"El paquete de límites {path} no tiene la capa {config['layer']}")
+                continue
+            self.levels.append(BoundaryLevel(layer, config))
+            print(f"Límites cargados: {config['layer']} ({len(self.levels[-1])} polígonos)")
+
+    def is_empty(self) -> bool:
+        return not any(len(level) for level in self.levels)
+
+    # Municipio, provincia y comunidad autónoma (nombre y código, con las claves de CartoCiudad) de un punto en
+    # EPSG:4326. Devuelve None si el punto no está en ninguna unidad
+    def lookup(self, x: float, y: float) -> Optional[Dict[str, str]]:
+        result: Dict[str, str] = {}
+        for level in self.levels:
+            slot = level.locate(x, y)
+            if slot >= 0:
+                result[level.key] = level.names[slot]
+                result[level.code_key] = level.codes[slot]
+        return result or None
+
+
+_boundary_index: Optional[BoundaryIndex] = None
+
+
+# Índice del paquete del perfil, cargado la primera vez que se usa. Devuelve None si no se ha construido
+def boundary_index(path: Optional[str] = None) -> Optional[BoundaryIndex]:
+    global _boundary_index
+    path = path or boundary_pack_path()
+    if _boundary_index is not None and _boundary_index.path == path:
+        return _boundary_index
+    if not os.path.exists(path):
+        return None
+    index = BoundaryIndex(path)
+    if index.is_empty():
+        return None
+    _boundary_index = index
+    return index
+
+
+# Descarta el índice cargado, por ejemplo tras construir un paquete nuevo o al descargar el plugin
+def clear_boundary_index() -> None:
+    global _boundary_index
+    _boundary_index = None
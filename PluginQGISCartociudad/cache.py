@@ -0,0 +1,155 @@
+# Caché persistente en SQLite de las respuestas de candidates, find y reverseGeocode
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit, parse_qsl, urlencode, quote
+
+
+# Declaración de constantes
+CACHED_ENDPOINTS = ('candidates', 'find', 'reverseGeocode')
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_MB = 100
+
+
+# Normaliza la URL para que la misma petición escrita de formas distintas comparta entrada:
+# esquema y servidor en minúsculas, parámetros ordenados y valores sin espacios sobrantes
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    params = sorted(
+        (key, ' '.join(value.split()))
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+    )
+    query = urlencode(params, quote_via=quote, safe=',')
+    return f'{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}?{query}'
+
+
+# Indica si la URL corresponde a uno de los servicios que se guardan en caché
+def is_cacheable(url: str) -> bool:
+    path = urlsplit(url).path.rstrip('/')
+    return path.rsplit('/', 1)[-1] in CACHED_ENDPOINTS
+
+
+# Caché clave-valor con caducidad (TTL) y expulsión LRU cuando supera el tamaño máximo
+class ResponseCache:
+    def __init__(
+        self,
+        path: str,
+        ttl_days: float = DEFAULT_TTL_DAYS,
+        max_mb: float = DEFAULT_MAX_MB
+    ) -> None:
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, body BLOB NOT NULL, created REAL NOT NULL, '
+            'accessed REAL NOT NULL, size INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    # Devuelve la respuesta guardada para la URL, o None si no existe o ha caducado
+    def get(self, url: str) -> Optional[bytes]:
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT body, created, size FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            body, created, size = row
+            if self.ttl > 0 and now - created > self.ttl:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                self._size -= size
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return bytes(body)
+
+    # Guarda la respuesta de la URL y expulsa las entradas menos usadas si se supera el tamaño máximo
+    def put(self, url: str, body: bytes) -> None:
+        key = normalize_url(url)
+        now = time.time()
+        size = len(body) + len(key)
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if old is not None:
+                self._size -= old[0]
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, body, created, accessed, size) VALUES (?, ?, ?, ?, ?)',
+                (key, sqlite3.Binary(body), now, now, size)
+            )
+            self._size += size
+            if self.max_bytes > 0 and self._size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._conn.commit()
+
+    # Elimina las entradas con acceso más antiguo hasta bajar del tamaño objetivo
+    def _evict(self, target: int) -> None:
+        rows = self._conn.execute('SELECT key, size FROM responses ORDER BY accessed').fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    # Vacía la caché y reinicia las estadísticas
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.execute('DELETE FROM stats')
+            self._conn.commit()
+            self._conn.execute('VACUUM')
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    # Acumula los aciertos y fallos de la sesión en las estadísticas guardadas
+    def save_stats(self) -> None:
+        with self._lock:
+            for name, value in (('hits', self.hits), ('misses', self.misses)):
+                self._conn.execute(
+                    'INSERT INTO stats (name, value) VALUES (?, ?) '
+                    'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                    (name, value)
+                )
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    # Devuelve el número de entradas, el tamaño y los aciertos/fallos (sesión actual más sesiones anteriores)
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            saved = dict(self._conn.execute('SELECT name, value FROM stats').fetchall())
+        return {
+            'entries': entries,
+            'bytes': self._size,
+            'hits': self.hits + saved.get('hits', 0),
+            'misses': self.misses + saved.get('misses', 0),
+        }
+
+    def close(self) -> None:
+        self.save_stats()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,399 @@
+# Geocodificación por lotes desde la línea de comandos, sin QGIS:
+#
+#     python -m PluginQGISCartociudad geocode entrada.csv salida.gpkg --column direccion
+#
+# Lee el CSV fila a fila, usa el mismo núcleo que el plugin (core.Geocoder) y escribe el resultado por
+# bloques en un GeoPackage o un CSV. Tras cada bloque guarda un punto de control junto a la salida, de
+# modo que con --resume un proceso interrumpido continúa donde se quedó
+
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from .cache import ResponseCache, DEFAULT_TTL_DAYS, DEFAULT_MAX_MB
+from .core import (
+    DEFAULT_MAX_IN_FLIGHT, DEFAULT_RATE, DEFAULT_TIMEOUT_MS, ELEMENT_TYPES, RESULT_FIELDS,
+    BatchResult, Geocoder, Location, bounded_map, filter_params, result_values, value_type
+)
+
+
+# Declaración de constantes
+ADDRESS_COLUMNS = ('direccion', 'dirección', 'address', 'localizacion', 'localización')
+ROW_FIELD = 'fila'
+BATCH_SIZE = 500
+PROGRESS_SECONDS = 10.0
+CHECKPOINT_SUFFIX = '.checkpoint'
+WKB_POINT = 1
+SQL_TYPES = {bool: 'BOOLEAN', int: 'INTEGER', float: 'REAL', str: 'TEXT'}
+GPKG_APPLICATION_ID = 0x47504B47
+GPKG_USER_VERSION = 10400
+WGS84_WKT = (
+    'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+    'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]'
+)
+
+
+class CliError(Exception):
+    pass
+
+
+# Coordenadas (lon, lat) de una localización: lng/lat del servicio o, si faltan, el primer vértice de geom
+def location_point(location: Optional[Location]) -> Optional[Tuple[float, float]]:
+    if location is None:
+        return None
+    try:
+        return float(location.get('lng')), float(location.get('lat'))
+    except (TypeError, ValueError):
+        pass
+    match = re.search(r'\(+\s*(-?[\d.]+(?:[eE][-+]?\d+)?)\s+(-?[\d.]+(?:[eE][-+]?\d+)?)', location.geom or '')
+    if match is None:
+        return None
+    return float(match.group(1)), float(match.group(2))
+
+
+# Lee la cabecera de un CSV detectando el separador y devuelve (cabecera, lector de filas)
+def open_csv(stream: TextIO, delimiter: Optional[str] = None) -> Tuple[List[str], Iterator[List[str]]]:
+    first = stream.readline()
+    if not first:
+        raise CliError('El archivo de entrada está vacío')
+    if delimiter is None:
+        delimiter = ';' if first.count(';') > first.count(',') else ','
+    header = [h.replace('\ufeff', '').strip() for h in next(csv.reader([first], delimiter=delimiter))]
+    return header, csv.reader(stream, delimiter=delimiter)
+
+
+# Columna con las direcciones: la indicada o, si no, la primera con un nombre habitual
+def address_column(header: List[str], column: Optional[str]) -> int:
+    lower = [h.lower() for h in header]
+    names = [column] if column else ADDRESS_COLUMNS
+    for name in names:
+        if name.lower() in lower:
+            return lower.index(name.lower())
+    raise CliError(f"No se encontró la columna de direcciones. Columnas disponibles: {header}. Use --column")
+
+
+# Salida en GeoPackage escrita con sqlite3: una tabla de puntos en EPSG:4326 con las columnas de la
+# entrada, la fila de origen y los campos cc_*. Cada commit() confirma un bloque en una transacción
+class GeoPackageWriter:
+    def __init__(self, path: str, layer: str, columns: List[str], resume_from: Optional[int] = None) -> None:
+        self.layer = layer
+        self.columns = columns
+        self.bounds: Optional[List[float]] = None
+        self._conn = sqlite3.connect(path)
+        if resume_from is None:
+            self._create()
+        else:
+            self._conn.execute(f'DELETE FROM {_quote(layer)} WHERE {_quote(ROW_FIELD)} >= ?', (resume_from,))
+            self._conn.commit()
+            extent = self._conn.execute(
+                'SELECT min_x, min_y, max_x, max_y FROM gpkg_contents WHERE table_name = ?', (layer,)
+            ).fetchone()
+            if extent is not None and None not in extent:
+                self.bounds = list(extent)
+        names = ', '.join(_quote(c) for c in ['geom'] + columns)
+        marks = ', '.join('?' for _ in range(len(columns) + 1))
+        self._insert = f'INSERT INTO {_quote(layer)} ({names}) VALUES ({marks})'
+
+    def _create(self) -> None:
+        conn = self._conn
+        conn.execute(f'PRAGMA application_id = {GPKG_APPLICATION_ID}')
+        conn.execute(f'PRAGMA user_version = {GPKG_USER_VERSION}')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (
+                srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+                organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT
+            );
+            CREATE TABLE IF NOT EXISTS gpkg_contents (
+                table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+                description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE,
+                srs_id INTEGER REFERENCES gpkg_spatial_ref_sys(srs_id)
+            );
+            CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (
+                table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+                srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+                PRIMARY KEY (table_name, column_name)
+            );
+        ''')
+        conn.executemany('INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)', [
+            ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', None),
+            ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', None),
+            ('WGS 84 geodetic', 4326, 'EPSG', 4326, WGS84_WKT, None),
+        ])
+        columns = ', '.join(f'{_quote(c)} {_column_type(c)}' for c in self.columns)
+        conn.execute(f'DROP TABLE IF EXISTS {_quote(self.layer)}')
+        conn.execute(
+            f'CREATE TABLE {_quote(self.layer)} (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom POINT, {columns})'
+        )
+        conn.execute('DELETE FROM gpkg_contents WHERE table_name = ?', (self.layer,))
+        conn.execute('DELETE FROM gpkg_geometry_columns WHERE table_name = ?', (self.layer,))
+        conn.execute(
+            "INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, 'features', ?, 4326)",
+            (self.layer, self.layer)
+        )
+        conn.execute(
+            "INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', 'POINT', 4326, 0, 0)", (self.layer,)
+        )
+        conn.commit()
+
+    def write(self, rows: List[Tuple[Optional[Tuple[float, float]], List[Any]]]) -> None:
+        values = []
+        for point, attrs in rows:
+            values.append([_gpkg_point(point)] + attrs)
+            if point is not None:
+                if self.bounds is None:
+                    self.bounds = [point[0], point[1], point[0], point[1]]
+                else:
+                    b = self.bounds
+                    b[0], b[1] = min(b[0], point[0]), min(b[1], point[1])
+                    b[2], b[3] = max(b[2], point[0]), max(b[3], point[1])
+        self._conn.executemany(self._insert, values)
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    # Actualiza la extensión de la capa en gpkg_contents y cierra el archivo
+    def close(self) -> None:
+        if self.bounds is not None:
+            self._conn.execute(
+                "UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ?, "
+                "last_change = strftime('%Y-%m-%dT%H:%M:%fZ','now') WHERE table_name = ?",
+                (*self.bounds, self.layer)
+            )
+        self._conn.commit()
+        self._conn.close()
+
+
+# Salida en CSV con las columnas lon y lat. Al reanudar se recorta al tamaño del último punto de control
+class CsvWriter:
+    def __init__(self, path: str, columns: List[str], resume_offset: Optional[int] = None) -> None:
+        if resume_offset is None:
+            self._file = open(path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(columns + ['lon', 'lat'])
+        else:
+            self._file = open(path, 'r+', encoding='utf-8', newline='')
+            self._file.truncate(resume_offset)
+            self._file.seek(resume_offset)
+            self._writer = csv.writer(self._file)
+
+    def write(self, rows: List[Tuple[Optional[Tuple[float, float]], List[Any]]]) -> None:
+        for point, attrs in rows:
+            self._writer.writerow(attrs + (list(point) if point is not None else ['', '']))
+
+    def commit(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    # Tamaño en bytes de lo confirmado, para recortar al reanudar
+    def offset(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Tipo SQL de una columna: fila es entera, las cc_* según el tipo del valor y las de entrada texto
+def _column_type(name: str) -> str:
+    if name == ROW_FIELD:
+        return 'INTEGER'
+    if name in RESULT_FIELDS:
+        return SQL_TYPES[value_type(name[3:])]
+    return 'TEXT'
+
+
+# Geometría de punto en formato GeoPackage: cabecera GP sin envolvente seguida del WKB
+def _gpkg_point(point: Optional[Tuple[float, float]]) -> Optional[bytes]:
+    if point is None or any(math.isnan(c) for c in point):
+        return None
+    return struct.pack('<2sBBi', b'GP', 0, 1, 4326) + struct.pack('<BIdd', 1, WKB_POINT, point[0], point[1])
+
+
+# Punto de control: filas de entrada ya escritas y, para CSV, tamaño de la salida en ese momento
+def read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path + CHECKPOINT_SUFFIX, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    tmp = path + CHECKPOINT_SUFFIX + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path + CHECKPOINT_SUFFIX)
+
+
+# Contadores de la ejecución y mensajes de progreso por stderr
+class Stats:
+    def __init__(self, done: int = 0, cache: Optional[ResponseCache] = None) -> None:
+        self.start = time.monotonic()
+        self.skipped = done
+        self.rows = 0
+        self.statuses: Dict[str, int] = {}
+        self.cache = cache
+        self.last_report = self.start
+
+    def add(self, result: BatchResult) -> None:
+        self.rows += 1
+        status = 'error' if result.status.startswith('error') else result.status
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        counts = ', '.join(f'{name} {count}' for name, count in sorted(self.statuses.items()))
+        text = f'{self.skipped + self.rows} filas ({counts or "-"}) · {self.rows / elapsed:.1f} filas/s'
+        if self.cache is not None and self.cache.hits + self.cache.misses:
+            text += f' · caché {100 * self.cache.hits / (self.cache.hits + self.cache.misses):.0f}%'
+        return text
+
+    def report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self.last_report >= PROGRESS_SECONDS:
+            self.last_report = now
+            print(self.line(), file=sys.stderr, flush=True)
+
+
+# Ejecuta la orden geocode y devuelve el código de salida
+def run_geocode(args: argparse.Namespace) -> int:
+    try:
+        params = filter_params(
+            postal_codes=args.postal_codes, types=args.types.split(',') if args.types else None
+        )
+    except ValueError as e:
+        raise CliError(str(e))
+
+    is_csv = args.output.lower().endswith('.csv')
+    checkpoint = read_checkpoint(args.output) if args.resume else None
+    if checkpoint is not None and checkpoint.get('input') != os.path.abspath(args.input):
+        raise CliError(f"El punto de control de {args.output} corresponde a otra entrada: {checkpoint.get('input')}")
+    if checkpoint is None and os.path.exists(args.output):
+        if not args.overwrite:
+            raise CliError(f'{args.output} ya existe. Use --resume para continuar o --overwrite para sustituirlo')
+        if is_csv:
+            os.remove(args.output)
+    done = checkpoint['rows'] if checkpoint else 0
+
+    cache = None
+    if args.cache:
+        cache = ResponseCache(args.cache, DEFAULT_TTL_DAYS, DEFAULT_MAX_MB)
+    geocoder = Geocoder(timeout_ms=int(args.timeout * 1000), rate=args.rate, cache=cache)
+    stats = Stats(done, cache)
+
+    with open(args.input, encoding='utf-8-sig', newline='') as stream:
+        header, reader = open_csv(stream, args.delimiter)
+        address_index = address_column(header, args.column)
+        columns = [h for h in header if h not in RESULT_FIELDS and h != ROW_FIELD] + [ROW_FIELD] + RESULT_FIELDS
+        keep = [i for i, h in enumerate(header) if h not in RESULT_FIELDS and h != ROW_FIELD]
+        layer = args.layer or os.path.splitext(os.path.basename(args.output))[0]
+        if is_csv:
+            writer = CsvWriter(args.output, columns, checkpoint['offset'] if checkpoint else None)
+        else:
+            writer = GeoPackageWriter(args.output, layer, columns, done if checkpoint else None)
+        if checkpoint:
+            print(f'Reanudando desde la fila {done}', file=sys.stderr)
+
+        def rows() -> Iterator[Tuple[int, List[str]]]:
+            for index, values in enumerate(reader):
+                if index < done:
+                    continue
+                if not values or not any(v.strip() for v in values):
+                    continue
+                yield index, values
+
+        def job(item: Tuple[int, List[str]]) -> BatchResult:
+            index, values = item
+            address = values[address_index].strip() if address_index < len(values) else ''
+            return geocoder.geocode(address, index, params)
+
+        buffer: List[Tuple[Optional[Tuple[float, float]], List[Any]]] = []
+        last_index = done - 1
+
+        def flush() -> None:
+            writer.write(buffer)
+            writer.commit()
+            buffer.clear()
+            state = {'input': os.path.abspath(args.input), 'rows': last_index + 1}
+            if is_csv:
+                state['offset'] = writer.offset()
+            write_checkpoint(args.output, state)
+
+        interrupted = False
+        try:
+            for (index, values), result in bounded_map(job, rows(), args.workers):
+                raw = result.location.raw if result.location else {}
+                attrs = [values[i] if i < len(values) else None for i in keep]
+                buffer.append((
+                    location_point(result.location),
+                    attrs + [index, result.status] + result_values(raw, RESULT_FIELDS)
+                ))
+                last_index = index
+                stats.add(result)
+                if len(buffer) >= args.batch_size:
+                    flush()
+                stats.report()
+        except KeyboardInterrupt:
+            interrupted = True
+        finally:
+            flush()
+            writer.close()
+            geocoder.close()
+
+    stats.report(force=True)
+    if interrupted:
+        print(f'Interrumpido. Continúe con --resume desde la fila {last_index + 1}', file=sys.stderr)
+        return 130
+    try:
+        os.remove(args.output + CHECKPOINT_SUFFIX)
+    except OSError:
+        pass
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m PluginQGISCartociudad',
+        description='Geocodificación por lotes con el servicio REST Geocoder de CartoCiudad'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    geocode = commands.add_parser('geocode', help='Geocodifica las direcciones de un CSV')
+    geocode.add_argument('input', help='CSV de entrada con una columna de direcciones')
+    geocode.add_argument('output', help='Salida: GeoPackage (.gpkg) o CSV (.csv)')
+    geocode.add_argument('--column', help='Columna con las direcciones (por defecto direccion o address)')
+    geocode.add_argument('--delimiter', help='Separador del CSV de entrada (por defecto se detecta)')
+    geocode.add_argument('--postal-codes', help='Filtro por códigos postales separados por comas')
+    geocode.add_argument('--types', help=f'Tipos de elemento separados por comas: {", ".join(ELEMENT_TYPES)}')
+    geocode.add_argument('--workers', type=int, default=DEFAULT_MAX_IN_FLIGHT, help='Peticiones simultáneas')
+    geocode.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Peticiones por segundo (0 = sin límite)')
+    geocode.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_MS / 1000, help='Tiempo de espera en segundos')
+    geocode.add_argument('--cache', help='Archivo SQLite para la caché de respuestas')
+    geocode.add_argument('--layer', help='Nombre de la capa en el GeoPackage (por defecto el del archivo)')
+    geocode.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Filas por bloque de escritura')
+    geocode.add_argument('--resume', action='store_true', help='Continúa desde el último punto de control')
+    geocode.add_argument('--overwrite', action='store_true', help='Sustituye la salida si ya existe')
+    geocode.set_defaults(func=run_geocode)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (CliError, OSError, sqlite3.Error) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
@@ -20,11 +20,22 @@ class CompatQt:
     ItemIsSelectable = qt_enum("ItemFlag", "ItemIsSelectable")
     ItemIsEnabled = qt_enum("ItemFlag", "ItemIsEnabled")
     ItemIsEditable = qt_enum("ItemFlag", "ItemIsEditable")
+    NoItemFlags = qt_enum("ItemFlag", "NoItemFlags")
 
     Checked = qt_enum("CheckState", "Checked")
     Unchecked = qt_enum("CheckState", "Unchecked")
 
+    CaseInsensitive = qt_enum("CaseSensitivity", "CaseInsensitive")
+
     UserRole = qt_enum("ItemDataRole", "UserRole")
+    DisplayRole = qt_enum("ItemDataRole", "DisplayRole")
+    EditRole = qt_enum("ItemDataRole", "EditRole")
+    CheckStateRole = qt_enum("ItemDataRole", "CheckStateRole")
+    ToolTipRole = qt_enum("ItemDataRole", "ToolTipRole")
+    FontRole = qt_enum("ItemDataRole", "FontRole")
+    TextAlignmentRole = qt_enum("ItemDataRole", "TextAlignmentRole")
+    BackgroundRole = qt_enum("ItemDataRole", "BackgroundRole")
+    ForegroundRole = qt_enum("ItemDataRole", "ForegroundRole")
 
     AlignLeft = qt_enum("AlignmentFlag", "AlignLeft")
     AlignVCenter = qt_enum("AlignmentFlag", "AlignVCenter")
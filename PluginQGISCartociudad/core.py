@@ -0,0 +1,599 @@
+# Núcleo de geocodificación sin dependencias de Qt: construcción de URLs, interpretación de las respuestas
+# en resultados tipados, políticas de red (reintentos, ritmo, cortocircuito) y un cliente síncrono con
+# variantes por lotes con hilos y con asyncio. Se puede usar desde scripts PyQGIS, procesos o pruebas
+
+import asyncio
+import http.client
+import json
+import random
+import re
+import socket
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from .cache import ResponseCache
+from .reverse_cache import ReverseCache
+from .errors import TRANSIENT_STATUS, get_friendly_error, is_transient_error, url_error_code
+
+
+# Declaración de constantes
+API_HOST = 'www.cartociudad.es'
+API_GEOCODER = f'https://{API_HOST}/geocoder/api/geocoder'
+USER_AGENT = 'PluginQGISCartociudad'
+LIMIT = 35
+DEFAULT_TIMEOUT_MS = 15000
+MAX_RETRIES = 3
+BACKOFF_BASE_MS = 500
+BACKOFF_MAX_MS = 8000
+BREAKER_THRESHOLD = 5
+BREAKER_OPEN_SECONDS = 30
+DEFAULT_RATE = 10.0
+DEFAULT_MAX_IN_FLIGHT = 8
+MAX_CONCURRENCY = 32
+MIN_RATE = 0.5
+ELEMENT_TYPES = [
+    'poblacion', 'municipio', 'provincia', 'comunidad autonoma',
+    'toponimo', 'callejero', 'carretera', 'portal',
+    'expendeduria', 'punto_recarga_electrica', 'ngbe'
+]
+RESULT_FIELDS = [
+    'cc_estado', 'cc_id', 'cc_type', 'cc_address', 'cc_tip_via', 'cc_portalNumber',
+    'cc_postalCode', 'cc_poblacion', 'cc_muni', 'cc_province'
+]
+REVERSE_RESULT_FIELDS = [
+    'cc_estado', 'cc_tip_via', 'cc_address', 'cc_portalNumber', 'cc_extension',
+    'cc_postalCode', 'cc_poblacion', 'cc_muni', 'cc_province'
+]
+# Tipo de los valores de las respuestas que no son texto. id y postalCode se guardan como texto para
+# conservar los ceros a la izquierda (códigos postales como 08001); al tener siempre cinco cifras se
+# pueden comparar por rangos igualmente
+VALUE_TYPES: Dict[str, type] = {
+    'portalNumber': int,
+    'state': int,
+    'lat': float,
+    'lng': float,
+    'x': float,
+    'y': float,
+    'noNumber': bool,
+}
+ADMIN_FILTER_PARAMS = {
+    'comunidad_autonoma': 'comunidad_autonoma_filter',
+    'provincia': 'provincia_filter',
+    'municipio': 'municipio_filter',
+}
+
+
+class GeocoderError(Exception):
+    pass
+
+
+# Candidato devuelto por el servicio candidates
+class Candidate:
+    __slots__ = ('id', 'type', 'address', 'raw')
+
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.id = raw.get('id')
+        self.type = raw.get('type')
+        self.address = raw.get('address')
+        self.raw = raw
+
+    def __repr__(self) -> str:
+        return f'Candidate({self.type!r}, {self.address!r})'
+
+
+# Localización devuelta por find o reverseGeocode. raw conserva la respuesta completa
+class Location:
+    __slots__ = ('id', 'type', 'address', 'geom', 'raw')
+
+    def __init__(self, raw: Dict[str, Any]) -> None:
+        self.id = raw.get('id')
+        self.type = raw.get('type')
+        self.address = raw.get('address')
+        self.geom = raw.get('geom')
+        self.raw = raw
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.raw.get(key, default)
+
+    def __repr__(self) -> str:
+        return f'Location({self.type!r}, {self.address!r})'
+
+
+# Resultado de una fila de un lote: estado 'ok', 'sin_direccion', 'sin_resultados', 'sin_geometria' o 'error: ...'
+class BatchResult:
+    __slots__ = ('index', 'query', 'status', 'location')
+
+    def __init__(self, index: int, query: Any, status: str, location: Optional[Location] = None) -> None:
+        self.index = index
+        self.query = query
+        self.status = status
+        self.location = location
+
+    def __repr__(self) -> str:
+        return f'BatchResult({self.index}, {self.status!r}, {self.location!r})'
+
+
+# Construye los parámetros de filtrado por unidades administrativas, códigos postales y tipo de elemento.
+# Lanza ValueError si algún código postal o tipo de elemento no es válido
+def filter_params(
+    filters: Optional[Dict[str, List[str]]] = None,
+    postal_codes: Union[str, Sequence[str], None] = None,
+    types: Optional[Sequence[str]] = None
+) -> str:
+    params = ''
+    for key, param in ADMIN_FILTER_PARAMS.items():
+        values = ','.join(v.strip() for v in (filters or {}).get(key) or [] if v.strip())
+        if values:
+            params += f'&{param}={quote(values, safe=",")}'
+
+    if isinstance(postal_codes, str):
+        postal_codes = postal_codes.split(',') if postal_codes else []
+    if postal_codes:
+        codigos = [codigo.strip() for codigo in postal_codes]
+        if not all(codigo.isdigit() and len(codigo) == 5 for codigo in codigos):
+            raise ValueError("Algunos códigos postales no son válidos")
+        params += f'&cod_postal_filter={",".join(codigos)}'
+
+    seleccionados_norm = [t.strip().lower() for t in types or []]
+    if seleccionados_norm:
+        if not all(t in ELEMENT_TYPES for t in seleccionados_norm):
+            raise ValueError("Algunos elementos seleccionados no son válidos")
+        elementos_excluir = [t for t in ELEMENT_TYPES if t not in seleccionados_norm]
+        params += f'&no_process={quote(",".join(elementos_excluir), safe=",")}'
+    return params
+
+
+def candidates_url(q: str, params: str = '', limit: int = LIMIT) -> str:
+    return f'{API_GEOCODER}/candidates?q={quote(q)}&limit={limit}{params}'
+
+
+def find_url(candidate_id: Any, candidate_type: Any) -> str:
+    return f'{API_GEOCODER}/find?id={quote(str(candidate_id))}&type={quote(str(candidate_type))}'
+
+
+def reverse_url(lon: float, lat: float) -> str:
+    return f'{API_GEOCODER}/reverseGeocode?lon={lon!r}&lat={lat!r}'
+
+
+def _load(data: Union[bytes, str]) -> Any:
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    if not data.strip():
+        return None
+    try:
+        return json.loads(data)
+    except ValueError as e:
+        raise GeocoderError(f"Error al decodificar la respuesta JSON: {e}") from e
+
+
+# Interpreta la respuesta de candidates. Lanza GeocoderError si no es JSON válido
+def parse_candidates(data: Union[bytes, str]) -> List[Candidate]:
+    return [Candidate(c) for c in _load(data) or [] if isinstance(c, dict)]
+
+
+# Interpreta la respuesta de find o reverseGeocode; None si está vacía. Lanza GeocoderError si no es JSON válido
+def parse_location(data: Union[bytes, str]) -> Optional[Location]:
+    raw = _load(data)
+    return Location(raw) if isinstance(raw, dict) and raw else None
+
+
+# Texto en minúsculas, sin tildes ni diéresis y con cualquier signo convertido en espacio, para comparar nombres
+def fold(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text).split())
+
+
+# Candidato de una unidad administrativa buscada por su nombre: entre los candidatos de su tipo, el de nombre
+# idéntico sin tildes o, si no hay ninguno, el primero. None si no hay candidatos
+def pick_admin_candidate(found: List[Candidate], name: str, unit_type: str) -> Optional[Candidate]:
+    found = [c for c in found if str(c.type or '').lower() == unit_type] or found
+    if not found:
+        return None
+    target = fold(name)
+    return next((c for c in found if fold(str(c.address or '')) == target), found[0])
+
+
+# Tipo de Python de una clave de la respuesta: el de VALUE_TYPES o, si no está, el del valor recibido
+def value_type(key: str, value: Any = None) -> type:
+    kind = VALUE_TYPES.get(key)
+    if kind is not None:
+        return kind
+    # bool antes que int: True y False también son instancias de int
+    for candidate in (bool, int, float):
+        if isinstance(value, candidate):
+            return candidate
+    return str
+
+
+# Convierte un valor al tipo indicado. Devuelve None si no se puede convertir
+def convert_value(kind: type, value: Any) -> Any:
+    if value is None or isinstance(value, kind) and not (kind is int and isinstance(value, bool)):
+        return value
+    try:
+        if kind is bool:
+            return str(value).strip().lower() in ('true', '1', 'si', 'sí')
+        if kind is int and isinstance(value, str):
+            return int(value.strip())
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Valores de los campos cc_* a partir de la respuesta del servicio (sin el campo de estado)
+def result_values(location: Dict[str, Any], result_fields: List[str]) -> List[Any]:
+    return [convert_value(value_type(key[3:]), location.get(key[3:])) for key in result_fields[1:]]
+
+
+# Espera antes del reintento número attempt (desde 0): exponencial con variación aleatoria completa,
+# para que muchas peticiones que fallan a la vez no vuelvan a llegar al servidor a la vez
+def backoff_delay(attempt: int) -> int:
+    return int(random.uniform(0, min(BACKOFF_MAX_MS, BACKOFF_BASE_MS * 2 ** attempt)))
+
+
+# Segundos indicados en la cabecera Retry-After, que puede ser un número o una fecha HTTP
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+# Aplica job a cada elemento en un grupo de hilos y devuelve (elemento, resultado) en el orden de entrada.
+# A diferencia de ThreadPoolExecutor.map, consume la entrada de forma gradual y nunca tiene más de
+# workers * 4 elementos pendientes. Si cancelled() devuelve True deja de enviar trabajo y termina
+def bounded_map(
+    job: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: int = DEFAULT_MAX_IN_FLIGHT,
+    cancelled: Optional[Callable[[], bool]] = None
+) -> Iterator[Tuple[Any, Any]]:
+    window = max(1, workers) * 4
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    pending: Deque[Tuple[Any, Future]] = deque()
+    try:
+        for item in items:
+            if cancelled is not None and cancelled():
+                return
+            pending.append((item, executor.submit(job, item)))
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            if cancelled is not None and cancelled():
+                return
+            item, future = pending.popleft()
+            yield item, future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Cortocircuito del servicio: tras varios fallos transitorios seguidos deja de enviar peticiones
+# durante un tiempo y las da por fallidas al momento. Pasado ese tiempo deja pasar peticiones de
+# prueba; la primera que falla lo vuelve a abrir y la primera que responde lo cierra
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, open_seconds: float = BREAKER_OPEN_SECONDS) -> None:
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.open_until = 0.0
+
+    def allow(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        half_open = self.open_until > 0
+        if half_open or self.failures >= self.threshold:
+            if self.allow():
+                print(f"Servicio Geocoder no disponible; se suspenden las peticiones {self.open_seconds:.0f} s")
+            self.open_until = time.monotonic() + self.open_seconds
+
+
+# Limitador de peticiones por segundo con cubo de fichas (permite ráfagas de hasta burst peticiones).
+# Se adapta al servidor: ante un 429/503 reduce el ritmo a la mitad y respeta Retry-After,
+# y con cada respuesta correcta lo recupera poco a poco hasta el máximo configurado.
+# Un ritmo de 0 significa sin límite
+class RateLimiter:
+    def __init__(self, rate: float = DEFAULT_RATE, burst: Optional[float] = None) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def configure(self, rate: float, burst: Optional[float] = None) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = min(self.tokens, self.burst)
+
+    # Consume una ficha si la hay y devuelve 0; si no, devuelve los segundos que faltan para poder enviar
+    def acquire(self) -> float:
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.max_rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def throttle(self, retry_after: Optional[float]) -> None:
+        if self.max_rate > 0:
+            self.rate = max(MIN_RATE, self.rate / 2)
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        print(f"El servidor pide reducir el ritmo: {self.rate:.1f} peticiones/s, espera {retry_after or 0:.0f} s")
+
+    def recover(self) -> None:
+        if 0 < self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+# Cliente síncrono del servicio Geocoder basado en urllib. Es seguro usarlo desde varios hilos:
+# comparte el limitador de ritmo, el cortocircuito y, si se indican, las cachés de respuestas en disco
+class Geocoder:
+    def __init__(
+        self,
+        timeout_ms: int = DEFAULT_TIMEOUT_MS,
+        retries: int = MAX_RETRIES,
+        rate: float = DEFAULT_RATE,
+        cache: Optional[ResponseCache] = None,
+        reverse_cache: Optional[ReverseCache] = None
+    ) -> None:
+        self.timeout = timeout_ms / 1000
+        self.retries = retries
+        self.limiter = RateLimiter(rate)
+        self.breaker = CircuitBreaker()
+        self.cache = cache
+        self.reverse_cache = reverse_cache
+        self._lock = threading.Lock()
+
+    # Cierra las cachés de respuestas, si las hay
+    def close(self) -> None:
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        if self.reverse_cache is not None:
+            self.reverse_cache.close()
+            self.reverse_cache = None
+
+    # Descarga una URL respetando el ritmo, con reintentos ante fallos transitorios.
+    # Lanza GeocoderError con el mensaje de errors.py si no se consigue respuesta
+    def fetch(self, url: str) -> bytes:
+        if self.cache is not None:
+            body = self._cache_get(url)
+            if body is not None:
+                return body
+
+        attempt = 0
+        while True:
+            with self._lock:
+                if not self.breaker.allow():
+                    raise GeocoderError(get_friendly_error(7))
+                wait = self.limiter.acquire()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+
+            status = None
+            retry_after = None
+            try:
+                request = Request(url, headers={'User-Agent': USER_AGENT})
+                with urlopen(request, timeout=self.timeout) as response:
+                    body = response.read()
+                with self._lock:
+                    self.breaker.record_success()
+                    self.limiter.recover()
+                if self.cache is not None and body:
+                    self._cache_put(url, body)
+                return body
+            except HTTPError as e:
+                status = e.code
+                retry_after = parse_retry_after(e.headers.get('Retry-After') if e.headers else None)
+                cause, error = e, e
+                transient = status in TRANSIENT_STATUS
+            except (URLError, socket.timeout, ConnectionError, http.client.HTTPException) as e:
+                # Se clasifica con los códigos de errors.py: no se reintenta, por ejemplo, si no se resuelve el nombre
+                code = url_error_code(e)
+                cause, error = e, e if isinstance(e, URLError) else code
+                transient = is_transient_error(code)
+
+            with self._lock:
+                if status in (429, 503):
+                    self.limiter.throttle(retry_after)
+                if transient and status != 429:
+                    self.breaker.record_failure()
+                elif not transient:
+                    self.breaker.record_success()
+            if not transient or attempt >= self.retries:
+                raise GeocoderError(get_friendly_error(error)) from cause
+            time.sleep(backoff_delay(attempt) / 1000)
+            attempt += 1
+
+    # Lectura y escritura en caché: un fallo de la caché nunca debe impedir la petición ni detener un lote
+    def _cache_get(self, url: str) -> Optional[bytes]:
+        try:
+            return self.cache.get(url)
+        except sqlite3.Error as e:
+            print(f"Error leyendo la caché de respuestas: {e}")
+            return None
+
+    def _cache_put(self, url: str, body: bytes) -> None:
+        try:
+            self.cache.put(url, body)
+        except sqlite3.Error as e:
+            print(f"Error guardando en la caché de respuestas: {e}")
+
+    def candidates(
+        self,
+        q: str,
+        filters: Optional[Dict[str, List[str]]] = None,
+        types: Optional[Sequence[str]] = None,
+        postal_codes: Union[str, Sequence[str], None] = None,
+        limit: int = LIMIT
+    ) -> List[Candidate]:
+        params = filter_params(filters, postal_codes, types)
+        return parse_candidates(self.fetch(candidates_url(q, params, limit)))
+
+    def find(self, candidate_id: Any, candidate_type: Any) -> Optional[Location]:
+        return parse_location(self.fetch(find_url(candidate_id, candidate_type)))
+
+    # Localización completa (con geometría) de una unidad administrativa a partir de su nombre. Devuelve None si
+    # candidates no devuelve nada
+    def find_admin_unit(
+        self, name: str, unit_type: str, filters: Optional[Dict[str, List[str]]] = None
+    ) -> Optional[Location]:
+        best = pick_admin_candidate(self.candidates(name, filters, [unit_type]), name, unit_type)
+        return self.find(best.id, best.type) if best is not None else None
+
+    # Con caché espacial se reutiliza la respuesta de un punto guardado a menos de la tolerancia y, si otro hilo
+    # está pidiendo ya la de un punto a menos de la tolerancia, se espera a esa respuesta en lugar de pedir otra
+    def reverse(self, lon: float, lat: float) -> Optional[Location]:
+        if self.reverse_cache is None:
+            return parse_location(self.fetch(reverse_url(lon, lat)))
+        future: Future = Future()
+        try:
+            body, pending = self.reverse_cache.claim(lon, lat, future)
+        except sqlite3.Error as e:
+            print(f"Error leyendo la caché espacial de reverseGeocode: {e}")
+            return parse_location(self.fetch(reverse_url(lon, lat)))
+        if body is not None:
+            return parse_location(body)
+        if pending is not None:
+            return parse_location(pending.result())
+        try:
+            body = self.fetch(reverse_url(lon, lat))
+            if body:
+                try:
+                    self.reverse_cache.put(lon, lat, body)
+                except sqlite3.Error as e:
+                    print(f"Error guardando en la caché espacial de reverseGeocode: {e}")
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(body)
+        finally:
+            self.reverse_cache.release(lon, lat, future)
+        return parse_location(body)
+
+    # Geocodifica una dirección: mejor candidato y su localización completa
+    def geocode(self, address: str, index: int = 0, params: str = '') -> BatchResult:
+        if not address or not address.strip():
+            return BatchResult(index, address, 'sin_direccion')
+        try:
+            found = parse_candidates(self.fetch(candidates_url(address, params, 1)))
+            if not found:
+                return BatchResult(index, address, 'sin_resultados')
+            location = self.find(found[0].id, found[0].type)
+        except GeocoderError as e:
+            return BatchResult(index, address, f'error: {str(e).splitlines()[0]}')
+        if location is None or not location.geom:
+            return BatchResult(index, address, 'sin_geometria')
+        return BatchResult(index, address, 'ok', location)
+
+    # Geocodificación inversa de un punto en EPSG:4326
+    def reverse_geocode(self, lon: Optional[float], lat: Optional[float], index: int = 0) -> BatchResult:
+        if lon is None or lat is None:
+            return BatchResult(index, (lon, lat), 'sin_geometria')
+        try:
+            location = self.reverse(lon, lat)
+        except GeocoderError as e:
+            return BatchResult(index, (lon, lat), f'error: {str(e).splitlines()[0]}')
+        if location is None:
+            return BatchResult(index, (lon, lat), 'sin_resultados')
+        return BatchResult(index, (lon, lat), 'ok', location)
+
+    # Lotes con hilos: devuelve los resultados en el orden de entrada a medida que terminan,
+    # leyendo la entrada poco a poco para no cargar lotes grandes en memoria
+    def geocode_many(
+        self, addresses: Iterable[str], workers: int = DEFAULT_MAX_IN_FLIGHT, params: str = ''
+    ) -> Iterator[BatchResult]:
+        for _, result in bounded_map(
+            lambda item: self.geocode(item[1], item[0], params), enumerate(addresses), workers
+        ):
+            yield result
+
+    def reverse_many(
+        self, points: Iterable[Tuple[Optional[float], Optional[float]]], workers: int = DEFAULT_MAX_IN_FLIGHT
+    ) -> Iterator[BatchResult]:
+        for _, result in bounded_map(
+            lambda item: self.reverse_geocode(item[1][0], item[1][1], item[0]), enumerate(points), workers
+        ):
+            yield result
+
+    # Lotes con asyncio: cada petición se ejecuta en un hilo con un máximo de concurrency a la vez
+    async def geocode_many_async(
+        self, addresses: Iterable[str], concurrency: int = DEFAULT_MAX_IN_FLIGHT, params: str = ''
+    ) -> List[BatchResult]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, address: str) -> BatchResult:
+            async with semaphore:
+                return await asyncio.to_thread(self.geocode, address, index, params)
+
+        return await asyncio.gather(*(run(i, a) for i, a in enumerate(addresses)))
+
+    async def reverse_many_async(
+        self, points: Iterable[Tuple[Optional[float], Optional[float]]], concurrency: int = DEFAULT_MAX_IN_FLIGHT
+    ) -> List[BatchResult]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, point: Tuple[Optional[float], Optional[float]]) -> BatchResult:
+            async with semaphore:
+                return await asyncio.to_thread(self.reverse_geocode, point[0], point[1], index)
+
+        return await asyncio.gather(*(run(i, p) for i, p in enumerate(points)))
+
+
+_geocoder: Optional[Geocoder] = None
+
+
+def _default_geocoder() -> Geocoder:
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = Geocoder()
+    return _geocoder
+
+
+# Atajos sobre un cliente síncrono compartido
+def candidates(
+    q: str,
+    filters: Optional[Dict[str, List[str]]] = None,
+    types: Optional[Sequence[str]] = None,
+    postal_codes: Union[str, Sequence[str], None] = None,
+    limit: int = LIMIT
+) -> List[Candidate]:
+    return _default_geocoder().candidates(q, filters, types, postal_codes, limit)
+
+
+def find(candidate_id: Any, candidate_type: Any) -> Optional[Location]:
+    return _default_geocoder().find(candidate_id, candidate_type)
+
+
+def reverse(lon: float, lat: float) -> Optional[Location]:
+    return _default_geocoder().reverse(lon, lat)
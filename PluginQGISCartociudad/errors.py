@@ -1,3 +1,7 @@
+import http.client
+import socket
+import ssl
+
 try:
     from urllib.error import URLError
 except ImportError:
@@ -25,6 +29,44 @@ STRING_ERROR_MAP = {
     "SslHandshakeFailedError": 6,
 }
 
+# Códigos de QtNetwork que corresponden a fallos transitorios que merece la pena reintentar
+TRANSIENT_ERRORS = {1, 2, 4, 7}
+
+# Códigos HTTP con los que el servidor indica que no está disponible temporalmente
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+
+# Código numérico de un error de QtNetwork (entero en Qt5, enumerado en Qt6)
+def _error_code(error) -> int:
+    try:
+        return int(getattr(error, 'value', error))
+    except (TypeError, ValueError):
+        return -1
+
+
+# Indica si un error de red o un código HTTP corresponde a un fallo transitorio
+def is_transient_error(error, status=None) -> bool:
+    return _error_code(error) in TRANSIENT_ERRORS or status in TRANSIENT_STATUS
+
+
+# Código de QtNetwork equivalente a una excepción de red de urllib (URLError, tiempo de espera, conexión o
+# respuesta HTTP incompleta), para clasificarla con TRANSIENT_ERRORS igual que los errores del cliente de Qt
+def url_error_code(error) -> int:
+    reason = getattr(error, 'reason', error) if isinstance(error, URLError) else error
+    if isinstance(reason, ssl.SSLError):
+        return 6
+    if isinstance(reason, socket.gaierror):
+        return 3
+    if isinstance(reason, socket.timeout):
+        return 4
+    if isinstance(reason, ConnectionRefusedError):
+        return 1
+    if isinstance(reason, (ConnectionError, http.client.HTTPException)):
+        return 2
+    if isinstance(reason, OSError):
+        return 7
+    return 8
+
 
 def get_friendly_error(error) -> str:
     print("DEBUG ERROR:", error, type(error))
@@ -0,0 +1,175 @@
+# Modelos de las listas de los filtros por unidades administrativas
+
+from typing import Iterable, List, Optional, Set
+
+from qgis.PyQt.QtCore import QAbstractListModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
+
+from .compat import CompatQt as CQt
+
+
+# Convierte un estado de marca (entero en Qt5, enumerado en Qt6) a booleano
+def _is_checked(value) -> bool:
+    return int(getattr(value, 'value', value)) == int(getattr(CQt.Checked, 'value', CQt.Checked))
+
+
+# Lista de valores de un filtro con su estado de marca y si está permitido por los filtros padre,
+# ambos guardados en bytearray en lugar de un objeto por elemento
+class FilterListModel(QAbstractListModel):
+    # Se emite solo cuando el usuario marca o desmarca un elemento
+    toggled = pyqtSignal()
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.values: List[str] = []
+        self.lower_values: List[str] = []
+        self.checked = bytearray()
+        self.allowed = bytearray()
+        self.checked_count = 0
+        self.checkable = True
+
+    # Sustituye los valores de la lista conservando marcados los indicados
+    def set_values(self, values: List[str], checked_values: Iterable[str] = (), checkable: bool = True) -> None:
+        checked_set = set(checked_values)
+        self.beginResetModel()
+        self.values = list(values)
+        self.lower_values = [value.lower() for value in self.values]
+        self.checked = bytearray(value in checked_set for value in self.values)
+        self.allowed = bytearray(b'\x01') * len(self.values)
+        self.checked_count = sum(self.checked)
+        self.checkable = checkable
+        self.endResetModel()
+
+    # Muestra un único texto no marcable, por ejemplo mientras se cargan los datos
+    def set_placeholder(self, text: str) -> None:
+        self.set_values([text], checkable=False)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.values)
+
+    def data(self, index: QModelIndex, role: int = CQt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == CQt.DisplayRole:
+            return self.values[row]
+        if role == CQt.CheckStateRole and self.checkable:
+            return CQt.Checked if self.checked[row] else CQt.Unchecked
+        return None
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return CQt.NoItemFlags
+        if not self.checkable:
+            return CQt.NoItemFlags
+        return CQt.ItemIsEnabled | CQt.ItemIsUserCheckable
+
+    def setData(self, index: QModelIndex, value, role: int = CQt.EditRole) -> bool:
+        if not index.isValid() or role != CQt.CheckStateRole or not self.checkable:
+            return False
+        row = index.row()
+        checked = _is_checked(value)
+        if bool(self.checked[row]) == checked:
+            return False
+        self.checked[row] = checked
+        self.checked_count += 1 if checked else -1
+        self.dataChanged.emit(index, index, [CQt.CheckStateRole])
+        self.toggled.emit()
+        return True
+
+    # Valores marcados, en el orden de la lista
+    def checked_values(self) -> List[str]:
+        if not self.checkable or not self.checked_count:
+            return []
+        return [value for value, checked in zip(self.values, self.checked) if checked]
+
+    # Marca o desmarca todos los elementos permitidos
+    def set_all_checked(self, checked: bool) -> None:
+        if not self.checkable or not self.values:
+            return
+        if checked:
+            self.checked = bytearray(self.allowed)
+        else:
+            self.checked = bytearray(len(self.values))
+        self.checked_count = sum(self.checked)
+        self._emit_checks_changed()
+
+    # Restringe la lista a los valores permitidos por los filtros padre (None = todos).
+    # Los elementos que dejan de estar permitidos se desmarcan
+    def set_allowed(self, allowed: Optional[Set[str]]) -> None:
+        if allowed is None:
+            self.allowed = bytearray(b'\x01') * len(self.values)
+            return
+        self.allowed = bytearray(value in allowed for value in self.values)
+        if self.checked_count:
+            unchecked = False
+            for row, checked in enumerate(self.checked):
+                if checked and not self.allowed[row]:
+                    self.checked[row] = 0
+                    self.checked_count -= 1
+                    unchecked = True
+            if unchecked:
+                self._emit_checks_changed()
+
+    def _emit_checks_changed(self) -> None:
+        self.dataChanged.emit(
+            self.index(0, 0), self.index(len(self.values) - 1, 0), [CQt.CheckStateRole]
+        )
+
+
+# Vista filtrada y ordenada de un FilterListModel: oculta lo no permitido o lo que no coincide con
+# el texto de búsqueda y coloca primero los elementos marcados. Mientras no hay ninguno marcado
+# no se ordena, de modo que la lista se muestra en el orden del modelo sin coste adicional
+class FilterProxyModel(QSortFilterProxyModel):
+    def __init__(self, source: FilterListModel, parent=None) -> None:
+        super().__init__(parent)
+        self.source = source
+        self.search_text = ''
+        self.matches: Optional[bytearray] = None
+        self.setSourceModel(source)
+        self.setDynamicSortFilter(True)
+        source.modelAboutToBeReset.connect(self._on_about_to_reset)
+        source.modelReset.connect(self._on_reset)
+        source.dataChanged.connect(self.update_sorting)
+
+    # Calcula de una vez qué filas coinciden con el texto de búsqueda y vuelve a filtrar
+    def set_search_text(self, text: str) -> None:
+        self.search_text = text.lower()
+        self._compute_matches()
+        self.invalidateFilter()
+
+    def _compute_matches(self) -> None:
+        if self.search_text:
+            self.matches = bytearray(self.search_text in value for value in self.source.lower_values)
+        else:
+            self.matches = None
+
+    # Vuelve a filtrar tras cambiar los valores permitidos del modelo
+    def refresh(self) -> None:
+        self.invalidateFilter()
+
+    # Las coincidencias calculadas dejan de valer cuando el modelo cambia de valores
+    def _on_about_to_reset(self) -> None:
+        self.matches = None
+
+    def _on_reset(self) -> None:
+        if self.search_text:
+            self._compute_matches()
+            self.invalidateFilter()
+        self.update_sorting()
+
+    # Activa la ordenación "marcados primero" solo cuando hay algún elemento marcado
+    def update_sorting(self, *args) -> None:
+        if self.source.checked_count and self.sortColumn() < 0:
+            self.sort(0)
+        elif not self.source.checked_count and self.sortColumn() >= 0:
+            self.sort(-1)
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if not self.source.allowed[source_row]:
+            return False
+        return self.matches is None or bool(self.matches[source_row])
+
+    # Ordenación estable: solo adelanta los marcados, el resto conserva el orden del modelo
+    def lessThan(self, left: QModelIndex, right: QModelIndex) -> bool:
+        checked = self.source.checked
+        return checked[left.row()] > checked[right.row()]
@@ -0,0 +1,319 @@
+# Datos de los filtros por unidades administrativas: configuración, copia incluida en el plugin
+# y copia actualizada en el directorio del perfil de QGIS
+
+import csv
+import json
+import os
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from qgis.core import QgsApplication
+
+
+# Declaración de constantes
+BUNDLED_DIR = os.path.join(os.path.dirname(__file__), 'datos')
+META_FILE = 'filtros.json'
+
+FILTER_CONFIGS: Dict[str, Dict[str, Any]] = {
+    'comunidad_autonoma': {
+        'file': 'cartociudad.comunidad_autonoma.csv',
+        'url': 'https://raw.githubusercontent.com/IDEESpain/PluginQGISCartociudad/main/Documentacion_auxiliar/cartociudad.comunidad_autonoma.csv',
+        'backup_url': 'https://www.idee.es/resources/documentos/Cartociudad/cartociudad.comunidad_autonoma.csv',
+        'column': 'nom_comunidad',
+        'parent_key': 'id_com',
+        'defaults': ['No se han cargado los datos']
+    },
+    'provincia': {
+        'file': 'cartociudad.provincia.csv',
+        'url': 'https://raw.githubusercontent.com/IDEESpain/PluginQGISCartociudad/main/Documentacion_auxiliar/cartociudad.provincia.csv',
+        'backup_url': 'https://www.idee.es/resources/documentos/Cartociudad/cartociudad.provincia.csv',
+        'column': 'nom_provincia',
+        'parent_filter': 'comunidad_autonoma',
+        'parent_key': 'id_com',
+        'parent_column': 'id_com',
+        'defaults': ['No se han cargado los datos']
+    },
+    'municipio': {
+        'file': 'cartociudad.municipio.csv',
+        'url': 'https://raw.githubusercontent.com/IDEESpain/PluginQGISCartociudad/main/Documentacion_auxiliar/cartociudad.municipio.csv',
+        'backup_url': 'https://www.idee.es/resources/documentos/Cartociudad/cartociudad.municipio.csv',
+        'column': 'nom_municipio',
+        'parent_filter': 'comunidad_autonoma',
+        'parent_key': 'id_com',
+        'parent_column': 'id_com',
+        'additional_parents': ['provincia'],
+        'provincia_parent_key': 'ine_prov',
+        'provincia_parent_column': 'ine_prov',
+        'defaults': ['No se han cargado los datos']
+    }
+}
+
+
+# Tabla de un filtro en formato columnar: cada columna es un array de índices a una tabla de cadenas
+# internadas. Los valores únicos de la columna mostrada y los índices de filas por clave
+# (id_com, ine_prov...) se construyen en la misma pasada que la lectura del CSV
+class FilterTable:
+    __slots__ = ('display_column', 'strings', 'columns', 'row_count', 'display_values', '_rows_by')
+
+    def __init__(self, display_column: str) -> None:
+        self.display_column = display_column
+        self.strings: List[str] = []
+        self.columns: Dict[str, array] = {}
+        self.row_count = 0
+        self.display_values: List[str] = []
+        self._rows_by: Dict[str, Dict[str, array]] = {}
+
+    # Valor de una columna en una fila
+    def value(self, column: str, row: int) -> str:
+        return self.strings[self.columns[column][row]]
+
+    # Índice de filas por valor de una columna clave
+    def rows_by(self, column: str) -> Dict[str, array]:
+        return self._rows_by.get(column, {})
+
+    # Valor de la columna mostrada para cada valor de una columna clave (p. ej. ine_prov -> nom_provincia)
+    def display_by(self, column: str) -> Dict[str, str]:
+        col = self.columns.get(column)
+        if col is None:
+            return {}
+        display = self.columns[self.display_column]
+        return {self.strings[col[row]]: self.strings[display[row]] for row in range(self.row_count)}
+
+    # Valores de la columna clave en las filas indicadas
+    def keys_of_rows(self, column: str, rows: Iterable[int]) -> Set[str]:
+        col = self.columns.get(column)
+        if col is None:
+            return set()
+        return {self.strings[col[row]] for row in rows}
+
+
+# Lee el CSV de un filtro en una sola pasada. Lanza ValueError o KeyError si no es válido
+def parse_filter_csv(csv_text: str, display_column: str) -> FilterTable:
+    lines = csv_text.lstrip('\ufeff').splitlines()
+    if not lines:
+        raise ValueError("El archivo está vacío")
+    first = lines[0]
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    reader = csv.reader(lines, delimiter=delimiter)
+    header = [h.replace('\ufeff', '').strip() for h in next(reader)]
+
+    target = display_column.replace('\ufeff', '').strip()
+    if target not in header:
+        candidate = next((h for h in header if h.lower() == target.lower()), None)
+        if candidate is None:
+            raise KeyError(f"No se encontró la columna '{display_column}'. Columnas disponibles: {sorted(header)}")
+        print(f"La columna '{display_column}' no coincide exactamente; usando '{candidate}'.")
+        target = candidate
+
+    table = FilterTable(target)
+    interned: Dict[str, int] = {}
+    strings = table.strings
+    columns = [array('i') for _ in header]
+    indexes: List[Dict[int, array]] = [{} for _ in header]
+    display_pos = header.index(target)
+    display_ids: Set[int] = set()
+    width = len(header)
+
+    row = 0
+    for values in reader:
+        if not values or not any(v.strip() for v in values):
+            continue
+        for pos in range(width):
+            value = values[pos].strip() if pos < len(values) else ''
+            sid = interned.get(value)
+            if sid is None:
+                sid = len(strings)
+                interned[value] = sid
+                strings.append(value)
+            columns[pos].append(sid)
+            rows = indexes[pos].get(sid)
+            if rows is None:
+                rows = indexes[pos][sid] = array('i')
+            rows.append(row)
+        if strings[columns[display_pos][row]]:
+            display_ids.add(columns[display_pos][row])
+        row += 1
+
+    if row == 0:
+        raise ValueError("El archivo está vacío")
+    if not display_ids:
+        raise ValueError(f"No hay datos en la columna '{target}'")
+
+    table.row_count = row
+    table.columns = dict(zip(header, columns))
+    table._rows_by = {
+        name: {strings[sid]: rows for sid, rows in index.items() if strings[sid]}
+        for name, index in zip(header, indexes)
+    }
+    table.display_values = sorted(strings[sid] for sid in display_ids)
+    return table
+
+
+# Índices precalculados de la dependencia entre filtros (comunidad -> provincia -> municipio).
+# Para cada hijo agrupa sus valores por la tupla de claves de todos sus padres, p. ej.
+# id_com -> provincias y (id_com, ine_prov) -> municipios, de modo que un cambio de selección
+# se resuelve comprobando unas pocas decenas de claves en lugar de recorrer todas las filas
+class DependencyIndex:
+    def __init__(self, tables: Dict[str, FilterTable], configs: Dict[str, Dict[str, Any]]) -> None:
+        self.links: Dict[str, List[tuple]] = {}
+        self.groups: Dict[str, Dict[tuple, frozenset]] = {}
+        self.parent_ids: Dict[tuple, Dict[str, frozenset]] = {}
+
+        for child_key, config in configs.items():
+            child_table = tables.get(child_key)
+            if child_table is None:
+                continue
+            main_parent = config.get('parent_filter')
+            parents = ([main_parent] if main_parent else []) + config.get('additional_parents', [])
+            links = []
+            for p_key in parents:
+                if p_key == main_parent:
+                    parent_key_field = config.get('parent_key')
+                    child_parent_field = config.get('parent_column')
+                else:
+                    parent_key_field = config.get(f'{p_key}_parent_key')
+                    child_parent_field = config.get(f'{p_key}_parent_column')
+                parent_table = tables.get(p_key)
+                if (
+                    parent_table is None or
+                    parent_key_field not in parent_table.columns or
+                    child_parent_field not in child_table.columns
+                ):
+                    continue
+                links.append((p_key, parent_key_field, child_parent_field))
+                if (p_key, parent_key_field) not in self.parent_ids:
+                    self.parent_ids[(p_key, parent_key_field)] = {
+                        value: frozenset(parent_table.keys_of_rows(parent_key_field, rows) - {''})
+                        for value, rows in parent_table.rows_by(parent_table.display_column).items()
+                    }
+            if not links:
+                continue
+
+            strings = child_table.strings
+            key_columns = [child_table.columns[field] for _, _, field in links]
+            display = child_table.columns[child_table.display_column]
+            groups: Dict[tuple, set] = {}
+            for row in range(child_table.row_count):
+                key = tuple(strings[col[row]] for col in key_columns)
+                groups.setdefault(key, set()).add(strings[display[row]])
+            self.links[child_key] = links
+            self.groups[child_key] = {key: frozenset(values - {''}) for key, values in groups.items()}
+
+    # Filtros padre de los que depende un hijo
+    def parents_of(self, child_key: str) -> List[str]:
+        return [p_key for p_key, _, _ in self.links.get(child_key, [])]
+
+    # Valores permitidos de un hijo según los valores seleccionados en sus padres.
+    # Devuelve None si ningún padre restringe al hijo
+    def allowed_values(self, child_key: str, selections: Dict[str, List[str]]) -> Optional[Set[str]]:
+        links = self.links.get(child_key)
+        if not links:
+            return None
+        allowed_ids: List[Optional[Set[str]]] = []
+        for p_key, parent_key_field, _ in links:
+            ids = None
+            selected = selections.get(p_key)
+            if selected:
+                index = self.parent_ids[(p_key, parent_key_field)]
+                ids = set().union(*(index.get(value, ()) for value in selected)) or None
+            allowed_ids.append(ids)
+        if all(ids is None for ids in allowed_ids):
+            return None
+
+        allowed: Set[str] = set()
+        for key, values in self.groups[child_key].items():
+            if all(ids is None or k in ids for k, ids in zip(key, allowed_ids)):
+                allowed |= values
+        return allowed
+
+
+# Directorio del perfil donde se guardan las versiones descargadas de los CSV
+def profile_dir() -> str:
+    return os.path.join(QgsApplication.qualifiedSettingsDirPath(), 'cartociudad', 'filtros')
+
+
+# Rutas donde buscar el CSV de un filtro, de más a menos reciente: perfil y copia del plugin
+def local_paths(config: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        'perfil': os.path.join(profile_dir(), config['file']),
+        'plugin': os.path.join(BUNDLED_DIR, config['file']),
+    }
+
+
+# Lee un CSV local como texto, o None si no existe o no se puede leer
+def read_local_csv(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"No se pudo leer {path}: {e}")
+        return None
+
+
+# Tabla de un filtro leída de la primera copia local válida (perfil y, si no, la incluida en el plugin),
+# o None si no hay ninguna
+def load_local_table(filter_key: str) -> Optional[FilterTable]:
+    config = FILTER_CONFIGS[filter_key]
+    for path in local_paths(config).values():
+        csv_text = read_local_csv(path)
+        if csv_text is None:
+            continue
+        try:
+            return parse_filter_csv(csv_text, config['column'])
+        except (ValueError, KeyError) as e:
+            print(f"CSV no válido en {path}: {e}")
+    return None
+
+
+# Lee los validadores HTTP (ETag y Last-Modified) de las copias guardadas en el perfil
+def read_meta() -> Dict[str, Dict[str, str]]:
+    path = os.path.join(profile_dir(), META_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Guarda en el perfil la versión descargada de un CSV junto con sus validadores HTTP
+def save_download(
+    filter_key: str,
+    config: Dict[str, Any],
+    data: bytes,
+    url: str,
+    headers: Dict[str, str],
+    meta: Dict[str, Dict[str, str]]
+) -> None:
+    directory = profile_dir()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, config['file'])
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+        meta[filter_key] = {
+            'url': url,
+            'etag': headers.get('etag', ''),
+            'last_modified': headers.get('last-modified', ''),
+        }
+        meta_path = os.path.join(directory, META_FILE)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(meta_path + '.tmp', meta_path)
+    except OSError as e:
+        print(f"No se pudo guardar {filter_key} en {directory}: {e}")
+
+
+# Cabeceras de petición condicional para no descargar de nuevo un CSV que no ha cambiado
+def conditional_headers(meta: Dict[str, str], url: str) -> Dict[str, str]:
+    if not meta or meta.get('url') != url:
+        return {}
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
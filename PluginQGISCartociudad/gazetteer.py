@@ -0,0 +1,210 @@
+# Nomenclátor sin conexión de municipios, provincias y comunidades autónomas construido con las tablas de los filtros.
+# Responde las búsquedas de unidades administrativas sin consultar candidates: coincidencia exacta o por el principio
+# sin tildes, por clave fonética española y, para las erratas, por trigramas. Los candidatos no llevan el
+# identificador del servicio: al elegir uno, la pestaña lo busca con candidates antes de pedir su geometría a find
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .core import LIMIT, Candidate, fold
+from .filters import load_local_table
+
+
+# Declaración de constantes
+GAZETTEER_TYPES = ('municipio', 'provincia', 'comunidad autonoma')
+MIN_SIMILARITY = 0.3
+
+# Tabla de filtros de cada tipo de elemento y su columna de código
+GAZETTEER_SOURCES = {
+    'municipio': {'filter': 'municipio', 'code': 'ine_mun'},
+    'provincia': {'filter': 'provincia', 'code': 'ine_prov'},
+    'comunidad autonoma': {'filter': 'comunidad_autonoma', 'code': 'id_com'},
+}
+
+# Puntuación de cada forma de coincidencia; la de los trigramas es su similitud multiplicada por TRIGRAM_SCORE
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+WORD_PREFIX_SCORE = 0.85
+PHONETIC_SCORE = 0.8
+PHONETIC_PREFIX_SCORE = 0.7
+TRIGRAM_SCORE = 0.6
+
+# Reglas fonéticas en orden de aplicación. 'ch' se sustituye primero por '#' para que no le afecten las de 'c' y 'h'
+PHONETIC_RULES = [
+    (re.compile(r'ch'), '#'),
+    (re.compile(r'qu|q'), 'k'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'c'), 'k'),
+    (re.compile(r'gu(?=[ei])'), 'g'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'[vw]'), 'b'),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'y(?![aeiou])'), 'i'),
+    (re.compile(r'(.)\1+'), r'\1'),
+]
+
+
+# Clave fonética española de un texto: iguala las letras que suenan igual (b/v, c/z/s ante e-i, c/k/q, g/j ante e-i,
+# ll/y), quita la h muda y las letras repetidas
+def phonetic_key(text: str) -> str:
+    words = []
+    for word in fold(text).split():
+        for pattern, replacement in PHONETIC_RULES:
+            word = pattern.sub(replacement, word)
+        words.append(word)
+    return ' '.join(words)
+
+
+def trigrams(folded: str) -> Set[str]:
+    padded = f'  {folded} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Unidad administrativa del nomenclátor: address es el texto que se muestra en la tabla de candidatos y code el
+# código de los CSV (INE para municipios y provincias, id_com para comunidades)
+class GazetteerEntry:
+    __slots__ = ('code', 'type', 'name', 'address', 'folded', 'key', 'grams', 'raw')
+
+    def __init__(self, code: str, entry_type: str, name: str, address: str, raw: Dict[str, str]) -> None:
+        self.code = code
+        self.type = entry_type
+        self.name = name
+        self.address = address
+        self.folded = fold(name)
+        self.key = phonetic_key(name)
+        self.grams = len(trigrams(self.folded))
+        self.raw = raw
+
+    # Candidato sin id (no se conoce el identificador del servicio); name y code quedan en raw
+    def candidate(self) -> Candidate:
+        return Candidate(dict(self.raw, type=self.type, address=self.address, name=self.name, code=self.code))
+
+
+# Índices del nomenclátor: nombres y claves fonéticas ordenados para buscar por el principio con bisect, palabras
+# sueltas para los nombres compuestos ("Hospitalet" encuentra "L'Hospitalet de Llobregat") y listas de trigramas
+class Gazetteer:
+    def __init__(self, entries: Iterable[GazetteerEntry]) -> None:
+        self.entries: List[GazetteerEntry] = list(entries)
+        # También se indexa el texto mostrado, para que al buscar una sugerencia elegida ("Castejón (Cuenca)") salga
+        # primero ese municipio
+        self.names: List[Tuple[str, int]] = sorted(
+            {(name, i) for i, entry in enumerate(self.entries) for name in (entry.folded, fold(entry.address))}
+        )
+        self.keys: List[Tuple[str, int]] = sorted((entry.key, i) for i, entry in enumerate(self.entries))
+        self.words: List[Tuple[str, int]] = sorted(
+            (word, i) for i, entry in enumerate(self.entries) for word in set(entry.folded.split()[1:])
+        )
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for i, entry in enumerate(self.entries):
+            for gram in trigrams(entry.folded):
+                self.postings[gram].append(i)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # Construye el nomenclátor con las tablas de los filtros (copia del perfil o la incluida en el plugin)
+    @classmethod
+    def from_tables(cls) -> 'Gazetteer':
+        tables = {source['filter']: load_local_table(source['filter']) for source in GAZETTEER_SOURCES.values()}
+        provinces = tables['provincia'].display_by('ine_prov') if tables['provincia'] else {}
+        communities = tables['comunidad_autonoma'].display_by('id_com') if tables['comunidad_autonoma'] else {}
+        entries = []
+        for entry_type, source in GAZETTEER_SOURCES.items():
+            table = tables[source['filter']]
+            if table is None or source['code'] not in table.columns:
+                continue
+            has_province = 'ine_prov' in table.columns
+            has_community = 'id_com' in table.columns
+            for row in range(table.row_count):
+                name = table.value(table.display_column, row)
+                code = table.value(source['code'], row)
+                if not name or not code:
+                    continue
+                raw = {}
+                province_code = table.value('ine_prov', row) if has_province else ''
+                community_code = table.value('id_com', row) if has_community else ''
+                province = provinces.get(province_code)
+                community = communities.get(community_code)
+                if province and entry_type == 'municipio':
+                    raw['province'] = province
+                    raw['provinceCode'] = province_code
+                if community and entry_type != 'comunidad autonoma':
+                    raw['comunidadAutonoma'] = community
+                    raw['comunidadAutonomaCode'] = community_code
+                # Hay municipios con el mismo nombre en distintas provincias: se muestra la provincia para distinguirlos
+                address = f'{name} ({province})' if entry_type == 'municipio' and province else name
+                entries.append(GazetteerEntry(code, entry_type, name, address, raw))
+        print(f'Nomenclátor cargado: {len(entries)} unidades administrativas')
+        return cls(entries)
+
+    # Candidatos de los tipos indicados ordenados por puntuación y, a igualdad, por el orden de GAZETTEER_TYPES y
+    # por nombre. Devuelve una lista vacía si no hay ninguno parecido
+    def search(self, query: str, types: Optional[Sequence[str]] = None, limit: int = LIMIT) -> List[Candidate]:
+        folded = fold(query)
+        if not folded:
+            return []
+        allowed = set(types or GAZETTEER_TYPES)
+        scores: Dict[int, float] = {}
+
+        def score(index: int, value: float) -> None:
+            if self.entries[index].type in allowed and value > scores.get(index, 0.0):
+                scores[index] = value
+
+        for name, index in self._prefixed(self.names, folded):
+            score(index, EXACT_SCORE if name == folded else PREFIX_SCORE)
+        for _, index in self._prefixed(self.words, folded):
+            score(index, WORD_PREFIX_SCORE)
+        key = phonetic_key(query)
+        for entry_key, index in self._prefixed(self.keys, key):
+            score(index, PHONETIC_SCORE if entry_key == key else PHONETIC_PREFIX_SCORE)
+
+        query_grams = trigrams(folded)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for index in self.postings.get(gram, ()):
+                shared[index] += 1
+        for index, count in shared.items():
+            similarity = count / (len(query_grams) + self.entries[index].grams - count)
+            if similarity >= MIN_SIMILARITY:
+                score(index, TRIGRAM_SCORE * similarity)
+
+        ranked = sorted(
+            scores,
+            key=lambda i: (-scores[i], GAZETTEER_TYPES.index(self.entries[i].type), self.entries[i].folded)
+        )
+        return [self.entries[index].candidate() for index in ranked[:limit]]
+
+    @staticmethod
+    def _prefixed(values: List[Tuple[str, int]], prefix: str) -> Iterable[Tuple[str, int]]:
+        start = bisect_left(values, (prefix, -1))
+        for value in values[start:]:
+            if not value[0].startswith(prefix):
+                break
+            yield value
+
+
+# Indica si una selección de tipos de elemento puede responderse solo con el nomenclátor
+def gazetteer_applies(types: Optional[Sequence[str]]) -> bool:
+    selected = {t.strip().lower() for t in types or []}
+    return bool(selected) and selected <= set(GAZETTEER_TYPES)
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+# Nomenclátor construido la primera vez que se usa
+def gazetteer() -> Gazetteer:
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.from_tables()
+    return _gazetteer
+
+
+# Descarta el nomenclátor, por ejemplo tras descargar una versión nueva de los CSV o al descargar el plugin
+def clear_gazetteer() -> None:
+    global _gazetteer
+    _gazetteer = None
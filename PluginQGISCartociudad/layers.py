@@ -0,0 +1,336 @@
+# Capas de resultados de la localización por nombre y por coordenadas: grupo y estilo por tipo de
+# elemento y modo acumulado, en el que cada tipo se guarda en una sola capa con muchas entidades
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from qgis.PyQt.QtCore import QObject, QSettings, QTimer, QMetaType
+from qgis.PyQt.QtXml import QDomDocument
+
+from qgis.core import (
+    Qgis, QgsProject, QgsVectorLayer, QgsFeature, QgsFields, QgsGeometry, QgsField, QgsWkbTypes, QgsLayerTreeGroup
+)
+
+from .core import convert_value, value_type
+from .network import SETTINGS_PREFIX
+
+
+# Declaración de constantes
+STYLES_DIR = os.path.join(os.path.dirname(__file__), 'estilos')
+REVERSE_GROUP = 'Resultados_reverse'
+EXCLUDED_KEYS = ['geom', 'stateMsg', 'state', 'countryCode', 'noNumber']
+REVERSE_EXCLUDED_KEYS = ['geom', 'stateMsg', 'state', 'countryCode', 'x', 'y', 'noNumber']
+
+GROUPS = {
+    'callejero': 'Viales',
+    'carretera': 'Viales',
+    'expendeduria': 'Puntos_interes',
+    'punto_recarga_electrica': 'Puntos_interes',
+    'ngbe': 'Puntos_interes',
+    'toponimo': 'Puntos_interes',
+    'poblacion': 'Poblaciones',
+    'portal': 'Portales_pk',
+    'municipio': 'Municipios',
+    'provincia': 'Provincias',
+    'comunidad autonoma': 'Comunidades_sim',
+    'codpost': 'Codigos_postales',
+    'refcatastral': 'Referencia_catastral'
+}
+
+# Estilo de cada grupo; en Viales y Puntos_interes depende además del tipo de elemento
+STYLES = {
+    'Viales': {
+        'carretera': 'Carretera_Viales.qml',
+        'callejero': 'Callejero_Viales.qml'
+    },
+    'Puntos_interes': {
+        'expendeduria': 'Puntos_interes_expendeduria.qml',
+        'punto_recarga_electrica': 'Puntos_interes_recarga.qml',
+        'ngbe': 'Puntos_interes_ngbe.qml',
+        'toponimo': 'Puntos_interes_toponimo.qml'
+    },
+    'Poblaciones': 'Poblaciones.qml',
+    'Portales_pk': 'Portales_pk.qml',
+    'Municipios': 'Municipios.qml',
+    'Provincias': 'Provincias.qml',
+    'Comunidades_sim': 'Comunidades_sim.qml',
+    'Codigos_postales': 'Codigos_postales.qml',
+    'Referencia_catastral': 'Referencia_catastral.qml',
+    REVERSE_GROUP: 'Reverse.qml'
+}
+
+
+# Grupo del árbol de capas en el que se guardan los elementos de un tipo
+def type_group(location_type: str) -> str:
+    return GROUPS.get(location_type, 'Otro')
+
+
+# Ruta del estilo QML de un grupo y tipo de elemento, o None si no tiene
+def style_path(group: str, location_type: str = '') -> Optional[str]:
+    style = STYLES.get(group)
+    if isinstance(style, dict):
+        style = style.get(location_type)
+    if not style:
+        return None
+    path = os.path.join(STYLES_DIR, style)
+    return path if os.path.exists(path) else None
+
+
+# Estilos QML ya interpretados. Cada archivo se lee una sola vez en una capa plantilla (una por tipo de
+# geometría, porque el renderizador depende de ella) y a las capas nuevas se les copian clones del
+# renderizador y del etiquetado, sin volver a leer el XML del disco ni a resolver los símbolos SVG
+class StyleCache:
+    def __init__(self) -> None:
+        self._templates: Dict[Tuple[str, Any], Tuple[QgsVectorLayer, bool]] = {}
+
+    def _template(self, path: str, layer: QgsVectorLayer) -> Optional[Tuple[QgsVectorLayer, bool]]:
+        key = (path, layer.geometryType())
+        cached = self._templates.get(key)
+        if cached is not None:
+            return cached
+        try:
+            with open(path, encoding='utf-8') as f:
+                qml = f.read()
+        except OSError as e:
+            print(f"No se pudo leer el estilo {path}: {e}")
+            return None
+        document = QDomDocument('qgis')
+        document.setContent(qml)
+        template = QgsVectorLayer(
+            f'{QgsWkbTypes.displayString(layer.wkbType())}?crs=EPSG:4326', 'estilo', 'memory'
+        )
+        ok, error = template.importNamedStyle(document)
+        if not ok:
+            print(f"No se pudo cargar el estilo {path}: {error}")
+            return None
+        # Los estilos que solo definen el etiquetado conservan la simbología por defecto de la capa
+        cached = (template, '<renderer-v2' in qml)
+        self._templates[key] = cached
+        return cached
+
+    # Aplica a la capa el estilo del archivo QML. Devuelve False si no se ha podido cargar
+    def apply(self, layer: QgsVectorLayer, path: str) -> bool:
+        cached = self._template(path, layer)
+        if cached is None:
+            return False
+        template, has_renderer = cached
+        if has_renderer and template.renderer() is not None:
+            layer.setRenderer(template.renderer().clone())
+            layer.setOpacity(template.opacity())
+            layer.setBlendMode(template.blendMode())
+            layer.setFeatureBlendMode(template.featureBlendMode())
+        labeling = template.labeling()
+        layer.setLabeling(labeling.clone() if labeling is not None else None)
+        layer.setLabelsEnabled(template.labelsEnabled())
+        layer.triggerRepaint()
+        return True
+
+    def clear(self) -> None:
+        self._templates.clear()
+
+
+_style_cache = StyleCache()
+
+
+# Aplica el estilo de un grupo y tipo de elemento, si lo tiene
+def apply_style(layer: QgsVectorLayer, group: str, location_type: str = '') -> None:
+    path = style_path(group, location_type)
+    if path:
+        _style_cache.apply(layer, path)
+
+
+# Libera las plantillas de estilo al descargar el plugin
+def clear_style_cache() -> None:
+    _style_cache.clear()
+
+
+# Indica si los resultados se acumulan en una capa por tipo en lugar de crear una capa por resultado
+def accumulate_enabled() -> bool:
+    return QSettings().value(f'{SETTINGS_PREFIX}/accumulate_layers', False, type=bool)
+
+
+# Busca el grupo en la raíz del árbol de capas y lo crea si no existe
+def layer_group(name: str) -> QgsLayerTreeGroup:
+    root = QgsProject.instance().layerTreeRoot()
+    group = root.findGroup(name)
+    if group is None:
+        group = root.addGroup(name)
+    return group
+
+
+# Tipo de campo de QGIS para cada tipo de valor de core.value_type. Los enteros son de 64 bits porque los
+# identificadores y códigos del servicio pueden no caber en 32
+FIELD_TYPES = {
+    bool: QMetaType.Type.Bool,
+    int: QMetaType.Type.LongLong,
+    float: QMetaType.Type.Double,
+    str: QMetaType.Type.QString,
+}
+# Las capas acumuladas creadas antes con campos Int de 32 bits siguen recibiendo enteros
+VALUE_KINDS = {field_type: kind for kind, field_type in FIELD_TYPES.items()}
+VALUE_KINDS[QMetaType.Type.Int] = int
+
+
+# Campo con el tipo que corresponde a una clave de la respuesta (enteros, decimales, booleanos o texto)
+def typed_field(key: str, value: Any = None) -> QgsField:
+    return QgsField(key, FIELD_TYPES[value_type(key, value)])
+
+
+# Campo tipado de las columnas cc_* de los resultados por lotes (cc_estado es siempre texto)
+def result_field(name: str) -> QgsField:
+    return QgsField(name, FIELD_TYPES[value_type(name[3:])])
+
+
+# Esquema de atributos compilado: campos de la capa y posición de cada clave de la respuesta, de modo que
+# cada entidad se construye con una sola lista ordenada de valores en lugar de campo a campo
+class LayerSchema:
+    __slots__ = ('fields', 'index', 'kinds')
+
+    def __init__(self, fields: QgsFields) -> None:
+        self.fields = fields
+        self.index: Dict[str, int] = {field.name(): i for i, field in enumerate(fields)}
+        self.kinds: List[Optional[type]] = [VALUE_KINDS.get(field.type()) for field in fields]
+
+    # Valores de la respuesta en el orden de los campos, convertidos al tipo de cada campo
+    def attributes(self, location: Dict[str, Any]) -> List[Any]:
+        attributes: List[Any] = [None] * len(self.kinds)
+        index = self.index
+        kinds = self.kinds
+        for key, value in location.items():
+            i = index.get(key)
+            if i is None or value is None:
+                continue
+            attributes[i] = convert_value(kinds[i], value) if kinds[i] is not None else value
+        return attributes
+
+    def feature(self, geom: Optional[QgsGeometry], location: Dict[str, Any]) -> QgsFeature:
+        feature = QgsFeature(self.fields)
+        if geom is not None:
+            feature.setGeometry(geom)
+        feature.setAttributes(self.attributes(location))
+        return feature
+
+
+_schemas: Dict[Tuple[str, Tuple[str, ...]], LayerSchema] = {}
+
+
+# Esquema tipado de un tipo de resultado. Se compila la primera vez que llega una respuesta de ese tipo
+# con ese conjunto de claves y después se reutiliza para todas las capas y entidades iguales
+def compiled_schema(result_type: str, location: Dict[str, Any], exclude: List[str] = EXCLUDED_KEYS) -> LayerSchema:
+    keys = tuple(key for key in location if key not in exclude)
+    cache_key = (result_type, keys)
+    schema = _schemas.get(cache_key)
+    if schema is None:
+        fields = QgsFields()
+        for key in keys:
+            fields.append(typed_field(key, location[key]))
+        schema = _schemas[cache_key] = LayerSchema(fields)
+    return schema
+
+
+# Capa acumulada de un tipo: las entidades nuevas esperan en un búfer y se escriben todas juntas con
+# addFeatures. Si llega una clave que la capa aún no tiene, se añade el campo antes de escribir
+class AccumulatedLayer:
+    def __init__(self, layer: QgsVectorLayer, exclude: List[str]) -> None:
+        self.layer = layer
+        self.exclude = set(exclude)
+        self.schema = LayerSchema(layer.fields())
+        self.pending: List[Tuple[QgsGeometry, Dict[str, Any]]] = []
+
+    # Indica si la capa sigue en el proyecto (el usuario puede haberla eliminado)
+    def is_alive(self) -> bool:
+        try:
+            return self.layer.isValid() and QgsProject.instance().mapLayer(self.layer.id()) is not None
+        except RuntimeError:
+            return False
+
+    def append(self, geom: QgsGeometry, location: Dict[str, Any]) -> None:
+        self.pending.append((geom, location))
+
+    # Amplía el esquema con las claves nuevas del búfer y escribe todas las entidades pendientes
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        new_fields = []
+        seen = set(self.schema.index)
+        for _, location in self.pending:
+            for key, value in location.items():
+                if key not in seen and key not in self.exclude:
+                    seen.add(key)
+                    new_fields.append(typed_field(key, value))
+        provider = self.layer.dataProvider()
+        if new_fields:
+            provider.addAttributes(new_fields)
+            self.layer.updateFields()
+            self.schema = LayerSchema(self.layer.fields())
+
+        features = [self.schema.feature(geom, location) for geom, location in self.pending]
+        self.pending.clear()
+        provider.addFeatures(features)
+        self.layer.updateExtents()
+        self.layer.triggerRepaint()
+
+
+# Capas acumuladas de una pestaña, una por grupo, tipo de estilo y tipo de geometría. Las entidades
+# añadidas durante una misma vuelta del bucle de eventos se escriben en un único addFeatures
+class LayerAccumulator(QObject):
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.layers: Dict[Tuple[str, str, str], AccumulatedLayer] = {}
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(0)
+        self.flush_timer.timeout.connect(self.flush)
+
+    # Añade una entidad a la capa de su grupo y tipo, creándola si hace falta. Devuelve la capa
+    def add(
+        self,
+        group: str,
+        location_type: str,
+        geom: QgsGeometry,
+        location: Dict[str, Any],
+        exclude: List[str] = EXCLUDED_KEYS
+    ) -> QgsVectorLayer:
+        geometry_type = _layer_geometry_type(geom)
+        if geometry_type.startswith('Multi') and not geom.isMultipart():
+            geom.convertToMultiType()
+        # Los grupos con un estilo por tipo (Viales, Puntos_interes) tienen una capa por tipo
+        style_key = location_type if isinstance(STYLES.get(group), dict) else ''
+        key = (group, style_key, geometry_type)
+        accumulated = self.layers.get(key)
+        if accumulated is None or not accumulated.is_alive():
+            accumulated = self._create(key, exclude)
+            self.layers[key] = accumulated
+        accumulated.append(geom, location)
+        self.flush_timer.start()
+        return accumulated.layer
+
+    def _create(self, key: Tuple[str, str, str], exclude: List[str]) -> AccumulatedLayer:
+        group, style_key, geometry_type = key
+        name = f'{group}_{style_key}' if style_key else group
+        if any(k[:2] == key[:2] and k[2] != geometry_type for k in self.layers):
+            name = f'{name}_{geometry_type}'
+        layer = QgsVectorLayer(f'{geometry_type}?crs=EPSG:4326', name, 'memory')
+        apply_style(layer, group, style_key)
+        QgsProject.instance().addMapLayer(layer, False)
+        layer_group(group).insertLayer(0, layer)
+        return AccumulatedLayer(layer, exclude)
+
+    # Escribe en sus capas todas las entidades pendientes
+    def flush(self) -> None:
+        self.flush_timer.stop()
+        for accumulated in self.layers.values():
+            if accumulated.pending and accumulated.is_alive():
+                accumulated.flush()
+            else:
+                accumulated.pending.clear()
+
+
+# Tipo de geometría de la capa acumulada: puntos simples o multipartes y líneas o polígonos siempre multiparte
+def _layer_geometry_type(geom: QgsGeometry) -> str:
+    geometry_type = QgsWkbTypes.geometryType(geom.wkbType())
+    if geometry_type == Qgis.GeometryType.Line:
+        return 'MultiLineString'
+    if geometry_type == Qgis.GeometryType.Polygon:
+        return 'MultiPolygon'
+    return 'MultiPoint' if geom.isMultipart() else 'Point'
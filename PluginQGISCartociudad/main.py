@@ -2,20 +2,26 @@
 # Importacion de módulos y librerias necesarias para el funcionamiento del complemento.
 
 import os
-import sys
 
 from qgis.PyQt.QtWidgets import (
-    QApplication, QVBoxLayout, QHBoxLayout, QWidget, QDockWidget,
+    QVBoxLayout, QHBoxLayout, QWidget, QDockWidget,
     QLabel, QTabWidget, QScrollArea, QDialog, QPushButton, QTextEdit
 )
 from qgis.PyQt.QtSvg import QSvgRenderer
 from qgis.PyQt.QtGui import QPixmap, QIcon, QPainter, QAction
 from qgis.PyQt import QtNetwork
+from qgis.core import QgsApplication
 
 from .compat import CompatQt as CQt
 from .errors import _get_error_message, _get_url_error_message
 from .name import NameTab
+from .layers import clear_style_cache
+from .boundaries import clear_boundary_index
+from .gazetteer import clear_gazetteer
+from .network import geocoder_client, close_geocoder_client
+from .processing_provider import CartoCiudadProvider
 from .reverse import ReverseTab
+from .settings import SettingsDialog
 
 
 
@@ -99,12 +105,22 @@ class Geocoder:
     def __init__(self, iface):
         self.iface = iface
         self.action = None
+        self.settings_action = None
         self.dock = None
+        self.provider = None
         self.initGui()
         self._session_filters = {} 
 
+    # Registra los algoritmos del plugin en la caja de herramientas de Processing
+    def initProcessing(self):
+        if self.provider is None:
+            self.provider = CartoCiudadProvider()
+            QgsApplication.processingRegistry().addProvider(self.provider)
+
     #Crea el botón del plugin en la barra de herramientas y en el menú de complementos de QGIS. 
     def initGui(self):
+        self.initProcessing()
+
         # Evita agregar el plugin varias veces
         if self.action is None:
             icon_path = os.path.join(os.path.dirname(__file__), "images", "Logo_small.svg")
@@ -122,6 +138,11 @@ class Geocoder:
             # Añade la acción a la barra de herramientas con el logo como icono
             self.iface.addToolBarIcon(self.action)
 
+        if self.settings_action is None:
+            self.settings_action = QAction("Configuración", self.iface.mainWindow())
+            self.settings_action.triggered.connect(self.show_settings)
+            self.iface.addPluginToMenu("&Geocoder Cartociudad", self.settings_action)
+
     #Elimina el botón del plugin y del panel lateral cuando se desactiva
     def unload(self):
         # Elimina el plugin del menú y la barra de herramientas cuando se desactiva el complemento
@@ -130,12 +151,34 @@ class Geocoder:
             self.iface.removeToolBarIcon(self.action)
             self.action = None
 
+        if self.settings_action is not None:
+            self.iface.removePluginMenu("&Geocoder Cartociudad", self.settings_action)
+            self.settings_action = None
+
         # Elimina el plugin del panel lateral cuando se desactiva el complemento
         if self.dock is not None:
             self.iface.removeDockWidget(self.dock)
             self.dock.deleteLater()
             self.dock = None
 
+        # Elimina los algoritmos de la caja de herramientas de Processing
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+            self.provider = None
+
+        # Libera los estilos de las capas de resultados, el índice de límites administrativos y el nomenclátor
+        clear_style_cache()
+        clear_boundary_index()
+        clear_gazetteer()
+
+        # Cierra la caché de respuestas guardando las estadísticas de la sesión
+        close_geocoder_client()
+
+    # Muestra el dialogo de configuración del plugin
+    def show_settings(self):
+        dialog = SettingsDialog(self.iface.mainWindow())
+        dialog.exec()
+
     #Crea el panel del plugin si aún no existe y lo pone en la izquierda en primer plano. En el caso de que exista simplemente lo muestra y lo pone en primer plano.
     def run(self):
         # Evitar abrir múltiples docks
@@ -157,6 +200,9 @@ class MyDockWidget(QDockWidget):
         self.plugin_dir = os.path.dirname(__file__)
         self.setWindowTitle("Geocoder CartoCiudad")
 
+        # Abre la conexión con el servicio mientras el usuario escribe la primera búsqueda
+        geocoder_client().preconnect()
+
         # Crea el widget principal, lo asigna al panel y establece la interfaz
         main_widget = QWidget()
         self.setWidget(main_widget)
@@ -297,10 +343,3 @@ class MyDockWidget(QDockWidget):
         
         reverse_layout.addWidget(ReverseTab(parent=self, iface=self.iface))
         return reverse_tab
-
-# Permite ejecutar el plugin de forma independiente para pruebas y desarrollo sin necesidad de cargarlo en QGIS
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MyDockWidget(iface=None)
-    window.show()
-    sys.exit(app.exec())
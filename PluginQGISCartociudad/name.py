@@ -1,52 +1,53 @@
 # Importación de librerias y módulos necesarios
 
 import os
-import json
-import csv
-from io import StringIO
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Set
 
 from qgis.PyQt.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QLabel, QTableWidget,
-    QTableWidgetItem, QAbstractItemView, QMessageBox, QHeaderView,
-    QDialogButtonBox, QListWidgetItem, QListWidget, QDialog, QSizePolicy,
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QLabel, QAbstractItemView, QMessageBox,
+    QDialogButtonBox, QListWidgetItem, QListWidget, QListView, QDialog, QSizePolicy,
     QToolButton, QFrame, QTextEdit
 )
-from qgis.PyQt.QtCore import QUrl, QMetaType, QSettings
-from qgis.PyQt import QtNetwork
-from qgis.PyQt.QtGui import QBrush, QColor, QPalette, QTextOption
+from qgis.PyQt.QtCore import QItemSelectionModel, QSettings
+from qgis.PyQt.QtGui import QBrush, QPalette, QTextOption
 
 from qgis.gui import QgisInterface
 from qgis.core import (
     QgsProject, QgsApplication, QgsCoordinateReferenceSystem, QgsCoordinateTransform,
-    QgsVectorLayer, QgsGeometry, QgsFeature, QgsFields, QgsField, QgsWkbTypes,
+    QgsVectorLayer, QgsGeometry, QgsWkbTypes,
     QgsLayerTreeLayer
 )
 
 from .compat import CompatQt as CQt
 
-try:
-    from urllib.request import urlopen
-    from urllib.error import URLError
-except ImportError:
-    from urllib2 import urlopen, URLError
-
-from .errors import _get_error_message, _get_url_error_message
+from .errors import _get_error_message
+from .filters import (
+    FILTER_CONFIGS, FilterTable, DependencyIndex, parse_filter_csv, local_paths, read_local_csv, read_meta,
+    save_download, conditional_headers
+)
+from .filter_model import FilterListModel, FilterProxyModel
+from .batch import BatchGeocodeDialog
+from .results_model import ResultsTableModel, ResultsTableView
+from .autocomplete import LocationCompleter
+from .gazetteer import clear_gazetteer, gazetteer, gazetteer_applies
+from .layers import (
+    LayerAccumulator, LayerSchema, accumulate_enabled, apply_style, compiled_schema, layer_group, type_group
+)
+from .network import GeocoderResponse, LatestRequest, geocoder_client
+from .core import (
+    Candidate, GeocoderError, filter_params, candidates_url, find_url, parse_candidates, parse_location,
+    pick_admin_candidate
+)
 
 
 # Declaración de constantes
-LIMIT = 35
-API_GEOCODER = 'https://www.cartociudad.es/geocoder/api/geocoder'
+FILTER_TIMEOUT_MS = 10000
 
 
 # Comprueba si el contenido es html cuando carga los filtros desde GitHub
-def _looks_like_html(raw_bytes, headers) -> bool:
-    try:
-        ct = headers.get_content_type()
-        if ct and 'html' in ct.lower():
-            return True
-    except Exception:
-        pass
+def _looks_like_html(raw_bytes, content_type: str) -> bool:
+    if content_type and 'html' in content_type.lower():
+        return True
     try:
         txt = raw_bytes.decode('utf-8', errors='ignore')
         if '<html' in txt.lower() or '<!doctype html' in txt.lower() or '<table' in txt.lower():
@@ -55,16 +56,6 @@ def _looks_like_html(raw_bytes, headers) -> bool:
         pass
     return False
 
-# Detecta el delimitador de un texto CSV 
-def _detect_delimiter(sample_text: str) -> str:
-    try:
-        sniffer = csv.Sniffer()
-        dialect = sniffer.sniff(sample_text)
-        return dialect.delimiter
-    except Exception:
-        first = sample_text.splitlines()[0] if sample_text.splitlines() else ''
-        return ';' if first.count(';') > first.count(',') else ','
-
 # Dialogo del boton de seleccionar elementos a mostrar en la búsqueda
 class ComboDialog(QDialog):
     def __init__(self, items, selected_keys=None, parent=None):
@@ -102,12 +93,17 @@ class ComboDialog(QDialog):
 # Dialogo para seleccionar filtros de las unidades administrativas
 class FilterDialog(QDialog):
     
-    def __init__(self, filters: dict, selected: dict = None, parent=None):
+    def __init__(self, filters: dict, selected: dict = None, parent=None, loading: set = None):
         super().__init__(parent)
         self.setWindowTitle("Seleccionar Unidades Administrativas")
         layout = QVBoxLayout(self)
-        self.lists = {}
+        self.lists: Dict[str, QListView] = {}
+        self.models: Dict[str, FilterListModel] = {}
+        self.proxies: Dict[str, FilterProxyModel] = {}
+        self.search_boxes = {}
         self.parent_tab = parent
+        self.selected = selected or {}
+        self.loading = set(loading or ())
 
         for key, options in filters.items():
             btn = QToolButton(self)
@@ -128,35 +124,31 @@ class FilterDialog(QDialog):
             frame_layout.addWidget(search_box)
 
 
-            listw = QListWidget(self)
-            listw.setSelectionMode(QListWidget.SelectionMode.NoSelection)
+            # Lista respaldada por un modelo: las marcas se guardan en el modelo y la búsqueda
+            # y el orden "marcados primero" los resuelve el proxy sin crear un objeto por elemento
+            model = FilterListModel(self)
+            proxy = FilterProxyModel(model, self)
+            listw = QListView(self)
+            listw.setModel(proxy)
+            listw.setUniformItemSizes(True)
+            listw.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
             listw.setSizePolicy(
                 QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
             )
             listw.setMinimumHeight(140)
 
             
-            search_box.textChanged.connect(lambda text, lw=listw: self.filter_list(text, lw)
-)
-            # Separa elementos en marcados y no marcados
-            checked_options = []
-            unchecked_options = []
-            
-            for opt in options:
-                if selected and key in selected and opt in selected[key]:
-                    checked_options.append(opt)
-                else:
-                    unchecked_options.append(opt)
-            
-            # Agrega primero los marcados, luego los no marcados
-            for opt in checked_options + unchecked_options:
-                it = QListWidgetItem(opt)
-                it.setFlags(it.flags() | CQt.ItemIsUserCheckable)
-                checked = (selected and key in selected and opt in selected[key])
-                it.setCheckState(CQt.Checked if checked else CQt.Unchecked)
-                listw.addItem(it)
-
-            listw.itemChanged.connect(lambda item, k=key: self.on_item_changed(k, item))
+            search_box.textChanged.connect(lambda text, k=key: self.filter_list(k))
+            self.lists[key] = listw
+            self.models[key] = model
+            self.proxies[key] = proxy
+            self.search_boxes[key] = search_box
+            if key in self.loading:
+                self._set_loading(key)
+            else:
+                self._fill_list(key, options, self.selected.get(key, []))
+
+            model.toggled.connect(lambda k=key: self.on_item_changed(k))
             frame_layout.addWidget(listw)
             
             # Agrega botones de seleccionar/deseleccionar todo
@@ -184,7 +176,6 @@ class FilterDialog(QDialog):
                 return toggle
 
             btn.toggled.connect(make_toggler())
-            self.lists[key] = listw
 
         buttons = QDialogButtonBox(
             QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
@@ -201,28 +192,51 @@ class FilterDialog(QDialog):
             if 'provincia' in selected:
                 self.update_dependent_filters('provincia')
 
-    def filter_list(self, text, list_widget):
-        text = text.lower()
-        for i in range(list_widget.count()):
-            item = list_widget.item(i)
-            matches = text in item.text().lower()
-            item.setHidden(not matches)
+    # Rellena la lista de un filtro; el proxy coloca primero los elementos marcados
+    def _fill_list(self, key: str, options: List[str], checked_values: List[str]) -> None:
+        self.models[key].set_values(options, checked_values)
+        self.lists[key].setEnabled(True)
+        self.search_boxes[key].setEnabled(True)
+
+    # Muestra la lista de un filtro en estado de carga mientras se descargan sus datos
+    def _set_loading(self, key: str) -> None:
+        self.models[key].set_placeholder("Cargando...")
+        self.lists[key].setEnabled(False)
+        self.search_boxes[key].setEnabled(False)
+
+    # Rellena la lista de un filtro cuando terminan de llegar sus datos
+    def set_options(self, key: str, options: List[str]) -> None:
+        if key not in self.lists:
+            return
+        # Si la lista ya tenía datos se conservan las marcas actuales; si estaba cargando, la selección inicial
+        if key in self.loading:
+            checked_values = self.selected.get(key, [])
+        else:
+            checked_values = self.get_checked_values(key)
+        self.loading.discard(key)
+        self._fill_list(key, options, checked_values)
+        # Vuelve a aplicar las restricciones de sus filtros padre y propaga su selección a sus hijos
+        if self.parent_tab is not None:
+            index = self.parent_tab.get_filter_index()
+            if index.parents_of(key):
+                self._apply_dependent_filter(key, index)
+            self.update_dependent_filters(key)
+
+    # Filtra la lista por el texto de búsqueda
+    def filter_list(self, key: str) -> None:
+        if key in self.loading:
+            return
+        self.proxies[key].set_search_text(self.search_boxes[key].text())
 
     # Devuelve una lista con los valores seleccionados de un filtro concreto
     def get_checked_values(self, key: str) -> List[str]:
-        res = []
-        listw = self.lists.get(key)
-        if not listw:
-            return res
-        for i in range(listw.count()):
-            it = listw.item(i)
-            if it.checkState() == CQt.Checked:
-                res.append(it.text())
-        return res
+        model = self.models.get(key)
+        if model is None or key in self.loading:
+            return []
+        return model.checked_values()
 
-    # Ordena los elementos de la lista de un filtro colocando primero los marcados 
-    def on_item_changed(self, key: str, item: QListWidgetItem) -> None:
-        self.ordenar_lista(key)
+    # Propaga a los filtros hijos el cambio de marca de un elemento
+    def on_item_changed(self, key: str) -> None:
         self.update_dependent_filters(key)
 
     # Actualiza los filtros hijos dependientes de un filtro padre cuando se cambia la selección de este último
@@ -236,201 +250,62 @@ class FilterDialog(QDialog):
             if self.parent_tab is None:
                 return
 
-            filter_configs = getattr(self.parent_tab, 'filter_configs', {})
-            filters_rows = getattr(self.parent_tab, 'filters_rows', {})
-
-            for child_key, child_config in filter_configs.items():
-                parent_filter = child_config.get('parent_filter')
-                additional_parents = child_config.get('additional_parents', [])
+            index = self.parent_tab.get_filter_index()
 
-                if parent_filter == parent_key or parent_key in additional_parents:
-                    self._apply_dependent_filter(parent_key, child_key, child_config, filters_rows)
+            # Los hijos se recorren en orden (provincia antes que municipio) para que cada uno
+            # vea ya actualizadas las marcas de los filtros de los que depende
+            changed = {parent_key}
+            for child_key in self.parent_tab.filter_configs:
+                if child_key in self.loading or not changed.intersection(index.parents_of(child_key)):
+                    continue
+                self._apply_dependent_filter(child_key, index)
+                changed.add(child_key)
         finally:
             self._updating = False
 
-    # Aplica el filtro dependiente a un filtro hijo específico según la configuración y los valores seleccionados en el padre
-    def _apply_dependent_filter(
-        self,
-        parent_key: str,
-        child_key: str,
-        child_config: dict,
-        filters_rows: dict
-    ) -> None:
-        # Obtiene todos los parents configurados para este hijo
-        main_parent = child_config.get('parent_filter')
-        additional_parents = child_config.get('additional_parents', [])
-        all_parents = [main_parent] if main_parent else []
-        all_parents.extend(additional_parents)
-        
-        # Si el cambio no viene de ninguno de los padres, no hace nada
-        if parent_key not in all_parents:
-            return
-        
-        child_rows = filters_rows.get(child_key, [])
-        display_field = child_config.get('column')
-        
-        if not display_field:
-            return
-        
-        # Recopila IDs permitidos de CADA parent por separado
-        parents_allowed_ids = {}  # {parent_key: {field_name: set(ids)}}
-        
-        for p_key in all_parents:
-            parent_config = getattr(self.parent_tab, 'filter_configs', {}).get(p_key, {})
-            parent_display_field = parent_config.get('column')
-            parent_rows = filters_rows.get(p_key, [])
-            
-            # Obtiene la configuración específica para este parent
-            if p_key == main_parent:
-                parent_key_field = child_config.get('parent_key')
-                child_parent_field = child_config.get('parent_column')
-            else:
-                # Para parents adicionales, usa la configuración específica del parent adicional
-                parent_key_field = child_config.get(f'{p_key}_parent_key')
-                child_parent_field = child_config.get(f'{p_key}_parent_column')
-            
-            if not parent_key_field or not child_parent_field or not parent_display_field:
-                continue
-            
-            selected_parents = self.get_checked_values(p_key)
-            
-            if selected_parents:
-                allowed_ids = set()
-                for prow in parent_rows:
-                    display = (prow.get(parent_display_field) or '').strip()
-                    if display in selected_parents:
-                        parent_id = (prow.get(parent_key_field) or '').strip()
-                        if parent_id:
-                            allowed_ids.add(parent_id)
-                
-                if allowed_ids:
-                    parents_allowed_ids[p_key] = {
-                        'child_parent_field': child_parent_field,
-                        'allowed_ids': allowed_ids
-                    }
-        
-        # Determina qué valores hijo están permitidos
-        allowed_values = set()
-        
-        if parents_allowed_ids:
-            # Solo incluye los hijos que coinciden con TODOS los parents que tienen selecciones
-            for child_row in child_rows:
-                disp = (child_row.get(display_field) or '').strip()
-                if not disp:
-                    continue
-                
-                # Verifica si este hijo coincide con todos los padres seleccionados
-                matches_all_parents = True
-                for p_key, p_data in parents_allowed_ids.items():
-                    child_parent_field = p_data['child_parent_field']
-                    allowed_ids = p_data['allowed_ids']
-                    link = (child_row.get(child_parent_field) or '').strip()
-                    
-                    # Si el hijo no tiene un ID que coincida con este padre, no lo incluye
-                    if link not in allowed_ids:
-                        matches_all_parents = False
-                        break
-                
-                if matches_all_parents:
-                    allowed_values.add(disp)
-        else:
-            # Si no hay padres seleccionados, muestra todos
-            for child_row in child_rows:
-                disp = (child_row.get(display_field) or '').strip()
-                if disp:
-                    allowed_values.add(disp)
-        
-        allowed_values = sorted(list(allowed_values))
-        self._set_list_allowed_values(child_key, allowed_values)
-        self.update_dependent_filters(child_key)
-
-    # Actualiza los elementos de la lista de un filtro hijo según los valores permitidos calculados
-    def _set_list_allowed_values(self, key: str, allowed: List[str]) -> None:
-        listw = self.lists.get(key)
-        if listw is None:
-            return
+    # Aplica el filtro dependiente a un filtro hijo a partir de los índices precalculados de la pestaña.
+    # Solo se consultan los padres con selección; si ninguno la tiene se muestran todos los valores
+    def _apply_dependent_filter(self, child_key: str, index: DependencyIndex) -> None:
+        selections = {
+            p_key: self.get_checked_values(p_key)
+            for p_key in index.parents_of(child_key)
+        }
+        self._set_list_allowed_values(child_key, index.allowed_values(child_key, selections))
 
-        current_checks = {}
-        for i in range(listw.count()):
-            it = listw.item(i)
-            current_checks[it.text()] = (it.checkState() == CQt.Checked)
-
-        listw.blockSignals(True)
-        listw.clear()
-        for val in allowed:
-            it = QListWidgetItem(val)
-            it.setFlags(it.flags() | CQt.ItemIsUserCheckable)
-            checked = current_checks.get(val, False)
-            it.setCheckState(CQt.Checked if checked else CQt.Unchecked)
-            listw.addItem(it)
-        listw.blockSignals(False)
-        self.adjustSize()
+    # Guarda los valores permitidos de un filtro hijo y vuelve a filtrar su lista
+    def _set_list_allowed_values(self, key: str, allowed: Optional[Set[str]]) -> None:
+        if key not in self.models:
+            return
+        self.models[key].set_allowed(allowed)
+        self.proxies[key].refresh()
 
     # Recopila los valores seleccionados en el dialogo para devolverlos a la pestaña principal
     def get_selected(self) -> dict:
         res = {}
-        for key, listw in self.lists.items():
-            selected = []
-            for i in range(listw.count()):
-                item = listw.item(i)
-                if item.checkState() == CQt.Checked:
-                    selected.append(item.text())
+        for key in self.lists:
+            # Si la lista sigue cargando se conserva la selección anterior
+            if key in self.loading:
+                if self.selected.get(key):
+                    res[key] = list(self.selected[key])
+                continue
+            selected = self.get_checked_values(key)
             if selected:
                 res[key] = selected
         return res
 
-    # Ordena los elementos de la lista de un filtro colocando primero los marcados 
-    def ordenar_lista(self, key: str) -> None:
-        listw = self.lists.get(key)
-        if listw is None:
-            return
-
-        checked_items = []
-        unchecked_items = []
-
-        for i in range(listw.count()):
-            item = listw.item(i)
-            if item.checkState() == CQt.Checked:
-                checked_items.append((item.text(), True))
-            else:
-                unchecked_items.append((item.text(), False))
-
-        listw.blockSignals(True)
-        listw.clear()
-        for text, is_checked in checked_items + unchecked_items:
-            new_item = QListWidgetItem(text)
-            new_item.setFlags(new_item.flags() | CQt.ItemIsUserCheckable)
-            new_item.setCheckState(CQt.Checked if is_checked else CQt.Unchecked)
-            listw.addItem(new_item)
-        listw.blockSignals(False)
-
     # Funcion para seleccionar todos los elementos de un filtro
     def select_all(self, key: str) -> None:
-        
-        listw = self.lists.get(key)
-        if listw is None:
+        if key not in self.models or key in self.loading:
             return
-        
-        listw.blockSignals(True)
-        for i in range(listw.count()):
-            item = listw.item(i)
-            item.setCheckState(CQt.Checked)
-        listw.blockSignals(False)
-    
+        # Solo se marcan los elementos permitidos por los filtros padre
+        self.models[key].set_all_checked(True)
         self.update_dependent_filters(key)
 
     # Funcion para deseleccionar todos los elementos de un filtro
     def deselect_all(self, key: str) -> None:
-        listw = self.lists.get(key)
-        if listw is None:
+        if key not in self.models or key in self.loading:
             return
-        
-        listw.blockSignals(True)
-        for i in range(listw.count()):
-            item = listw.item(i)
-            item.setCheckState(CQt.Unchecked)
-        listw.blockSignals(False)
-        
+        self.models[key].set_all_checked(False)
         self.update_dependent_filters(key)
 
 # Pestaña general de búsqueda por nombre
@@ -449,6 +324,7 @@ class NameTab(QWidget):
 
         self.iface = iface
         self.layers = {}
+        self.schemas: Dict[str, LayerSchema] = {}
         self.selected_elements = []
         self.filter_selection = {}
 
@@ -459,10 +335,17 @@ class NameTab(QWidget):
             'municipio': []
         }
 
-        self.filters_rows: Dict[str, List[Dict[str, str]]] = {}
+        self.filter_tables: Dict[str, FilterTable] = {}
+        self._filter_index: Optional[DependencyIndex] = None
         self.filter_configs: Dict[str, Dict[str, Any]] = {}
+        self._filters_loading = set()
+        self._filters_meta: Dict[str, Dict[str, str]] = {}
+        self.filter_dialog: Optional[FilterDialog] = None
+        self.candidates_request = LatestRequest()
+        self.accumulator = LayerAccumulator(self)
 
         self.create_layout()
+        self.load_filters()
         
         # Muestra los filtros guardados en la etiqueta al inicializar
         if self.filter_selection:
@@ -484,6 +367,9 @@ class NameTab(QWidget):
         self.localizacion = QLineEdit()
         self.localizacion.setPlaceholderText('Dirección, unidad administrativa, código postal o referencia catastral')
         layout.addWidget(self.localizacion)
+        self.completer = LocationCompleter(
+            self.localizacion, lambda: self.build_filter_params(show_errors=False), self.local_candidates
+        )
 
         lbl_cp = QLabel('(Opcional) Filtro por código postal:')
         layout.addWidget(lbl_cp)
@@ -523,16 +409,17 @@ class NameTab(QWidget):
         self.buscar.setStyleSheet('font-weight: bold;')
         layout.addWidget(self.buscar)
 
-        self.tabla_resultados = QTableWidget()
-        self.tabla_resultados.setColumnCount(2)
-        self.tabla_resultados.setHorizontalHeaderLabels(['Candidatos', 'Tipo'])
+        self.btn_batch = QPushButton('Geocodificación por lotes')
+        self.btn_batch.clicked.connect(self.open_batch_dialog)
+        layout.addWidget(self.btn_batch)
+
+        self.candidates_model = ResultsTableModel(['Candidatos', 'Tipo'], selectable_columns=[0], parent=self)
+        self.tabla_resultados = ResultsTableView()
+        self.tabla_resultados.setModel(self.candidates_model)
 
         self.tabla_resultados.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectItems)
         self.tabla_resultados.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
 
-        self.tabla_resultados.horizontalHeader().setStretchLastSection(False)
-        self.tabla_resultados.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        
         self.tabla_resultados.setSizePolicy(
             QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         )
@@ -543,22 +430,27 @@ class NameTab(QWidget):
         self.buscar.clicked.connect(self.on_search_name)
         self.localizacion.returnPressed.connect(self.on_search_name)
         self.cp.returnPressed.connect(self.on_search_name)
-        self.tabla_resultados.cellDoubleClicked.connect(self.find_location)
+        self.tabla_resultados.doubleClicked.connect(lambda index: self.find_location(index.row(), index.column()))
         self.tabla_resultados.verticalHeader().sectionDoubleClicked.connect(
             self.handle_row_double_click
         )
-        self.tabla_resultados.itemSelectionChanged.connect(self.highlight_tipo_column)
+        self.tabla_resultados.selectionModel().selectionChanged.connect(self.highlight_tipo_column)
 
     # Abre el dialogo para seleccionar los filtros y crea la lista de los seleccionados
+    # Si los filtros aún no se han descargado, el dialogo se abre en estado de carga y se rellena al llegar los datos
     def open_filter_dialog(self) -> None:
-        if not any(self.filters_data.values()):
-            self.load_filters_from_github()
+        if not any(self.filters_data.values()) and not self._filters_loading:
+            self.load_filters()
 
         filters_for_dialog = {k: v for k, v in self.filters_data.items() if k != 'codigo_postal'}
         selected = getattr(self, 'filter_selection', {})
-        dlg = FilterDialog(filters_for_dialog, selected, self)
+        dlg = FilterDialog(filters_for_dialog, selected, self, loading=set(self._filters_loading))
+
+        self.filter_dialog = dlg
+        accepted = dlg.exec()
+        self.filter_dialog = None
 
-        if dlg.exec():
+        if accepted:
             self.filter_selection = dlg.get_selected()
             if self.filter_selection:
                 parts = []
@@ -573,54 +465,51 @@ class NameTab(QWidget):
 
             self.localizacion.setFocus()
 
+    # Abre el dialogo de geocodificación por lotes, que reutiliza los filtros seleccionados en esta pestaña
+    def open_batch_dialog(self) -> None:
+        if getattr(self, 'batch_dialog', None) is None:
+            self.batch_dialog = BatchGeocodeDialog(self.build_filter_params, self)
+        self.batch_dialog.show()
+        self.batch_dialog.raise_()
+
     def _save_filters(self, filters: dict) -> None:
         self._session_filters = filters.copy()
  
     def _load_filters(self) -> dict:
         return self._session_filters.copy()
     
-    # Define la configuración de los filtros y llama a la función para cargar cada filtro desde GitHub
-    def load_filters_from_github(self) -> None:
-        filter_mapping = {
-            'comunidad_autonoma': {
-                'url': 'https://raw.githubusercontent.com/IDEESpain/PluginQGISCartociudad/main/Documentacion_auxiliar/cartociudad.comunidad_autonoma.csv',
-                'backup_url': 'https://www.idee.es/resources/documentos/Cartociudad/cartociudad.comunidad_autonoma.csv',
-                'column': 'nom_comunidad',
-                'parent_key': 'id_com',
-                'defaults': ['No se han cargado los datos']
-            },
-            'provincia': {
-                'url': 'https://raw.githubusercontent.com/IDEESpain/PluginQGISCartociudad/main/Documentacion_auxiliar/cartociudad.provincia.csv',
-                'backup_url': 'https://www.idee.es/resources/documentos/Cartociudad/cartociudad.provincia.csv',
-                'column': 'nom_provincia',
-                'parent_filter': 'comunidad_autonoma',
-                'parent_key': 'id_com',
-                'parent_column': 'id_com',
-                'defaults': ['No se han cargado los datos']
-            },
-            'municipio': {
-                'url': 'https://raw.githubusercontent.com/IDEESpain/PluginQGISCartociudad/main/Documentacion_auxiliar/cartociudad.municipio.csv',
-                'backup_url': 'https://www.idee.es/resources/documentos/Cartociudad/cartociudad.municipio.csv',
-                'column': 'nom_municipio',
-                'parent_filter': 'comunidad_autonoma',
-                'parent_key': 'id_com',
-                'parent_column': 'id_com',
-                'additional_parents': ['provincia'],
-                'provincia_parent_key': 'ine_prov',
-                'provincia_parent_column': 'ine_prov',
-                'defaults': ['No se han cargado los datos']
-            }
-        }
-        self.filter_configs = filter_mapping
-        for filter_key, config in filter_mapping.items():
+    # Carga los filtros desde disco (copia actualizada en el perfil o, si no existe, la incluida en el plugin)
+    # y comprueba en segundo plano si hay una versión más reciente en GitHub o en idee.es
+    def load_filters(self) -> None:
+        self.filter_configs = FILTER_CONFIGS
+        self._filters_meta = read_meta()
+        missing = []
+        for filter_key, config in FILTER_CONFIGS.items():
+            if not self._load_filter_from_disk(filter_key, config):
+                missing.append(filter_key)
+
+        # Solo quedan en estado de carga los filtros sin copia local; el resto se refresca sin bloquear
+        self._filters_loading = set(missing)
+        for filter_key, config in FILTER_CONFIGS.items():
             self._load_filter_from_github(filter_key, config)
 
-    #Procesa el CSV para extraer los valores únicos de la columna especificada
+    # Carga un filtro desde la primera copia local válida. Devuelve False si no hay ninguna
+    def _load_filter_from_disk(self, filter_key: str, config: Dict[str, Any]) -> bool:
+        for origin, path in local_paths(config).items():
+            csv_text = read_local_csv(path)
+            if csv_text is None:
+                continue
+            if self._apply_filter_csv(filter_key, config, csv_text, f"{origin} ({path})", use_defaults=False):
+                # Los validadores guardados solo sirven para la copia del perfil
+                if origin != 'perfil':
+                    self._filters_meta.pop(filter_key, None)
+                return True
+        self._filters_meta.pop(filter_key, None)
+        return False
+
+    # Procesa el CSV para extraer los valores únicos de la columna especificada.
+    # La descarga es asíncrona: si la URL principal falla se prueba con las de respaldo
     def _load_filter_from_github(self, filter_key: str, config: Dict[str, Any]) -> None:
-        github_url = config['url']
-        column_name = config['column']
-        defaults: List[str] = config.get('defaults', [])
-
         raw_backup = config.get('backup_url', [])
         if isinstance(raw_backup, str):
             backup_urls = [raw_backup] if raw_backup.strip() else []
@@ -628,126 +517,121 @@ class NameTab(QWidget):
             backup_urls = [u.strip() for u in raw_backup if isinstance(u, str) and u.strip()]
         else:
             backup_urls = []
-        used_source = None
-        last_error = None
-        csv_text = None
-        try:
-            print(f"Cargando {filter_key} desde GitHub: {github_url}")
-            response = urlopen(github_url, timeout=10)
-            raw = response.read()
-            if _looks_like_html(raw, getattr(response, 'headers', {})):
-                raise ValueError(
-                    "La URL principal devolvió HTML (no es CSV raw). Usa el enlace Raw."
-                )
-            csv_text = raw.decode('utf-8')
-            used_source = f"GitHub-CSV ({github_url})"
-        except (URLError, Exception) as e:
-            last_error = e
-            error_desc = _get_url_error_message(e)
-            print(f"Error cargando {filter_key} desde GitHub: {error_desc}")
-
-        if csv_text is None and backup_urls:
-            for bu in backup_urls:
-                try:
-                    print(f"Reintentando {filter_key} desde backup_url: {bu}")
-                    response = urlopen(bu, timeout=10)
-                    raw = response.read()
-                    if _looks_like_html(raw, getattr(response, 'headers', {})):
-                        raise ValueError("El backup devolvió HTML (no es CSV raw).")
-                    csv_text = raw.decode('utf-8')
-                    used_source = f"Backup-CSV ({bu})"
-                    break
-                except (URLError, Exception) as e:
-                    last_error = e
-                    error_desc = _get_url_error_message(e)
-                    print(f"Error cargando {filter_key} desde backup_url {bu}: {error_desc}")
-
-        if csv_text is None:
-            error_desc = _get_url_error_message(last_error) if last_error else "Error desconocido"
-            print(f"No se pudo cargar {filter_key} de ninguna fuente. {error_desc}")
-            self.filters_data[filter_key] = defaults
-            self.filters_rows[filter_key] = []
-            print(f"Usando valores por defecto para {filter_key}")
-            # Mostrar advertencia solo si no es la primera carga silenciosa
-            if hasattr(self, '_filters_init_shown'):
-                QMessageBox.warning(
-                    None,
-                    "Advertencia de filtros",
-                    f"No se pudieron cargar los filtros para {filter_key}.\n\n{error_desc}\n\nUsando valores por defecto."
-                )
+        self._request_filter_csv(filter_key, config, [config['url']] + backup_urls, 0, None)
+
+    # Pide el CSV de un filtro a la URL indicada por su posición en la lista de fuentes,
+    # de forma condicional si ya se tiene una copia descargada de esa misma URL
+    def _request_filter_csv(
+        self,
+        filter_key: str,
+        config: Dict[str, Any],
+        urls: List[str],
+        index: int,
+        last_error: Optional[str]
+    ) -> None:
+        if index >= len(urls):
+            self._filter_load_failed(filter_key, config, last_error)
+            return
+        print(f"Cargando {filter_key} desde: {urls[index]}")
+        geocoder_client().get(
+            urls[index],
+            lambda reply: self._on_filter_csv(filter_key, config, urls, index, reply),
+            headers=conditional_headers(self._filters_meta.get(filter_key, {}), urls[index]),
+            use_cache=False,
+            timeout=FILTER_TIMEOUT_MS
+        )
+
+    # Recibe el CSV de un filtro; si no es válido pasa a la siguiente fuente
+    def _on_filter_csv(
+        self,
+        filter_key: str,
+        config: Dict[str, Any],
+        urls: List[str],
+        index: int,
+        reply: GeocoderResponse
+    ) -> None:
+        if reply.ok() and reply.status == 304:
+            print(f"{filter_key} ya está actualizado ({urls[index]})")
+            self._filter_loaded(filter_key, changed=False)
             return
+
+        error_desc = None
+        if not reply.ok():
+            error_desc = _get_error_message(reply.error)
+        elif _looks_like_html(reply.data, reply.headers.get('content-type', '')):
+            error_desc = "La URL devolvió HTML (no es CSV raw). Usa el enlace Raw."
+        elif not self._apply_filter_csv(
+            filter_key, config, reply.data.decode('utf-8', errors='replace'),
+            f"{'GitHub-CSV' if index == 0 else 'Backup-CSV'} ({urls[index]})",
+            use_defaults=False
+        ):
+            error_desc = "El CSV descargado no es válido."
+        if error_desc is not None:
+            print(f"Error cargando {filter_key} desde {urls[index]}: {error_desc}")
+            self._request_filter_csv(filter_key, config, urls, index + 1, error_desc)
+            return
+
+        save_download(filter_key, config, reply.data, urls[index], reply.headers, self._filters_meta)
+        clear_gazetteer()
+        self._filter_loaded(filter_key)
+
+    # Si ninguna fuente ha respondido se mantiene la copia local; sin ella se usan los valores por defecto
+    def _filter_load_failed(self, filter_key: str, config: Dict[str, Any], error_desc: Optional[str]) -> None:
+        error_desc = error_desc or "Error desconocido"
+        if filter_key in self.filter_tables:
+            print(f"No se pudo actualizar {filter_key}; se mantiene la copia local. {error_desc}")
+            self._filter_loaded(filter_key, changed=False)
+            return
+        print(f"No se pudo cargar {filter_key} de ninguna fuente. {error_desc}")
+        self.filters_data[filter_key] = config.get('defaults', [])
+        print(f"Usando valores por defecto para {filter_key}")
+        # Mostrar advertencia solo si no es la primera carga silenciosa
+        if hasattr(self, '_filters_init_shown'):
+            QMessageBox.warning(
+                None,
+                "Advertencia de filtros",
+                f"No se pudieron cargar los filtros para {filter_key}.\n\n{error_desc}\n\nUsando valores por defecto."
+            )
+        self._filter_loaded(filter_key)
+
+    # Marca un filtro como cargado y, si sus datos han cambiado, actualiza el dialogo si está abierto
+    def _filter_loaded(self, filter_key: str, changed: bool = True) -> None:
+        self._filters_loading.discard(filter_key)
+        if changed and self.filter_dialog is not None:
+            self.filter_dialog.set_options(filter_key, self.filters_data[filter_key])
+
+    # Interpreta el texto CSV de un filtro y guarda sus filas y los valores únicos de la columna.
+    # Devuelve False si el CSV no es válido; con use_defaults se cargan entonces los valores por defecto
+    def _apply_filter_csv(
+        self,
+        filter_key: str,
+        config: Dict[str, Any],
+        csv_text: str,
+        used_source: str,
+        use_defaults: bool = True
+    ) -> bool:
         try:
-            delimiter = _detect_delimiter(csv_text)
-            reader = csv.DictReader(StringIO(csv_text), delimiter=delimiter)
-            clean_rows: List[dict] = []
-            for row in reader:
-                if not row:
-                    continue
-                clean = {
-                    (k.replace('\ufeff', '').strip() if isinstance(k, str) else k):
-                    (v.strip() if isinstance(v, str) else v)
-                    for k, v in row.items()
-                }
-                clean_rows.append(clean)
-            if not clean_rows:
-                raise ValueError(f"El archivo para {filter_key} está vacío ({used_source})")
-            target_col = column_name.replace('\ufeff', '').strip()
-            cols = set([
-                (c.replace('\ufeff', '').strip() if isinstance(c, str) else c)
-                for c in clean_rows[0].keys()
-            ])
-            if target_col not in cols:
-                candidate = None
-                for c in cols:
-                    if isinstance(c, str) and c.strip().lower() == target_col.lower():
-                        candidate = c
-                        break
-                if candidate:
-                    print(f"La columna '{column_name}' no coincide exactamente; usando '{candidate}'.")
-                    target_col = candidate
-                else:
-                    raise KeyError(
-                        f"No se encontró la columna '{column_name}' en {used_source}. "
-                        f"Columnas disponibles: {sorted(list(cols))}"
-                    )
-            self.filters_rows[filter_key] = clean_rows
-            items = self._parse_csv_column(csv_text, target_col, delimiter)
-            if items:
-                self.filters_data[filter_key] = items
-                print(f"Se cargaron {len(items)} registros para {filter_key} desde {used_source}")
-            else:
-                raise ValueError(
-                    f"La fuente de {filter_key} ({used_source}) no contiene datos "
-                    f"en la columna '{target_col}'."
-                )
-        except Exception as e:
+            table = parse_filter_csv(csv_text, config['column'])
+        except (ValueError, KeyError) as e:
             print(f"Error procesando {filter_key} desde {used_source}: {e}")
-            self.filters_data[filter_key] = defaults
-            self.filters_rows[filter_key] = []
-            print(f"Usando valores por defecto para {filter_key}")
-    # Extrae los valores de una columna concreta del CSV
-    def _parse_csv_column(self, csv_content: str, column_name: str, delimiter: str = ',') -> List[str]:
-        items = set()
-        try:
-            reader = csv.DictReader(StringIO(csv_content), delimiter=delimiter)
-            column_name = column_name.replace('\ufeff', '').strip()
-            for row in reader:
-                if not row:
-                    continue
-                clean_row = {
-                    k.replace('\ufeff', '').strip(): (v.strip() if isinstance(v, str) else v)
-                    for k, v in row.items()
-                }
-                if column_name in clean_row:
-                    value = clean_row[column_name]
-                    item = value.strip() if isinstance(value, str) else value
-                    if item:
-                        items.add(item)
-        except Exception as e:
-            print(f"Error parseando CSV: {e}")
-            return []
+            if use_defaults:
+                self.filters_data[filter_key] = config.get('defaults', [])
+                self.filter_tables.pop(filter_key, None)
+                self._filter_index = None
+                print(f"Usando valores por defecto para {filter_key}")
+            return False
+        self.filter_tables[filter_key] = table
+        self._filter_index = None
+        self.filters_data[filter_key] = table.display_values
+        print(f"Se cargaron {len(table.display_values)} registros para {filter_key} desde {used_source}")
+        return True
+
+    # Devuelve los índices padre -> hijo de los filtros, calculándolos de nuevo solo si ha cambiado alguna tabla
+    def get_filter_index(self) -> DependencyIndex:
+        if self._filter_index is None:
+            self._filter_index = DependencyIndex(self.filter_tables, self.filter_configs)
+        return self._filter_index
 
-        return sorted(list(items))
     # Abre el dialogo para seleccionar los elementos a mostrar en la búsqueda y crea la lista de los seleccionados
     def open_dialog(self):
         todos_elementos = {
@@ -777,172 +661,146 @@ class NameTab(QWidget):
 
     # Construye la URL de búsqueda con los filtros seleccionados y llama a la función para obtener los candidatos
     def on_search_name(self) -> None:
-        url = f'{API_GEOCODER}/candidates?q={self.localizacion.text()}&limit={LIMIT}'
-        if self.filter_selection.get('comunidad_autonoma'):
-            comunidades = self.filter_selection['comunidad_autonoma']
-            comunidades_str = ','.join([c.strip() for c in comunidades if c.strip()])
-            if comunidades_str:
-                url += f'&comunidad_autonoma_filter={comunidades_str}'
-        if self.filter_selection.get('provincia'):
-            provincias = self.filter_selection['provincia']
-            provincias_str = ','.join([p.strip() for p in provincias if p.strip()])
-            if provincias_str:
-                url += f'&provincia_filter={provincias_str}'
-        if self.filter_selection.get('municipio'):
-            municipios = self.filter_selection['municipio']
-            municipios_str = ','.join([m.strip() for m in municipios if m.strip()])
-            if municipios_str:
-                url += f'&municipio_filter={municipios_str}'
-        if self.cp.text() != '':
-            codigos = self.cp.text().split(',')
-            codigos = [codigo.strip() for codigo in codigos]
-            if all(codigo.isdigit() and len(codigo) == 5 for codigo in codigos):
-                codigos_str = ','.join(codigos)
-                url += f'&cod_postal_filter={codigos_str}'
-            else:
-                QMessageBox.critical(None, "Error", "Algunos códigos postales no son válidos")
-                return
-        print(f'Buscar: {url}')
-
-        todos_elementos = [
-            'poblacion', 'municipio', 'provincia', 'comunidad autonoma',
-            'toponimo', 'callejero', 'carretera', 'portal',
-            'expendeduria', 'punto_recarga_electrica', 'ngbe'
-        ]
+        self.completer.cancel()
+        params = self.build_filter_params()
+        if params is None:
+            return
 
-        seleccionados = self.selected_elements
-        seleccionados_norm = [s.strip().lower() for s in seleccionados]
-        todos_norm = [t.strip().lower() for t in todos_elementos]
-
-        if seleccionados_norm:
-            if all(s in todos_norm for s in seleccionados_norm):
-                elementos_excluir = [
-                    todos_elementos[idx]
-                    for idx, t in enumerate(todos_norm)
-                    if t not in seleccionados_norm
-                ]
-                elementos_excluir_str = ','.join(elementos_excluir)
-                url += f'&no_process={elementos_excluir_str}'
-                print(
-                    f'[DEBUG] elementos_incluir={seleccionados}, '
-                    f'elementos_excluir={elementos_excluir_str}'
-                )
-            else:
-                QMessageBox.critical(None, "Error", "Algunos elementos seleccionados no son válidos")
-                return
+        candidates = self.local_candidates(self.localizacion.text())
+        if candidates:
+            print(f"Candidatos del nomenclátor sin conexión: {len(candidates)}")
+            self.candidates_request.abort()
+            self.show_candidate_rows(candidates)
+            return
 
+        url = candidates_url(self.localizacion.text(), params)
         print(f'Buscar: {url}')
 
-        self.tabla_resultados.clearContents()
-        self.tabla_resultados.setRowCount(0)
+        self.candidates_model.clear()
         self.get_candidates(url)
 
+    # Candidatos del nomenclátor sin conexión cuando solo se buscan municipios, provincias o comunidades autónomas
+    # y no hay filtros por unidad administrativa ni por código postal. Devuelve None si la búsqueda no se puede
+    # responder sin el servicio (o no hay ningún nombre parecido, y entonces se consulta candidates)
+    def local_candidates(self, text: str) -> Optional[List[Candidate]]:
+        if not gazetteer_applies(self.selected_elements) or self.filter_selection or self.cp.text().strip():
+            return None
+        return gazetteer().search(text, self.selected_elements) or None
+
+    # Construye los parámetros de filtrado por unidades administrativas, códigos postales y tipo de elemento.
+    # Devuelve None si algún filtro no es válido (con show_errors se avisa además al usuario)
+    def build_filter_params(self, show_errors: bool = True) -> Optional[str]:
+        try:
+            params = filter_params(self.filter_selection, self.cp.text(), self.selected_elements)
+        except ValueError as e:
+            if show_errors:
+                QMessageBox.critical(None, "Error", str(e))
+            return None
+        if show_errors and self.selected_elements:
+            print(f'[DEBUG] elementos_incluir={self.selected_elements}, params={params}')
+        return params
+
     # Realiza la petición a la API para obtener los candidatos según la URL construida
     def get_candidates(self, url: str) -> None:
         print(f"Haciendo petición a la URL: {url}")
-        self.manager_candidates = QtNetwork.QNetworkAccessManager()
-        self.manager_candidates.finished.connect(self.show_candidates)
-        req = QtNetwork.QNetworkRequest(QUrl(url))
-        self.manager_candidates.get(req)
+        self.candidates_request.get(url, self.show_candidates)
         
     # Recibe la respuesta de la API, procesa los candidatos encontrados y los muestra en la tabla de resultados.
-    def show_candidates(self, reply: QtNetwork.QNetworkReply) -> None:
-        er = reply.error()
-        if er == QtNetwork.QNetworkReply.NetworkError.NoError:
+    def show_candidates(self, reply: GeocoderResponse) -> None:
+        er = reply.error
+        if reply.ok():
             print("Respuesta de la API recibida correctamente.")
-            bytes_string = reply.readAll()
-            response = str(bytes_string, 'utf-8')
-            print(f"Respuesta JSON de la API: {response}")
-            candidates = json.loads(response)
+            try:
+                candidates = parse_candidates(reply.data)
+            except GeocoderError as e:
+                QMessageBox.critical(None, "Error", str(e))
+                return
 
             if not candidates:
                 QMessageBox.warning(None, "¡Atención!", "No se encontraron candidatos.")
-                self.tabla_resultados.setRowCount(1)
-
-                no_result_item = QTableWidgetItem("No se encontraron resultados")
-                no_result_item.setFlags(CQt.ItemIsEnabled)
-                no_result_item.setForeground(QBrush(QColor(255, 0, 0)))
-
-                type_item = QTableWidgetItem("No se encontraron resultados")
-                type_item.setFlags(CQt.ItemIsEnabled)
-                type_item.setForeground(QBrush(QColor(255, 0, 0)))
-
-                self.tabla_resultados.setItem(0, 0, no_result_item)
-                self.tabla_resultados.setItem(0, 1, type_item)
-                self.tabla_resultados.resizeColumnsToContents()
-                self.tabla_resultados.resizeRowsToContents()
+                self.candidates_model.set_message("No se encontraron resultados")
                 return
 
             print(f"Número de candidatos encontrados: {len(candidates)}")
-            self.tabla_resultados.setRowCount(len(candidates))
-
-            for index, candidate in enumerate(candidates):
-                print(f"Candidato {index + 1}: {candidate['address']}, Tipo: {candidate['type']}")
-
-                item_address = QTableWidgetItem(candidate['address'])
-                item_address.setFlags(CQt.ItemIsSelectable | CQt.ItemIsEnabled)
-                item_address.setData(CQt.UserRole, candidate['id'])
-
-                item_type = QTableWidgetItem(candidate['type'])
-                item_type.setFlags(CQt.ItemIsEnabled)
-
-                self.tabla_resultados.setItem(index, 0, item_address)
-                self.tabla_resultados.setItem(index, 1, item_type)
-
-            self.tabla_resultados.horizontalHeader().setStretchLastSection(True)
-            self.tabla_resultados.resizeColumnsToContents()
-            self.tabla_resultados.resizeRowsToContents()
-
-            header = self.tabla_resultados.horizontalHeader()
-            for col in range(self.tabla_resultados.columnCount()):
-                header.setSectionResizeMode(col, QHeaderView.ResizeMode.Interactive)
-
-            self.tabla_resultados.updateGeometry()
-            self.tabla_resultados.repaint()
+            self.show_candidate_rows(candidates)
         else:
             error_message = _get_error_message(er)
             QMessageBox.critical(None, "Error de conexión", error_message)
 
-    # Construye la URL para obtener la localización del candidato seleccionado y llama a la función para obtenerla
-    def find_location(self, row: int, column: int) -> None:
-        self.tabla_resultados.selectRow(row)
-
-        address_item = self.tabla_resultados.item(row, 0)
-        type_item = self.tabla_resultados.item(row, 1)
+    def show_candidate_rows(self, candidates: List[Candidate]) -> None:
+        for index, candidate in enumerate(candidates):
+            print(f"Candidato {index + 1}: {candidate.address}, Tipo: {candidate.type}")
+        self.candidates_model.set_rows(
+            ((str(candidate.address or ''), str(candidate.type or '')) for candidate in candidates), candidates
+        )
 
-        if address_item is None or type_item is None:
+    # Construye la URL para obtener la localización del candidato seleccionado y llama a la función para obtenerla.
+    # Los candidatos del nomenclátor no tienen el id del servicio y se buscan antes con candidates
+    def find_location(self, row: int, column: int) -> None:
+        candidate = self.candidates_model.payload(row)
+        if candidate is None:
             return
 
-        candidate_id = address_item.data(CQt.UserRole)
-        candidate_type = type_item.text()
+        self.tabla_resultados.selectionModel().select(
+            self.candidates_model.index(row, 0), QItemSelectionModel.SelectionFlag.ClearAndSelect
+        )
+        if candidate.id is None:
+            self.resolve_local_candidate(candidate)
+            return
+        url = find_url(candidate.id, candidate.type)
+        self.get_location(url)
+        print(f'Buscar: {url}')
 
-        url = f'{API_GEOCODER}/find?id={candidate_id}&type={candidate_type}'
+    # Busca en candidates la unidad administrativa elegida en el nomenclátor (los municipios, dentro de su provincia)
+    # para obtener su id y pedir después su geometría a find
+    def resolve_local_candidate(self, candidate: Candidate) -> None:
+        name = str(candidate.raw.get('name') or candidate.address or '')
+        province = candidate.raw.get('province')
+        filters = {'provincia': [province]} if candidate.type == 'municipio' and province else None
+        url = candidates_url(name, filter_params(filters, None, [candidate.type]))
+        print(f'Buscar candidato del nomenclátor: {url}')
+        geocoder_client().get(url, lambda reply: self.on_local_candidate(reply, name, candidate.type))
+
+    # Elige entre los candidatos del servicio el que corresponde a la unidad del nomenclátor y pide su localización
+    def on_local_candidate(self, reply: GeocoderResponse, name: str, unit_type: str) -> None:
+        if not reply.ok():
+            QMessageBox.critical(None, "Error de conexión", _get_error_message(reply.error))
+            return
+        try:
+            found = pick_admin_candidate(parse_candidates(reply.data), name, unit_type)
+        except GeocoderError as e:
+            QMessageBox.critical(None, "Error", str(e))
+            return
+        if found is None:
+            QMessageBox.warning(None, "¡Atención!", "No se encontró el elemento en el servicio.")
+            return
+        url = find_url(found.id, found.type)
         self.get_location(url)
         print(f'Buscar: {url}')
 
     # Permite hacer doble click en cualquier parte de la fila para seleccionar el candidato
     def handle_row_double_click(self, row):
-        self.tabla_resultados.selectRow(row)
         self.find_location(row, 0)
 
     #Hace una petición a la API y llama a la función que dibuja la localización
     def get_location(self, url):
-        self.manager_locate = QtNetwork.QNetworkAccessManager()
-        self.manager_locate.finished.connect(self.draw_location)
-        req = QtNetwork.QNetworkRequest(QUrl(url))
-        self.manager_locate.get(req)
+        geocoder_client().get(url, self.draw_location)
 
     # Procesa la respuesta de la API para obtener la localización del candidato seleccionado
-    def draw_location(self, reply: QtNetwork.QNetworkReply) -> None:
+    def draw_location(self, reply: GeocoderResponse) -> None:
         print('Recibiendo respuesta del servicio find...')
-        er = reply.error()
-        if er == QtNetwork.QNetworkReply.NetworkError.NoError:
-            bytes_string = reply.readAll()
-            response = str(bytes_string, 'utf-8')
-            location = json.loads(response)
-            print('Localización: ')
-            print(location)
-            self.handle_location(location)
+        er = reply.error
+        if reply.ok():
+            try:
+                location = parse_location(reply.data)
+            except GeocoderError as e:
+                QMessageBox.critical(None, "Error", str(e))
+                return
+            print(f'Localización: {location}')
+            if location is None or not location.geom:
+                QMessageBox.warning(None, "¡Atención!", "El elemento no tiene geometría.")
+                return
+            self.handle_location(location.raw)
         else:
             error_message = _get_error_message(er)
             QMessageBox.critical(None, "Error de conexión", error_message)
@@ -950,6 +808,9 @@ class NameTab(QWidget):
     # Determina el tipo de geometría a partir del WKT recibido en la respuesta de la API y añade la geometría al mapa
     def handle_location(self, location: Dict[str, Union[Any, List[Any]]]) -> None:
         wkt = location['geom']
+        if accumulate_enabled():
+            self.add_to_accumulated_layer(location)
+            return
         new_geometry_type = self.get_geometry_type(wkt)
         layer_name = self.create_layer(new_geometry_type, location)
         self.add_feature_to_layer(location, layer_name)
@@ -962,28 +823,8 @@ class NameTab(QWidget):
         if not location_type:
             raise ValueError("El campo 'type' no está definido en la ubicación.")
 
-        grupos = {
-            'callejero': 'Viales',
-            'carretera': 'Viales',
-            'expendeduria': 'Puntos_interes',
-            'punto_recarga_electrica': 'Puntos_interes',
-            'ngbe': 'Puntos_interes',
-            'toponimo': 'Puntos_interes',
-            'poblacion': 'Poblaciones',
-            'portal': 'Portales_pk',
-            'municipio': 'Municipios',
-            'provincia': 'Provincias',
-            'comunidad autonoma': 'Comunidades_sim',
-            'codpost': 'Codigos_postales',
-            'refcatastral': 'Referencia_catastral'
-        }
-
-        group_name = grupos.get(location_type, "Otro")
-
-        root = QgsProject.instance().layerTreeRoot()
-        group = root.findGroup(group_name)
-        if group is None:
-            group = root.addGroup(group_name)
+        group_name = type_group(location_type)
+        group = layer_group(group_name)
 
         group_layer_names = [
             child.layer().name()
@@ -1035,49 +876,14 @@ class NameTab(QWidget):
         crs = QgsCoordinateReferenceSystem.fromEpsgId(4326)
         layer.setCrs(crs)
 
-        base_path = os.path.dirname(__file__)
+        apply_style(layer, group_name, location_type)
 
-        estilo_por_grupo = {
-            'Viales': {
-                'carretera': os.path.join(base_path, 'estilos', 'Carretera_Viales.qml'),
-                'callejero': os.path.join(base_path, 'estilos', 'Callejero_Viales.qml')
-            },
-            'Puntos_interes': {
-                'expendeduria': os.path.join(base_path, 'estilos', 'Puntos_interes_expendeduria.qml'),
-                'punto_recarga_electrica': os.path.join(base_path, 'estilos', 'Puntos_interes_recarga.qml'),
-                'ngbe': os.path.join(base_path, 'estilos', 'Puntos_interes_ngbe.qml'),
-                'toponimo': os.path.join(base_path, 'estilos', 'Puntos_interes_toponimo.qml')
-            },
-            'Poblaciones': os.path.join(base_path, 'estilos', 'Poblaciones.qml'),
-            'Portales_pk': os.path.join(base_path, 'estilos', 'Portales_pk.qml'),
-            'Municipios': os.path.join(base_path, 'estilos', 'Municipios.qml'),
-            'Provincias': os.path.join(base_path, 'estilos', 'Provincias.qml'),
-            'Comunidades_sim': os.path.join(base_path, 'estilos', 'Comunidades_sim.qml'),
-            'Codigos_postales': os.path.join(base_path, 'estilos', 'Codigos_postales.qml'),
-            'Referencia_catastral': os.path.join(base_path, 'estilos', 'Referencia_catastral.qml')
-        }
-
-        qml_path = None
-        if group_name in ['Viales', 'Puntos_interes']:
-            qml_dict = estilo_por_grupo.get(group_name, {})
-            qml_path = qml_dict.get(location_type)
-        else:
-            qml_path = estilo_por_grupo.get(group_name)
-
-        if qml_path and os.path.exists(qml_path):
-            layer.loadNamedStyle(qml_path)
-            layer.triggerRepaint()
-
-        self.fields = QgsFields()
-        self.create_attributes_from_json(
-            location,
-            exclude_keys=['geom', 'stateMsg', 'state', 'countryCode', 'noNumber']
-        )
-
-        layer.dataProvider().addAttributes(self.fields)
+        schema = compiled_schema(location_type, location)
+        layer.dataProvider().addAttributes(schema.fields)
         layer.updateFields()
 
         self.layers[layer_name] = layer
+        self.schemas[layer_name] = schema
         QgsProject.instance().addMapLayer(layer, False)
         group.addLayer(layer)
 
@@ -1100,19 +906,6 @@ class NameTab(QWidget):
         else:
             raise ValueError(f"Tipo de geometría no soportado: {wkt}")
 
-    # Crea los atributos de la capa a partir de la información recibida en la respuesta de la API
-    def create_attributes_from_json(
-        self,
-        location: Dict[str, Union[str, List[str]]],
-        exclude_keys: Optional[List[str]] = None
-    ) -> None:
-        if exclude_keys is None:
-            exclude_keys = []
-
-        for attribute, value in location.items():
-            if attribute not in exclude_keys and attribute != 'geom':
-                self.fields.append(QgsField(attribute, QMetaType.Type.QString))
-
     # Añade la geometría al mapa y realiza el zoom a la localización del candidato seleccionado
     def add_feature_to_layer(self, attributes: Dict[str, Union[Any, List[Any]]], layer_name: str) -> None:
         layer = self.layers.get(layer_name)
@@ -1122,44 +915,52 @@ class NameTab(QWidget):
             not QgsProject.instance().mapLayersByName(layer_name) or
             not layer.isValid()
         ):
-            if layer_name in self.layers:
-                del self.layers[layer_name]
+            self.layers.pop(layer_name, None)
+            self.schemas.pop(layer_name, None)
 
             geometry_type = self.get_geometry_type(attributes['geom'])
             layer_name = self.create_layer(geometry_type, attributes)
             layer = self.layers[layer_name]
 
-        feature = QgsFeature()
-        feature.setFields(layer.fields())
-
-        geom = None
-
-        for attribute, value in attributes.items():
-            if attribute == 'geom':
-                geom = QgsGeometry.fromWkt(value)
-                if not geom.isGeosValid():
-                    print("Geometría no válida detectada. Intentando corregir...")
-                    geom = geom.buffer(0, 5)
-                    if not geom.isGeosValid():
-                        QMessageBox.warning(None, "¡Atención!", "La geometría no es válida.")
-                        print("La geometría sigue siendo inválida después de la corrección.")
-                        return
-                feature.setGeometry(geom)
-            else:
-                if attribute in [field.name() for field in layer.fields()]:
-                    feature.setAttribute(attribute, str(value))
+        geom = self.valid_geometry(attributes['geom'])
+        if geom is None:
+            return
 
-        pr = layer.dataProvider()
-        pr.addFeature(feature)
+        schema = self.schemas.get(layer_name) or LayerSchema(layer.fields())
+        layer.dataProvider().addFeatures([schema.feature(geom, attributes)])
         layer.updateExtents()
 
+        self.zoom_to_location(geom, layer.crs())
+
+    # Modo acumulado: añade la localización a la capa única de su tipo en lugar de crear una capa nueva
+    def add_to_accumulated_layer(self, location: Dict[str, Union[Any, List[Any]]]) -> None:
+        location_type = (location.get("type") or "").lower()
+        if not location_type:
+            raise ValueError("El campo 'type' no está definido en la ubicación.")
+        geom = self.valid_geometry(location['geom'])
         if geom is None:
             return
+        layer = self.accumulator.add(type_group(location_type), location_type, QgsGeometry(geom), location)
+        self.zoom_to_location(geom, layer.crs())
+
+    # Geometría a partir del WKT, corregida si no es válida. Devuelve None si no se puede corregir
+    def valid_geometry(self, wkt: str) -> Optional[QgsGeometry]:
+        geom = QgsGeometry.fromWkt(wkt)
+        if not geom.isGeosValid():
+            print("Geometría no válida detectada. Intentando corregir...")
+            geom = geom.buffer(0, 5)
+            if not geom.isGeosValid():
+                QMessageBox.warning(None, "¡Atención!", "La geometría no es válida.")
+                print("La geometría sigue siendo inválida después de la corrección.")
+                return None
+        return geom
 
+    # Hace zoom a la extensión de los polígonos y a la geometría en el resto de casos
+    def zoom_to_location(self, geom: QgsGeometry, layer_crs: QgsCoordinateReferenceSystem) -> None:
         if geom.wkbType() in [QgsWkbTypes.Polygon, QgsWkbTypes.MultiPolygon]:
-            self.zoom_to_bounding_box(geom, layer.crs())
+            self.zoom_to_bounding_box(geom, layer_crs)
         else:
-            self.zoom_to_geometry(geom, layer.crs())
+            self.zoom_to_geometry(geom, layer_crs)
 
     # Realiza el zoom a la geometría del candidato seleccionado
     def zoom_to_bounding_box(self, geom: QgsGeometry, layer_crs: QgsCoordinateReferenceSystem) -> None:
@@ -1185,30 +986,13 @@ class NameTab(QWidget):
         return geom
         
     # Resalta la columna "Tipo" del candidato seleccionado y pone en negrita el encabezado de la columna "Candidatos" si se ha seleccionado un candidato
-    def highlight_tipo_column(self):
-        for row in range(self.tabla_resultados.rowCount()):
-            item = self.tabla_resultados.item(row, 1)
-            if item:
-                item.setBackground(QBrush())
-                item.setForeground(QBrush())
-
-        header = self.tabla_resultados.horizontalHeaderItem(1)
-        if header:
-            font = header.font()
-            font.setBold(False)
-            header.setFont(font)
-
-        selected_items = self.tabla_resultados.selectedItems()
-        if selected_items:
-            selected_item = selected_items[0]
-            row = selected_item.row()
-            col = selected_item.column()
-            tipo_item = self.tabla_resultados.item(row, 1)
-            if tipo_item:
-                selection_color = self.tabla_resultados.palette().color(QPalette.ColorRole.Highlight)
-                tipo_item.setBackground(QBrush(selection_color))
-                tipo_item.setForeground(QBrush(QColor(255, 255, 255)))
-
-            if col == 0 and header:
-                font.setBold(True)
-                header.setFont(font)
+    def highlight_tipo_column(self) -> None:
+        selected = self.tabla_resultados.selectionModel().selectedIndexes()
+        if not selected:
+            self.candidates_model.set_highlight(-1, 1)
+            self.candidates_model.set_bold_section(-1)
+            return
+
+        selection_color = self.tabla_resultados.palette().color(QPalette.ColorRole.Highlight)
+        self.candidates_model.set_highlight(selected[0].row(), 1, QBrush(selection_color))
+        self.candidates_model.set_bold_section(0 if selected[0].column() == 0 else -1)
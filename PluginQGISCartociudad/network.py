@@ -0,0 +1,509 @@
+# Cliente de red compartido por todo el plugin para las peticiones al servicio REST Geocoder
+
+import os
+import sqlite3
+from collections import deque
+from typing import Callable, Deque, List, Optional
+from urllib.parse import urlsplit
+
+from qgis.PyQt.QtCore import QObject, QUrl, QTimer, QSettings
+from qgis.PyQt import QtNetwork
+
+from qgis.core import QgsApplication
+
+from .cache import ResponseCache, is_cacheable, DEFAULT_TTL_DAYS, DEFAULT_MAX_MB
+from .reverse_cache import ReverseCache, DEFAULT_TOLERANCE_M, DEFAULT_MAX_ENTRIES
+from .core import (
+    API_HOST, API_GEOCODER, USER_AGENT, DEFAULT_TIMEOUT_MS, MAX_RETRIES, DEFAULT_RATE, DEFAULT_MAX_IN_FLIGHT,
+    CircuitBreaker, Geocoder, RateLimiter, backoff_delay, parse_retry_after, reverse_url
+)
+from .errors import is_transient_error, _get_error_message
+
+
+# Declaración de constantes
+SETTINGS_PREFIX = 'cartociudad'
+
+
+# Ruta de la caché de respuestas en el directorio del perfil de QGIS
+def cache_path() -> str:
+    return os.path.join(QgsApplication.qualifiedSettingsDirPath(), 'cartociudad', 'respuestas.sqlite')
+
+
+# Ruta de la caché espacial de reverseGeocode en el directorio del perfil de QGIS
+def reverse_cache_path() -> str:
+    return os.path.join(QgsApplication.qualifiedSettingsDirPath(), 'cartociudad', 'reverse.sqlite')
+
+
+# Abre la caché espacial de reverseGeocode si la caché de respuestas está activada y la tolerancia es mayor que 0
+def open_reverse_cache(settings: QSettings) -> Optional[ReverseCache]:
+    tolerance = settings.value(f'{SETTINGS_PREFIX}/reverse_tolerance_m', DEFAULT_TOLERANCE_M, type=float)
+    if tolerance <= 0 or not settings.value(f'{SETTINGS_PREFIX}/cache_enabled', True, type=bool):
+        return None
+    try:
+        os.makedirs(os.path.dirname(reverse_cache_path()), exist_ok=True)
+        return ReverseCache(
+            reverse_cache_path(), tolerance,
+            settings.value(f'{SETTINGS_PREFIX}/reverse_cache_entries', DEFAULT_MAX_ENTRIES, type=int)
+        )
+    except (OSError, sqlite3.Error) as e:
+        print(f"No se pudo abrir la caché espacial de reverseGeocode: {e}")
+        return None
+
+
+# Cliente síncrono del núcleo con el mismo ritmo máximo y la misma caché que el cliente del plugin,
+# para los algoritmos de Processing que se ejecutan fuera del hilo principal. Hay que cerrarlo al terminar
+def configured_geocoder() -> Geocoder:
+    settings = QSettings()
+    cache = None
+    if settings.value(f'{SETTINGS_PREFIX}/cache_enabled', True, type=bool):
+        try:
+            cache = ResponseCache(
+                cache_path(),
+                settings.value(f'{SETTINGS_PREFIX}/cache_ttl_days', DEFAULT_TTL_DAYS, type=float),
+                settings.value(f'{SETTINGS_PREFIX}/cache_max_mb', DEFAULT_MAX_MB, type=float)
+            )
+        except sqlite3.Error as e:
+            print(f"No se pudo abrir la caché de respuestas: {e}")
+    return Geocoder(
+        rate=settings.value(f'{SETTINGS_PREFIX}/rate_per_second', DEFAULT_RATE, type=float),
+        cache=cache,
+        reverse_cache=open_reverse_cache(settings)
+    )
+
+
+# Indica si una URL es del servicio de CartoCiudad. Solo a esas peticiones se aplican el cortocircuito, el ritmo
+# máximo y el límite de simultáneas; las descargas de otros servidores (CSV de filtros en GitHub o idee.es) van
+# directamente a la red y sus fallos no abren el cortocircuito
+def is_api_url(url: str) -> bool:
+    return (urlsplit(url).hostname or '').lower() == API_HOST
+
+
+# Respuesta ya leída de una petición, independiente del QNetworkReply que la originó
+class GeocoderResponse:
+    def __init__(
+        self,
+        url: str,
+        error,
+        data: bytes = b'',
+        status: Optional[int] = None,
+        headers: Optional[dict] = None,
+        from_cache: bool = False,
+        circuit_open: bool = False
+    ) -> None:
+        self.url = url
+        self.error = error
+        self.data = data
+        self.status = status
+        self.headers = headers or {}
+        self.from_cache = from_cache
+        self.circuit_open = circuit_open
+
+    # Indica si la petición terminó sin error de red
+    def ok(self) -> bool:
+        return self.error == QtNetwork.QNetworkReply.NetworkError.NoError
+
+    # Devuelve el cuerpo de la respuesta como texto
+    def text(self) -> str:
+        return self.data.decode('utf-8')
+
+
+# Petición en curso. Permite abortarla tanto si va por la red como si se sirve desde la caché;
+# una petición abortada no llega a llamar a su función de respuesta
+class GeocoderRequest:
+    def __init__(
+        self,
+        url: str,
+        callback: Callable[[GeocoderResponse], None],
+        use_cache: bool,
+        headers: Optional[dict] = None,
+        timeout: int = DEFAULT_TIMEOUT_MS,
+        retries: int = MAX_RETRIES
+    ) -> None:
+        self.url = url
+        self.callback = callback
+        self.use_cache = use_cache
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.retries = retries
+        self.attempt = 0
+        self.reply: Optional[QtNetwork.QNetworkReply] = None
+        self.cancelled = False
+        self.governed = is_api_url(url)
+        self.shared: Optional[SharedReverse] = None
+
+    def abort(self) -> None:
+        self.cancelled = True
+        if self.reply is not None:
+            self.reply.abort()
+        if self.shared is not None:
+            self.shared.release()
+
+
+# Petición reverseGeocode compartida por todos los puntos a menos de la tolerancia que llegan mientras está en
+# curso. Cada punto recibe su propio GeocoderRequest (waiter) y la petición de red solo se aborta cuando se han
+# abortado todos
+class SharedReverse:
+    def __init__(self, client: 'GeocoderClient', lon: float, lat: float) -> None:
+        self.client = client
+        self.lon = lon
+        self.lat = lat
+        self.waiters: List[GeocoderRequest] = []
+        self.request: Optional[GeocoderRequest] = None
+
+    def add(self, waiter: GeocoderRequest) -> GeocoderRequest:
+        waiter.shared = self
+        self.waiters.append(waiter)
+        return waiter
+
+    def deliver(self, response: GeocoderResponse) -> None:
+        self.client._reverse_release(self)
+        for waiter in self.waiters:
+            self.client._deliver(waiter, response)
+
+    def release(self) -> None:
+        if self.request is not None and all(waiter.cancelled for waiter in self.waiters):
+            self.client._reverse_release(self)
+            self.request.abort()
+
+
+# Cliente único con un solo QNetworkAccessManager para conservar las conexiones abiertas,
+# las sesiones TLS y la caché DNS entre peticiones. Las peticiones al servicio que van a la red pasan por una cola
+# que respeta el ritmo máximo (RateLimiter) y el número máximo de peticiones simultáneas; las de otros servidores
+# se envían sin esperar
+class GeocoderClient(QObject):
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.manager = QtNetwork.QNetworkAccessManager(self)
+        self.cache: Optional[ResponseCache] = None
+        self.reverse_cache: Optional[ReverseCache] = None
+        self.breaker = CircuitBreaker()
+        self.limiter = RateLimiter()
+        self.max_in_flight = DEFAULT_MAX_IN_FLIGHT
+        self.in_flight = 0
+        self.queue: Deque[GeocoderRequest] = deque()
+        self.pump_timer = QTimer(self)
+        self.pump_timer.setSingleShot(True)
+        self.pump_timer.timeout.connect(self._pump)
+        self.reload_settings()
+
+    # Abre por adelantado la conexión TLS con el servidor para que la primera búsqueda no pague el handshake
+    def preconnect(self) -> None:
+        self.manager.connectToHostEncrypted(API_HOST)
+
+    # Aplica los límites de peticiones y abre, reconfigura o cierra las cachés de respuestas según la configuración guardada
+    def reload_settings(self) -> None:
+        settings = QSettings()
+        self.limiter.configure(settings.value(f'{SETTINGS_PREFIX}/rate_per_second', DEFAULT_RATE, type=float))
+        self.max_in_flight = settings.value(f'{SETTINGS_PREFIX}/max_in_flight', DEFAULT_MAX_IN_FLIGHT, type=int)
+
+        enabled = settings.value(f'{SETTINGS_PREFIX}/cache_enabled', True, type=bool)
+        ttl_days = settings.value(f'{SETTINGS_PREFIX}/cache_ttl_days', DEFAULT_TTL_DAYS, type=float)
+        max_mb = settings.value(f'{SETTINGS_PREFIX}/cache_max_mb', DEFAULT_MAX_MB, type=float)
+
+        tolerance = settings.value(f'{SETTINGS_PREFIX}/reverse_tolerance_m', DEFAULT_TOLERANCE_M, type=float)
+        if self.reverse_cache is None:
+            self.reverse_cache = open_reverse_cache(settings)
+        elif not enabled or tolerance <= 0:
+            self.reverse_cache.close()
+            self.reverse_cache = None
+        else:
+            self.reverse_cache.set_tolerance(tolerance)
+            self.reverse_cache.max_entries = settings.value(
+                f'{SETTINGS_PREFIX}/reverse_cache_entries', DEFAULT_MAX_ENTRIES, type=int
+            )
+
+        if not enabled:
+            if self.cache is not None:
+                self.cache.close()
+                self.cache = None
+            return
+
+        if self.cache is None:
+            try:
+                self.cache = ResponseCache(cache_path(), ttl_days, max_mb)
+            except sqlite3.Error as e:
+                print(f"No se pudo abrir la caché de respuestas: {e}")
+                self.cache = None
+        else:
+            self.cache.ttl = ttl_days * 86400
+            self.cache.max_bytes = int(max_mb * 1024 * 1024)
+
+    # Construye la petición con las cabeceras comunes.
+    # QNetworkAccessManager ya envía "Accept-Encoding: gzip, deflate" y descomprime la respuesta;
+    # fijar la cabecera a mano desactivaría esa descompresión automática.
+    def build_request(self, url: str) -> QtNetwork.QNetworkRequest:
+        req = QtNetwork.QNetworkRequest(QUrl(url))
+        req.setRawHeader(b'User-Agent', USER_AGENT.encode('utf-8'))
+        req.setRawHeader(b'Connection', b'keep-alive')
+        req.setAttribute(QtNetwork.QNetworkRequest.Attribute.Http2AllowedAttribute, True)
+        return req
+
+    # Lanza una petición GET y entrega la respuesta solo a la función que la pidió.
+    # Las respuestas de candidates, find y reverseGeocode se sirven desde la caché si están guardadas.
+    # Todas las peticiones tienen tiempo máximo de espera y se reintentan ante fallos transitorios;
+    # con el cortocircuito abierto fallan al momento sin llegar a la red
+    def get(
+        self,
+        url: str,
+        callback: Callable[[GeocoderResponse], None],
+        headers: Optional[dict] = None,
+        use_cache: bool = True,
+        timeout: Optional[int] = None,
+        retries: int = MAX_RETRIES
+    ) -> GeocoderRequest:
+        request = GeocoderRequest(
+            url, callback, use_cache and is_cacheable(url), headers, timeout or DEFAULT_TIMEOUT_MS, retries
+        )
+
+        if request.use_cache and self.cache is not None:
+            body = self._cache_get(url)
+            if body is not None:
+                response = GeocoderResponse(
+                    url, QtNetwork.QNetworkReply.NetworkError.NoError, body, 200, from_cache=True
+                )
+                QTimer.singleShot(0, lambda: self._deliver(request, response))
+                return request
+
+        self._enqueue(request)
+        return request
+
+    def _enqueue(self, request: GeocoderRequest) -> None:
+        if not request.governed:
+            self._send(request)
+            return
+        self.queue.append(request)
+        self._pump()
+
+    # Envía las peticiones de la cola mientras lo permitan el límite de simultáneas y el de ritmo;
+    # si falta una ficha, vuelve a intentarlo cuando la haya
+    def _pump(self) -> None:
+        while self.queue:
+            request = self.queue[0]
+            if request.cancelled:
+                self.queue.popleft()
+                continue
+            if not self.breaker.allow():
+                self.queue.popleft()
+                self._fail_fast(request)
+                continue
+            if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+                return
+            wait = self.limiter.acquire()
+            if wait > 0:
+                if not self.pump_timer.isActive():
+                    self.pump_timer.start(int(wait * 1000) + 1)
+                return
+            self.queue.popleft()
+            self._send(request)
+
+    # Con el cortocircuito abierto la petición falla sin ir a la red (siempre de forma asíncrona)
+    def _fail_fast(self, request: GeocoderRequest) -> None:
+        response = GeocoderResponse(
+            request.url, QtNetwork.QNetworkReply.NetworkError.TemporaryNetworkFailureError, circuit_open=True
+        )
+        QTimer.singleShot(0, lambda: self._deliver(request, response))
+
+    def _send(self, request: GeocoderRequest) -> None:
+        if request.governed:
+            self.in_flight += 1
+        req = self.build_request(request.url)
+        for name, value in request.headers.items():
+            req.setRawHeader(name.encode('utf-8'), value.encode('utf-8'))
+        req.setTransferTimeout(request.timeout)
+        request.reply = self.manager.get(req)
+        request.reply.finished.connect(lambda: self._on_finished(request))
+
+    # Lee la respuesta, la guarda en caché si procede, libera el QNetworkReply y llama a la función de la petición
+    # (o programa un reintento si el fallo es transitorio)
+    def _on_finished(self, request: GeocoderRequest) -> None:
+        reply = request.reply
+        request.reply = None
+        reply.deleteLater()
+        if request.governed:
+            self.in_flight -= 1
+            self._pump()
+        if request.cancelled:
+            return
+
+        # Una petición no abortada por el plugin que termina cancelada es que agotó el tiempo de espera
+        error = reply.error()
+        if error == QtNetwork.QNetworkReply.NetworkError.OperationCanceledError:
+            error = QtNetwork.QNetworkReply.NetworkError.TimeoutError
+
+        status = reply.attribute(QtNetwork.QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        headers = {
+            bytes(name).decode('latin-1').lower(): bytes(value).decode('latin-1')
+            for name, value in reply.rawHeaderPairs()
+        }
+        response = GeocoderResponse(
+            url=request.url,
+            error=error,
+            data=bytes(reply.readAll()),
+            status=int(status) if status is not None else None,
+            headers=headers
+        )
+
+        # 429/503 indican que vamos demasiado deprisa: se reduce el ritmo y se respeta Retry-After.
+        # Un 429 no significa que el servicio esté caído, así que no cuenta para el cortocircuito
+        if request.governed:
+            if response.status in (429, 503):
+                self.limiter.throttle(parse_retry_after(response.headers.get('retry-after')))
+            elif response.ok():
+                self.limiter.recover()
+
+        if is_transient_error(response.error, response.status):
+            if request.governed and response.status != 429:
+                self.breaker.record_failure()
+            if request.attempt < request.retries and (not request.governed or self.breaker.allow()):
+                delay = backoff_delay(request.attempt)
+                request.attempt += 1
+                QTimer.singleShot(delay, lambda: self._retry(request))
+                return
+        elif request.governed:
+            self.breaker.record_success()
+
+        if request.use_cache and response.ok() and response.status == 200 and response.data:
+            self._cache_put(request.url, response.data)
+        self._deliver(request, response)
+
+    # Geocodificación inversa de un punto: si la caché espacial tiene la respuesta de un punto a menos de la
+    # tolerancia se entrega sin ir a la red; si hay una petición en curso de un punto a menos de la tolerancia se
+    # espera a su respuesta; si no, se pide al servicio y la respuesta se guarda para ese punto
+    def get_reverse(
+        self, lon: float, lat: float, callback: Callable[[GeocoderResponse], None], **kwargs
+    ) -> GeocoderRequest:
+        url = reverse_url(lon, lat)
+        if self.reverse_cache is None:
+            return self.get(url, callback, **kwargs)
+
+        waiter = GeocoderRequest(url, callback, False)
+        shared = SharedReverse(self, lon, lat)
+        try:
+            body, pending = self.reverse_cache.claim(lon, lat, shared)
+        except sqlite3.Error as e:
+            print(f"Error leyendo la caché espacial de reverseGeocode: {e}")
+            return self.get(url, callback, **kwargs)
+        if body is not None:
+            response = GeocoderResponse(url, QtNetwork.QNetworkReply.NetworkError.NoError, body, 200, from_cache=True)
+            QTimer.singleShot(0, lambda: self._deliver(waiter, response))
+            return waiter
+        if pending is not None:
+            return pending.add(waiter)
+
+        def store(response: GeocoderResponse) -> None:
+            if response.ok() and response.status == 200 and response.data:
+                self._reverse_cache_put(lon, lat, response.data)
+            shared.deliver(response)
+
+        shared.add(waiter)
+        shared.request = self.get(url, store, **kwargs)
+        return waiter
+
+    def _reverse_release(self, shared: SharedReverse) -> None:
+        if self.reverse_cache is not None:
+            self.reverse_cache.release(shared.lon, shared.lat, shared)
+
+    def _retry(self, request: GeocoderRequest) -> None:
+        if not request.cancelled:
+            self._enqueue(request)
+
+    def _deliver(self, request: GeocoderRequest, response: GeocoderResponse) -> None:
+        if not request.cancelled:
+            request.callback(response)
+
+    # Lectura y escritura en caché: un fallo de la caché nunca debe impedir la petición
+    def _cache_get(self, url: str) -> Optional[bytes]:
+        try:
+            return self.cache.get(url)
+        except sqlite3.Error as e:
+            print(f"Error leyendo la caché de respuestas: {e}")
+            return None
+
+    def _cache_put(self, url: str, body: bytes) -> None:
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(url, body)
+        except sqlite3.Error as e:
+            print(f"Error guardando en la caché de respuestas: {e}")
+
+    def _reverse_cache_put(self, lon: float, lat: float, body: bytes) -> None:
+        if self.reverse_cache is None:
+            return
+        try:
+            self.reverse_cache.put(lon, lat, body)
+        except sqlite3.Error as e:
+            print(f"Error guardando en la caché espacial de reverseGeocode: {e}")
+
+    # Aborta las peticiones pendientes y cierra la caché guardando las estadísticas de la sesión
+    def close(self) -> None:
+        self.pump_timer.stop()
+        for request in self.queue:
+            request.cancelled = True
+        self.queue.clear()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        if self.reverse_cache is not None:
+            self.reverse_cache.close()
+            self.reverse_cache = None
+
+
+# Petición "más reciente" de una vista (búsqueda, clic en el mapa...). Cada nueva petición recibe un
+# número de generación y aborta la anterior; la respuesta de una generación superada se descarta
+# antes de llegar a la función de respuesta, sin leer el JSON ni tocar las tablas
+class LatestRequest:
+    def __init__(self) -> None:
+        self.generation = 0
+        self.request: Optional[GeocoderRequest] = None
+
+    def get(self, url: str, callback: Callable[[GeocoderResponse], None], **kwargs) -> GeocoderRequest:
+        self.abort()
+        self.generation += 1
+        generation = self.generation
+        self.request = geocoder_client().get(
+            url, lambda response: self._deliver(generation, callback, response), **kwargs
+        )
+        return self.request
+
+    # Igual que get para la geocodificación inversa de un punto, pasando por la caché espacial
+    def get_reverse(self, lon: float, lat: float, callback: Callable[[GeocoderResponse], None]) -> GeocoderRequest:
+        self.abort()
+        self.generation += 1
+        generation = self.generation
+        self.request = geocoder_client().get_reverse(
+            lon, lat, lambda response: self._deliver(generation, callback, response)
+        )
+        return self.request
+
+    def _deliver(self, generation: int, callback: Callable[[GeocoderResponse], None], response: GeocoderResponse) -> None:
+        if generation != self.generation:
+            return
+        self.request = None
+        callback(response)
+
+    # Aborta la petición en curso, si la hay
+    def abort(self) -> None:
+        if self.request is not None:
+            self.request.abort()
+            self.request = None
+
+
+_client: Optional[GeocoderClient] = None
+
+
+# Devuelve el cliente compartido, creándolo la primera vez que se necesita
+def geocoder_client() -> GeocoderClient:
+    global _client
+    if _client is None:
+        _client = GeocoderClient()
+    return _client
+
+
+# Cierra el cliente compartido al descargar el plugin
+def close_geocoder_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client.deleteLater()
+        _client = None
@@ -0,0 +1,433 @@
+# Proveedor de Processing con los algoritmos de geocodificación directa e inversa por lotes y los de límites
+# administrativos sin conexión
+
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from qgis.PyQt.QtGui import QIcon
+
+from qgis.core import (
+    Qgis, QgsProcessingProvider, QgsProcessingAlgorithm, QgsProcessingException,
+    QgsProcessingParameterFeatureSource, QgsProcessingParameterField, QgsProcessingParameterString,
+    QgsProcessingParameterEnum, QgsProcessingParameterNumber, QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFile, QgsProcessingParameterFileDestination,
+    QgsFeature, QgsFeatureSink, QgsFields, QgsGeometry, QgsWkbTypes,
+    QgsCoordinateReferenceSystem, QgsCoordinateTransform
+)
+
+from .core import (
+    ELEMENT_TYPES, RESULT_FIELDS, REVERSE_RESULT_FIELDS, DEFAULT_MAX_IN_FLIGHT, MAX_CONCURRENCY, BatchResult,
+    GeocoderError, Location, bounded_map, filter_params, result_values
+)
+from .batch import to_point
+from .boundaries import (
+    BOUNDARY_LEVELS, BoundaryIndex, BoundaryPackWriter, BoundaryUnit, boundary_pack_path, boundary_units,
+    clear_boundary_index
+)
+from .layers import result_field
+from .network import configured_geocoder
+
+
+# Declaración de constantes
+WRITE_BATCH = 500
+ICON_PATH = os.path.join(os.path.dirname(__file__), 'images', 'Logo_small.svg')
+
+
+# Proveedor "CartoCiudad" de la caja de herramientas de Processing
+class CartoCiudadProvider(QgsProcessingProvider):
+    def id(self) -> str:
+        return 'cartociudad'
+
+    def name(self) -> str:
+        return 'CartoCiudad'
+
+    def icon(self) -> QIcon:
+        return QIcon(ICON_PATH)
+
+    def loadAlgorithms(self) -> None:
+        self.addAlgorithm(GeocodeAlgorithm())
+        self.addAlgorithm(ReverseGeocodeAlgorithm())
+        self.addAlgorithm(AdminLookupAlgorithm())
+        self.addAlgorithm(BuildBoundaryPackAlgorithm())
+
+
+# Base de los algoritmos: parámetro común de peticiones simultáneas
+class CartoCiudadAlgorithm(QgsProcessingAlgorithm):
+    CONCURRENCY = 'CONCURRENCY'
+
+    def icon(self) -> QIcon:
+        return QIcon(ICON_PATH)
+
+    def add_concurrency_parameter(self) -> None:
+        param = QgsProcessingParameterNumber(
+            self.CONCURRENCY, 'Peticiones simultáneas',
+            Qgis.ProcessingNumberParameterType.Integer, DEFAULT_MAX_IN_FLIGHT, False, 1, MAX_CONCURRENCY
+        )
+        param.setFlags(param.flags() | Qgis.ProcessingParameterFlag.Advanced)
+        self.addParameter(param)
+
+
+# Geocodificación de una capa o tabla con una columna de direcciones: candidates + find por entidad
+class GeocodeAlgorithm(CartoCiudadAlgorithm):
+    INPUT = 'INPUT'
+    FIELD = 'FIELD'
+    POSTAL_CODES = 'POSTAL_CODES'
+    TYPES = 'TYPES'
+    OUTPUT = 'OUTPUT'
+
+    def name(self) -> str:
+        return 'geocode'
+
+    def displayName(self) -> str:
+        return 'Geocodificar direcciones (CartoCiudad)'
+
+    def shortHelpString(self) -> str:
+        return (
+            'Busca cada dirección de la columna indicada en el servicio REST Geocoder de CartoCiudad y '
+            'crea una capa de puntos con los atributos de entrada y los campos cc_*. El campo cc_estado '
+            'indica si la fila se localizó (ok) o el motivo por el que no.'
+        )
+
+    def createInstance(self) -> 'GeocodeAlgorithm':
+        return GeocodeAlgorithm()
+
+    def initAlgorithm(self, config=None) -> None:
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT, 'Capa o tabla de entrada', [Qgis.ProcessingSourceType.Vector]
+        ))
+        self.addParameter(QgsProcessingParameterField(
+            self.FIELD, 'Columna con la dirección', parentLayerParameterName=self.INPUT
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            self.POSTAL_CODES, 'Filtro por códigos postales (separados por comas)', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterEnum(
+            self.TYPES, 'Tipos de elemento (todos si no se indica ninguno)', ELEMENT_TYPES,
+            allowMultiple=True, optional=True
+        ))
+        self.add_concurrency_parameter()
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, 'Direcciones geocodificadas', Qgis.ProcessingSourceType.VectorPoint
+        ))
+
+    def processAlgorithm(self, parameters: Dict[str, Any], context, feedback) -> Dict[str, Any]:
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+        field = self.parameterAsString(parameters, self.FIELD, context)
+        field_index = source.fields().lookupField(field)
+        if field_index < 0:
+            raise QgsProcessingException(f'La columna {field} no existe en la entrada')
+        types = [ELEMENT_TYPES[i] for i in self.parameterAsEnums(parameters, self.TYPES, context)]
+        try:
+            params = filter_params(
+                postal_codes=self.parameterAsString(parameters, self.POSTAL_CODES, context), types=types
+            )
+        except ValueError as e:
+            raise QgsProcessingException(str(e))
+
+        fields = QgsFields(source.fields())
+        for name in RESULT_FIELDS:
+            fields.append(result_field(name))
+        sink, dest_id = self.parameterAsSink(
+            parameters, self.OUTPUT, context, fields, QgsWkbTypes.Type.Point,
+            QgsCoordinateReferenceSystem.fromEpsgId(4326)
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        geocoder = configured_geocoder()
+        total = source.featureCount()
+        step = 100.0 / total if total > 0 else 0
+        located = 0
+        features = []
+        try:
+            results = bounded_map(
+                lambda feature: geocoder.geocode(str(feature[field_index] or '').strip(), feature.id(), params),
+                source.getFeatures(),
+                self.parameterAsInt(parameters, self.CONCURRENCY, context),
+                feedback.isCanceled
+            )
+            for current, (feature, result) in enumerate(results):
+                out = QgsFeature(fields)
+                if result.location is not None:
+                    out.setGeometry(to_point(QgsGeometry.fromWkt(result.location.geom)))
+                    located += 1
+                elif result.status.startswith('error'):
+                    feedback.reportError(f'Entidad {feature.id()}: {result.status}')
+                out.setAttributes(
+                    feature.attributes() + [result.status] +
+                    result_values(result.location.raw if result.location else {}, RESULT_FIELDS)
+                )
+                features.append(out)
+                if len(features) >= WRITE_BATCH:
+                    sink.addFeatures(features, QgsFeatureSink.Flag.FastInsert)
+                    features = []
+                feedback.setProgress(int((current + 1) * step))
+            sink.addFeatures(features, QgsFeatureSink.Flag.FastInsert)
+        finally:
+            geocoder.close()
+
+        feedback.pushInfo(f'Localizadas {located} de {total} entidades')
+        return {self.OUTPUT: dest_id}
+
+
+# Geocodificación inversa de una capa de puntos: reverseGeocode por entidad conservando su geometría
+class ReverseGeocodeAlgorithm(CartoCiudadAlgorithm):
+    INPUT = 'INPUT'
+    OUTPUT = 'OUTPUT'
+
+    def name(self) -> str:
+        return 'reversegeocode'
+
+    def displayName(self) -> str:
+        return 'Geocodificación inversa de puntos (CartoCiudad)'
+
+    def shortHelpString(self) -> str:
+        return (
+            'Obtiene con el servicio REST Geocoder de CartoCiudad la dirección más cercana a cada punto de la '
+            'capa de entrada y la añade en los campos cc_*. Las geometrías multipunto se resuelven por su centroide.'
+        )
+
+    def createInstance(self) -> 'ReverseGeocodeAlgorithm':
+        return ReverseGeocodeAlgorithm()
+
+    def initAlgorithm(self, config=None) -> None:
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT, 'Capa de puntos', [Qgis.ProcessingSourceType.VectorPoint]
+        ))
+        self.add_concurrency_parameter()
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, 'Puntos con dirección', Qgis.ProcessingSourceType.VectorPoint
+        ))
+
+    def processAlgorithm(self, parameters: Dict[str, Any], context, feedback) -> Dict[str, Any]:
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+
+        fields = QgsFields(source.fields())
+        for name in REVERSE_RESULT_FIELDS:
+            fields.append(result_field(name))
+        sink, dest_id = self.parameterAsSink(
+            parameters, self.OUTPUT, context, fields, source.wkbType(), source.sourceCrs()
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        transform = QgsCoordinateTransform(
+            source.sourceCrs(), QgsCoordinateReferenceSystem.fromEpsgId(4326), context.transformContext()
+        )
+
+        def job(feature: QgsFeature) -> BatchResult:
+            geom = feature.geometry()
+            if geom is None or geom.isNull() or geom.isEmpty():
+                return geocoder.reverse_geocode(None, None, feature.id())
+            point = geom.centroid().asPoint() if geom.isMultipart() else geom.asPoint()
+            point = transform.transform(point)
+            return geocoder.reverse_geocode(point.x(), point.y(), feature.id())
+
+        geocoder = configured_geocoder()
+        total = source.featureCount()
+        step = 100.0 / total if total > 0 else 0
+        located = 0
+        features = []
+        try:
+            results = bounded_map(
+                job, source.getFeatures(), self.parameterAsInt(parameters, self.CONCURRENCY, context),
+                feedback.isCanceled
+            )
+            for current, (feature, result) in enumerate(results):
+                if result.location is not None:
+                    located += 1
+                elif result.status.startswith('error'):
+                    feedback.reportError(f'Entidad {feature.id()}: {result.status}')
+                out = QgsFeature(fields)
+                out.setGeometry(feature.geometry())
+                out.setAttributes(
+                    feature.attributes() + [result.status] +
+                    result_values(result.location.raw if result.location else {}, REVERSE_RESULT_FIELDS)
+                )
+                features.append(out)
+                if len(features) >= WRITE_BATCH:
+                    sink.addFeatures(features, QgsFeatureSink.Flag.FastInsert)
+                    features = []
+                feedback.setProgress(int((current + 1) * step))
+            sink.addFeatures(features, QgsFeatureSink.Flag.FastInsert)
+        finally:
+            geocoder.close()
+
+        feedback.pushInfo(f'Localizados {located} de {total} puntos')
+        return {self.OUTPUT: dest_id}
+
+
+# Municipio, provincia y comunidad autónoma de cada punto a partir del paquete de límites administrativos,
+# sin peticiones al servicio
+class AdminLookupAlgorithm(CartoCiudadAlgorithm):
+    INPUT = 'INPUT'
+    PACK = 'PACK'
+    OUTPUT = 'OUTPUT'
+
+    def name(self) -> str:
+        return 'adminlookup'
+
+    def displayName(self) -> str:
+        return 'Unidad administrativa de puntos sin conexión (CartoCiudad)'
+
+    def shortHelpString(self) -> str:
+        return (
+            'Añade a cada punto el municipio, la provincia y la comunidad autónoma en que se encuentra (campos cc_*) '
+            'consultando el paquete de límites administrativos, sin conexión con el servicio. Si no se indica '
+            'un paquete se usa el del perfil, construido desde la configuración del plugin.'
+        )
+
+    def createInstance(self) -> 'AdminLookupAlgorithm':
+        return AdminLookupAlgorithm()
+
+    def initAlgorithm(self, config=None) -> None:
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.INPUT, 'Capa de puntos', [Qgis.ProcessingSourceType.VectorPoint]
+        ))
+        self.addParameter(QgsProcessingParameterFile(
+            self.PACK, 'Paquete de límites administrativos', extension='gpkg', optional=True
+        ))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, 'Puntos con unidad administrativa', Qgis.ProcessingSourceType.VectorPoint
+        ))
+
+    def processAlgorithm(self, parameters: Dict[str, Any], context, feedback) -> Dict[str, Any]:
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+        path = self.parameterAsFile(parameters, self.PACK, context) or boundary_pack_path()
+        if not os.path.exists(path):
+            raise QgsProcessingException(
+                'No se ha encontrado el paquete de límites administrativos. Descárguelo o constrúyalo desde la '
+                'configuración del plugin o indique su ruta.'
+            )
+        # Índice propio del algoritmo: se ejecuta en otro hilo y los motores de geometría no se comparten
+        feedback.pushInfo(f'Cargando límites administrativos de {path}')
+        index = BoundaryIndex(path)
+        if index.is_empty():
+            raise QgsProcessingException(f'El paquete {path} no contiene límites administrativos válidos')
+
+        keys = [key for level in BOUNDARY_LEVELS for key in (level['key'], level['code_key'])]
+        fields = QgsFields(source.fields())
+        for key in keys:
+            fields.append(result_field(f'cc_{key}'))
+        sink, dest_id = self.parameterAsSink(
+            parameters, self.OUTPUT, context, fields, source.wkbType(), source.sourceCrs()
+        )
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        transform = QgsCoordinateTransform(
+            source.sourceCrs(), QgsCoordinateReferenceSystem.fromEpsgId(4326), context.transformContext()
+        )
+        total = source.featureCount()
+        step = 100.0 / total if total > 0 else 0
+        located = 0
+        features = []
+        for current, feature in enumerate(source.getFeatures()):
+            if feedback.isCanceled():
+                break
+            found = None
+            geom = feature.geometry()
+            if geom is not None and not geom.isNull() and not geom.isEmpty():
+                point = geom.centroid().asPoint() if geom.isMultipart() else geom.asPoint()
+                point = transform.transform(point)
+                found = index.lookup(point.x(), point.y())
+            if found is not None:
+                located += 1
+            out = QgsFeature(fields)
+            out.setGeometry(geom)
+            out.setAttributes(feature.attributes() + [found.get(key) if found else None for key in keys])
+            features.append(out)
+            if len(features) >= WRITE_BATCH:
+                sink.addFeatures(features, QgsFeatureSink.Flag.FastInsert)
+                features = []
+            feedback.setProgress(int((current + 1) * step))
+        sink.addFeatures(features, QgsFeatureSink.Flag.FastInsert)
+
+        feedback.pushInfo(f'Localizados {located} de {total} puntos')
+        return {self.OUTPUT: dest_id}
+
+
+# Construye el paquete de límites administrativos con los polígonos de find: para cada municipio, provincia y
+# comunidad autónoma de los CSV de los filtros busca la unidad con candidates y pide su geometría
+class BuildBoundaryPackAlgorithm(CartoCiudadAlgorithm):
+    OUTPUT = 'OUTPUT'
+
+    def name(self) -> str:
+        return 'buildboundaries'
+
+    def displayName(self) -> str:
+        return 'Construir paquete de límites administrativos (CartoCiudad)'
+
+    def shortHelpString(self) -> str:
+        return (
+            'Crea el GeoPackage de límites administrativos que usan las consultas sin conexión, con una capa de '
+            'municipios, otra de provincias y otra de comunidades autónomas obtenidas del servicio find. Son unas '
+            'dos peticiones por unidad (más de 16.000 en total), así que tarda según el ritmo máximo configurado. '
+            'Por defecto se guarda en el perfil, donde lo usa el plugin.'
+        )
+
+    def createInstance(self) -> 'BuildBoundaryPackAlgorithm':
+        return BuildBoundaryPackAlgorithm()
+
+    def initAlgorithm(self, config=None) -> None:
+        self.add_concurrency_parameter()
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.OUTPUT, 'Paquete de límites administrativos', 'GeoPackage (*.gpkg)', boundary_pack_path()
+        ))
+
+    def processAlgorithm(self, parameters: Dict[str, Any], context, feedback) -> Dict[str, Any]:
+        path = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        levels = [(config, boundary_units(config)) for config in BOUNDARY_LEVELS]
+        for config, units in levels:
+            if not units:
+                raise QgsProcessingException(f"No se han podido leer las unidades de {config['layer']} de los CSV")
+        total = sum(len(units) for _, units in levels)
+        step = 100.0 / total
+        done = 0
+        missing = 0
+
+        def job(unit: BoundaryUnit, unit_type: str) -> Tuple[Optional[Location], Optional[str]]:
+            try:
+                return geocoder.find_admin_unit(unit.name, unit_type, unit.filters), None
+            except GeocoderError as e:
+                return None, str(e).splitlines()[0]
+
+        geocoder = configured_geocoder()
+        writer = BoundaryPackWriter(path)
+        try:
+            for config, units in levels:
+                feedback.pushInfo(f"{config['layer']}: {len(units)} unidades")
+                writer.start_level(config)
+                results = bounded_map(
+                    lambda unit, unit_type=config['type']: job(unit, unit_type), units,
+                    self.parameterAsInt(parameters, self.CONCURRENCY, context), feedback.isCanceled
+                )
+                for unit, (location, error) in results:
+                    geom = QgsGeometry.fromWkt(location.geom) if location is not None and location.geom else None
+                    if geom is None or geom.isNull() or geom.isEmpty():
+                        missing += 1
+                        feedback.reportError(f"{config['layer']} {unit.name}: {error or 'sin geometría'}")
+                    else:
+                        writer.add(unit.name, str(location.get(config['code_key']) or unit.code), geom)
+                    done += 1
+                    feedback.setProgress(int(done * step))
+                if feedback.isCanceled():
+                    return {}
+            writer.commit()
+        except OSError as e:
+            raise QgsProcessingException(f'No se pudo escribir el paquete {path}: {e}')
+        finally:
+            writer.close()
+            geocoder.close()
+
+        # El índice cargado en el plugin se vuelve a crear con el paquete nuevo la próxima vez que se use
+        if os.path.abspath(path) == os.path.abspath(boundary_pack_path()):
+            clear_boundary_index()
+        feedback.pushInfo(f'Paquete guardado en {path}: {total - missing} de {total} unidades con geometría')
+        return {self.OUTPUT: path}
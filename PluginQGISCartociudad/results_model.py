@@ -0,0 +1,218 @@
+# Modelo y vista de las tablas de resultados de las pestañas (candidatos y geocodificación inversa)
+
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from qgis.PyQt.QtCore import QAbstractTableModel, QModelIndex, QTimer
+from qgis.PyQt.QtGui import QBrush, QColor, QFont
+from qgis.PyQt.QtWidgets import QTableView, QHeaderView
+
+from .compat import CompatQt as CQt
+
+
+# Declaración de constantes
+RESIZE_PRECISION = 200
+MESSAGE_COLOR = QColor(255, 0, 0)
+HIGHLIGHT_TEXT_COLOR = QColor(255, 255, 255)
+
+
+# Tabla de resultados guardada como una lista de tuplas de texto (una por fila) y otra lista paralela con el
+# dato de cada fila. Las filas que se añaden una a una se acumulan y se insertan juntas en la siguiente vuelta
+# del bucle de eventos con un solo beginInsertRows, de modo que la vista solo se actualiza una vez por lote
+class ResultsTableModel(QAbstractTableModel):
+    def __init__(self, headers: Sequence[str], selectable_columns: Optional[Iterable[int]] = None, parent=None) -> None:
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.selectable = set(range(len(self.headers)) if selectable_columns is None else selectable_columns)
+        self.rows: List[Tuple[str, ...]] = []
+        self.payloads: List[Any] = []
+        self.pending_rows: List[Tuple[str, ...]] = []
+        self.pending_payloads: List[Any] = []
+        self.message: Optional[str] = None
+        self.highlight_row = -1
+        self.highlight_column = -1
+        self.highlight_brush: Optional[QBrush] = None
+        self.bold_section = -1
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(0)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return 1 if self.message is not None else len(self.rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index: QModelIndex, role: int = CQt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        if self.message is not None:
+            if role == CQt.DisplayRole:
+                return self.message
+            if role == CQt.ForegroundRole:
+                return QBrush(MESSAGE_COLOR)
+            return None
+        if role == CQt.DisplayRole or role == CQt.ToolTipRole:
+            return self.rows[row][column]
+        if role == CQt.TextAlignmentRole:
+            return CQt.AlignLeft | CQt.AlignVCenter
+        if row == self.highlight_row and column == self.highlight_column:
+            if role == CQt.BackgroundRole:
+                return self.highlight_brush
+            if role == CQt.ForegroundRole:
+                return QBrush(HIGHLIGHT_TEXT_COLOR)
+        return None
+
+    def headerData(self, section: int, orientation, role: int = CQt.DisplayRole):
+        if orientation != CQt.Horizontal:
+            if role == CQt.DisplayRole:
+                return section + 1
+            return None
+        if role == CQt.DisplayRole:
+            return self.headers[section]
+        if role == CQt.FontRole and section == self.bold_section:
+            font = QFont()
+            font.setBold(True)
+            return font
+        return None
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return CQt.NoItemFlags
+        if self.message is None and index.column() in self.selectable:
+            return CQt.ItemIsSelectable | CQt.ItemIsEnabled
+        return CQt.ItemIsEnabled
+
+    # Sustituye todas las filas de la tabla
+    def set_rows(self, rows: Iterable[Tuple[str, ...]], payloads: Iterable[Any]) -> None:
+        self.flush_timer.stop()
+        self.beginResetModel()
+        self.rows = list(rows)
+        self.payloads = list(payloads)
+        self.pending_rows = []
+        self.pending_payloads = []
+        self.message = None
+        self.highlight_row = -1
+        self.endResetModel()
+
+    # Muestra un único mensaje en rojo en lugar de filas, por ejemplo cuando no hay resultados
+    def set_message(self, text: str) -> None:
+        self.flush_timer.stop()
+        self.beginResetModel()
+        self.rows = []
+        self.payloads = []
+        self.pending_rows = []
+        self.pending_payloads = []
+        self.message = text
+        self.highlight_row = -1
+        self.endResetModel()
+
+    # Añade una fila al lote pendiente; se inserta en la vista al volver al bucle de eventos
+    def append(self, row: Tuple[str, ...], payload: Any) -> None:
+        if self.message is not None:
+            self.set_rows([], [])
+        self.pending_rows.append(row)
+        self.pending_payloads.append(payload)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    # Inserta en el modelo todas las filas pendientes de una vez
+    def flush(self) -> None:
+        self.flush_timer.stop()
+        if not self.pending_rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(self.pending_rows) - 1)
+        self.rows.extend(self.pending_rows)
+        self.payloads.extend(self.pending_payloads)
+        self.pending_rows = []
+        self.pending_payloads = []
+        self.endInsertRows()
+
+    # Elimina las filas indicadas agrupándolas en tramos consecutivos, de abajo arriba
+    def remove_rows(self, rows: Iterable[int]) -> None:
+        self.flush()
+        if self.message is not None:
+            return
+        ordered = sorted(set(row for row in rows if 0 <= row < len(self.rows)), reverse=True)
+        start = 0
+        while start < len(ordered):
+            end = start
+            while end + 1 < len(ordered) and ordered[end + 1] == ordered[end] - 1:
+                end += 1
+            first, last = ordered[end], ordered[start]
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            del self.payloads[first:last + 1]
+            self.endRemoveRows()
+            start = end + 1
+        self.highlight_row = -1
+
+    def clear(self) -> None:
+        self.set_rows([], [])
+
+    # Dato asociado a una fila (candidato o respuesta de la API), o None si la fila no existe
+    def payload(self, row: int) -> Any:
+        self.flush()
+        if self.message is not None or not 0 <= row < len(self.payloads):
+            return None
+        return self.payloads[row]
+
+    # Resalta una celda con el color de selección; row = -1 quita el resaltado
+    def set_highlight(self, row: int, column: int, brush: Optional[QBrush] = None) -> None:
+        previous = (self.highlight_row, self.highlight_column)
+        self.highlight_row, self.highlight_column, self.highlight_brush = row, column, brush
+        for cell_row, cell_column in (previous, (row, column)):
+            if 0 <= cell_row < self.rowCount() and 0 <= cell_column < len(self.headers):
+                cell = self.index(cell_row, cell_column)
+                self.dataChanged.emit(cell, cell, [CQt.BackgroundRole, CQt.ForegroundRole])
+
+    # Pone en negrita la cabecera de una columna; section = -1 la deja toda normal
+    def set_bold_section(self, section: int) -> None:
+        if section == self.bold_section:
+            return
+        self.bold_section = section
+        self.headerDataChanged.emit(CQt.Horizontal, 0, len(self.headers) - 1)
+
+
+# Vista de las tablas de resultados: filas de altura fija y columnas ajustadas al contenido solo con el primer
+# lote de filas, midiendo como mucho RESIZE_PRECISION filas. Después el ancho lo decide el usuario (doble clic
+# en el borde de una cabecera la ajusta a su contenido)
+class ResultsTableView(QTableView):
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.fitted = False
+        self.setWordWrap(False)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        header = self.horizontalHeader()
+        header.setResizeContentsPrecision(RESIZE_PRECISION)
+        header.setStretchLastSection(False)
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+
+    def setModel(self, model: ResultsTableModel) -> None:
+        super().setModel(model)
+        model.rowsInserted.connect(self.on_rows_inserted)
+        model.modelReset.connect(self.on_model_reset)
+
+    def on_rows_inserted(self, parent: QModelIndex, first: int, last: int) -> None:
+        if not self.fitted:
+            self.fit_columns()
+
+    def on_model_reset(self) -> None:
+        self.fitted = False
+        if self.model().rowCount() > 0:
+            self.fit_columns()
+
+    # Ajusta las columnas al contenido y las deja redimensionables por el usuario
+    def fit_columns(self) -> None:
+        header = self.horizontalHeader()
+        header.setStretchLastSection(True)
+        self.resizeColumnsToContents()
+        for col in range(header.count()):
+            header.setSectionResizeMode(col, QHeaderView.ResizeMode.Interactive)
+        self.fitted = True
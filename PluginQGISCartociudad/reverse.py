@@ -1,25 +1,47 @@
 # Importa los módulos y bibliotecas necesarias
-import json
-import os
-from typing import Dict, Union
+from typing import Dict, Tuple, Union
 
+from qgis.PyQt.QtCore import QSettings
 from qgis.PyQt.QtWidgets import (
-    QWidget, QTableWidgetItem, QHeaderView, QMessageBox, QAbstractItemView,
-    QPushButton, QVBoxLayout, QHBoxLayout, QLineEdit, QTableWidget,
-    QAbstractScrollArea
+    QWidget, QMessageBox, QAbstractItemView, QPushButton, QVBoxLayout, QHBoxLayout, QLineEdit, QCheckBox
 )
-from qgis.PyQt.QtCore import QUrl, QMetaType
-from qgis.PyQt import QtNetwork
 
 from qgis.gui import QgisInterface, QgsMapToolEmitPoint
 from qgis.core import (
-    QgsPointXY, QgsVectorLayer, QgsFeature, QgsGeometry, QgsProject,
-    QgsFields, QgsField, QgsCoordinateReferenceSystem, QgsCoordinateTransform,
+    QgsPointXY, QgsVectorLayer, QgsGeometry, QgsProject,
+    QgsCoordinateReferenceSystem, QgsCoordinateTransform,
     QgsRectangle, QgsLayerTreeLayer
 )
 
-from .compat import CompatQt as CQt
+from .batch import BatchReverseDialog
+from .boundaries import boundary_index
 from .errors import _get_error_message
+from .network import SETTINGS_PREFIX, GeocoderResponse, LatestRequest
+from .core import GeocoderError, parse_location
+from .layers import (
+    REVERSE_GROUP, REVERSE_EXCLUDED_KEYS, LayerAccumulator, accumulate_enabled, apply_style, compiled_schema,
+    layer_group
+)
+from .results_model import ResultsTableModel, ResultsTableView
+from .reverse_store import DEFAULT_MEMORY_RECORDS, ReverseResultStore
+
+
+# Columnas de la tabla de resultados y clave de la respuesta de la API que muestra cada una
+REVERSE_COLUMNS = [
+    ('Tipo vía', 'tip_via'), ('Dirección', 'address'), ('Número/pk', 'portalNumber'), ('Extension', 'extension'),
+    ('CCPP', 'postalCode'), ('Población', 'poblacion'), ('Municipio', 'muni')
+]
+
+
+# Textos de una fila de la tabla de resultados a partir de la respuesta de la API
+def reverse_row(reverse_data: Dict[str, Union[str, int]]) -> Tuple[str, ...]:
+    return tuple(str(reverse_data.get(key, 'N/A')) for _, key in REVERSE_COLUMNS)
+
+
+# Número máximo de resultados que se guardan en memoria antes de volcar los más antiguos a disco (0 = sin límite)
+def memory_records() -> int:
+    return QSettings().value(f'{SETTINGS_PREFIX}/reverse_memory_records', DEFAULT_MEMORY_RECORDS, type=int)
+
 
 # # Pestaña general de búsqueda por coordenadas
 class ReverseTab(QWidget):
@@ -40,6 +62,10 @@ class ReverseTab(QWidget):
         search_button.clicked.connect(self.search_by_reverse)
         reverse_layout.addWidget(search_button)
 
+        batch_button = QPushButton("Geocodificación inversa por lotes")
+        batch_button.clicked.connect(self.open_batch_dialog)
+        reverse_layout.addWidget(batch_button)
+
         input_layout = QHBoxLayout()
         self.coord_x = QLineEdit()
         self.coord_x.returnPressed.connect(self.search_by_reverse)
@@ -53,15 +79,16 @@ class ReverseTab(QWidget):
         input_layout.addWidget(self.coord_y)
         reverse_layout.addLayout(input_layout)
 
-        self.reverse_results_table = QTableWidget()
-        self.reverse_results_table.setColumnCount(7)
-        self.reverse_results_table.setHorizontalHeaderLabels(
-            ['Tipo vía', 'Dirección', 'Número/pk', 'Extension', 'CCPP', 'Población', 'Municipio']
+        self.admin_only = QCheckBox("Solo unidad administrativa (sin conexión)")
+        self.admin_only.setToolTip(
+            "Obtiene el municipio, la provincia y la comunidad autónoma del punto con el paquete de límites "
+            "administrativos construido desde la configuración, sin consultar el servicio"
         )
+        reverse_layout.addWidget(self.admin_only)
 
-        header = self.reverse_results_table.horizontalHeader()
-        for col in range(self.reverse_results_table.columnCount()):
-            header.setSectionResizeMode(col, QHeaderView.ResizeMode.Stretch)
+        self.reverse_model = ResultsTableModel([header for header, _ in REVERSE_COLUMNS], parent=self)
+        self.reverse_results_table = ResultsTableView()
+        self.reverse_results_table.setModel(self.reverse_model)
 
         reverse_layout.addWidget(self.reverse_results_table)
 
@@ -85,22 +112,21 @@ class ReverseTab(QWidget):
 
         reverse_layout.addLayout(buttons_layout)
 
-        self.reverse_results = []
         self.reverse = ReverseCoding(
             self.reverse_results_table,
+            self.reverse_model,
             self.coord_x,
             self.coord_y,
-            self.iface,
-            self.reverse_results
+            self.iface
         )
+        self.admin_only.toggled.connect(self.reverse.set_admin_only)
     # Permite seleccionar o deseleccionar todas las filas de la tabla de resultados de búsqueda por coordenadas
     def select_all_rows(self) -> None:
         selected_rows = self.reverse_results_table.selectionModel().selectedRows()
         if selected_rows:
             self.reverse_results_table.clearSelection()
         else:
-            for row in range(self.reverse_results_table.rowCount()):
-                self.reverse_results_table.selectRow(row)
+            self.reverse_results_table.selectAll()
     # Crea una capa a partir de las filas seleccionadas 
     def create_layer(self) -> None:
         selected_rows = self.reverse_results_table.selectionModel().selectedRows()
@@ -109,13 +135,8 @@ class ReverseTab(QWidget):
             QMessageBox.warning(None, "¡Atención!", "No hay filas seleccionadas para crear la capa.")
             return
 
-        selected_data = []
-        for index in selected_rows:
-            item = self.reverse_results_table.item(index.row(), 0)
-            if item:
-                data = item.data(CQt.UserRole)
-                if data:
-                    selected_data.append(data)
+        record_ids = [self.reverse_model.payload(index.row()) for index in sorted(selected_rows, key=lambda i: i.row())]
+        selected_data = self.reverse.store.get_many(record_id for record_id in record_ids if record_id is not None)
 
         if not selected_data:
             QMessageBox.warning(None, "Error", "No se pudo recuperar ningún dato válido de la selección.")
@@ -131,6 +152,12 @@ class ReverseTab(QWidget):
             self.reverse.search_by_coordinates(lon, lat)
         else:
             QMessageBox.warning(self, "Campos incompletos", "Debe introducir ambas coordenadas.")
+    # Abre el dialogo para geocodificar de forma inversa todos los puntos de una capa
+    def open_batch_dialog(self) -> None:
+        if getattr(self, 'batch_dialog', None) is None:
+            self.batch_dialog = BatchReverseDialog(self)
+        self.batch_dialog.show()
+        self.batch_dialog.raise_()
     # Permite capturar las coordenadas haciendo clic en el mapa
     def capture_coordinates_from_map(self) -> None:
         self.reverse.start_capture()
@@ -146,30 +173,26 @@ class ReverseCoding:
     # Constructor de la clase ReverseCoding que inicializa los atributos necesarios para la búsqueda por coordenadas 
     def __init__(
         self,
-        table_widget: QTableWidget,
+        table_widget: ResultsTableView,
+        model: ResultsTableModel,
         coord_x: QLineEdit,
         coord_y: QLineEdit,
-        iface: QgisInterface,
-        reverse_results: list
+        iface: QgisInterface
     ) -> None:
         self.table_widget = table_widget
+        self.model = model
         self.coord_x = coord_x
         self.coord_y = coord_y
         self.iface = iface
-        self.network_manager = QtNetwork.QNetworkAccessManager()
         self.layers = {}
-        self.fields = None
-        self.results = []
-        self.reverse_results = reverse_results
+        self.store = ReverseResultStore(memory_records())
+        self.admin_only = False
+        self.reverse_request = LatestRequest()
+        self.accumulator = LayerAccumulator(table_widget)
 
         self.map_tool = QgsMapToolEmitPoint(self.iface.mapCanvas())
         self.map_tool.canvasClicked.connect(self.handle_map_click)
 
-        self.table_widget.horizontalHeader().setStretchLastSection(False)
-        self.table_widget.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table_widget.setSizeAdjustPolicy(QAbstractScrollArea.SizeAdjustPolicy.AdjustToContents)
-        self.table_widget.setWordWrap(True)
-
         self.table_widget.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table_widget.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
     
@@ -193,45 +216,60 @@ class ReverseCoding:
     # Inicia la herramienta de captura de coordenadas en el mapa
     def start_capture(self) -> None:
         self.iface.mapCanvas().setMapTool(self.map_tool)
-    # Realiza la búsqueda por coordenadas haciendo una petición a la API de Cartociudad 
+    # Realiza la búsqueda por coordenadas haciendo una petición a la API de Cartociudad;
+    # antes se consulta la caché espacial, que reutiliza la respuesta de un punto guardado a menos de la tolerancia
     def search_by_coordinates(self, lon: float, lat: float) -> None:
-        if lon and lat:
-            print(f"Buscando por coordenadas Lon: {lon}, Lat: {lat}")
-            url = f"https://www.cartociudad.es/geocoder/api/geocoder/reverseGeocode?lon={lon}&lat={lat}"
-            print(f"Haciendo petición a: {url}")
-            req = QtNetwork.QNetworkRequest(QUrl(url))
-
-            try:
-                self.network_manager.finished.disconnect(self.handle_reverse_response)
-            except TypeError:
-                pass
-
-            self.network_manager.finished.connect(self.handle_reverse_response)
-            self.network_manager.get(req)
+        if not lon or not lat:
+            return
+        try:
+            x, y = float(lon), float(lat)
+        except ValueError:
+            QMessageBox.warning(None, "Coordenadas no válidas", "Las coordenadas deben ser números.")
+            return
+        if self.admin_only:
+            self.search_admin_unit(x, y)
+            return
+        print(f"Buscando por coordenadas Lon: {x}, Lat: {y}")
+        self.reverse_request.get_reverse(x, y, self.handle_reverse_response)
+    # Activa o desactiva la consulta sin conexión de la unidad administrativa
+    def set_admin_only(self, enabled: bool) -> None:
+        self.admin_only = enabled
+    # Busca el municipio, la provincia y la comunidad autónoma del punto en el paquete de límites administrativos
+    def search_admin_unit(self, x: float, y: float) -> None:
+        index = boundary_index()
+        if index is None:
+            QMessageBox.warning(
+                None, "Límites administrativos",
+                "No hay paquete de límites administrativos. "
+                "Constrúyalo desde la configuración del plugin."
+            )
+            return
+        found = index.lookup(x, y)
+        if found is None:
+            self.update_table_with_no_response()
+            return
+        found['geom'] = f'POINT({x!r} {y!r})'
+        self.update_table(found)
     # Maneja la respuesta de la API de Cartociudad para la búsqueda por coordenadas
-    def handle_reverse_response(self, reply: QtNetwork.QNetworkReply) -> None:
-        er = reply.error()
-        if er == QtNetwork.QNetworkReply.NetworkError.NoError:
-            bytes_string = reply.readAll()
-            response = str(bytes_string, 'utf-8')
+    def handle_reverse_response(self, reply: GeocoderResponse) -> None:
+        er = reply.error
+        if reply.ok():
+            try:
+                location = parse_location(reply.data)
+            except GeocoderError as e:
+                QMessageBox.critical(None, "Error", str(e))
+                return
 
-            if not response.strip():
+            if location is None:
                 QMessageBox.critical(None, "Error", "Respuesta vacía de la API.")
                 self.update_table_with_no_response()
                 return
 
-            try:
-                reverse_data = json.loads(response)
-
-                if "geom" not in reverse_data:
-                    QMessageBox.critical(None, "Error", "La respuesta no contiene el campo 'geom'.")
-                    return
-
-                self.results.append(reverse_data)
-                self.update_table(reverse_data)
+            if "geom" not in location.raw:
+                QMessageBox.critical(None, "Error", "La respuesta no contiene el campo 'geom'.")
+                return
 
-            except json.JSONDecodeError as e:
-                QMessageBox.critical(None, "Error", f"Error al decodificar la respuesta JSON: {e}")
+            self.update_table(location.raw)
         else:
             error_message = _get_error_message(er)
             QMessageBox.critical(
@@ -240,54 +278,10 @@ class ReverseCoding:
                 error_message
             )
             self.update_table_with_no_response()
-
-        try:
-            self.network_manager.finished.disconnect(self.handle_reverse_response)
-        except TypeError:
-            pass
     # Actualiza la tabla de resultados de búsqueda por coordenadas con los datos obtenidos de la API
     def update_table(self, reverse_data: Dict[str, Union[str, int]]) -> None:
-        row_position = self.table_widget.rowCount()
-        self.table_widget.insertRow(row_position)
-
-        tipo_via = reverse_data.get('tip_via', 'N/A')
-        address = reverse_data.get('address', 'N/A')
-        portal_number = reverse_data.get('portalNumber', 'N/A')
-        extension = reverse_data.get('extension', 'N/A')
-        postal_code = reverse_data.get('postalCode', 'N/A')
-        poblacion = reverse_data.get('poblacion', 'N/A')
-        municipio = reverse_data.get('muni', 'N/A')
-
-        items = [
-            QTableWidgetItem(tipo_via),
-            QTableWidgetItem(address),
-            QTableWidgetItem(str(portal_number)),
-            QTableWidgetItem(str(extension)),
-            QTableWidgetItem(str(postal_code)),
-            QTableWidgetItem(poblacion),
-            QTableWidgetItem(municipio)
-        ]
-
-        items[0].setData(CQt.UserRole, reverse_data)
-
-        for col, item in enumerate(items):
-            item.setFlags(item.flags() & ~CQt.ItemIsEditable)
-            item.setTextAlignment(CQt.AlignLeft | CQt.AlignVCenter)
-            self.table_widget.setItem(row_position, col, item)
-
-        self.reverse_results.append(reverse_data)
-
-        self.table_widget.horizontalHeader().setStretchLastSection(True)
-        self.table_widget.resizeRowsToContents()
-        self.table_widget.resizeColumnsToContents()
-        self.table_widget.resizeRowsToContents()
-
-        header = self.table_widget.horizontalHeader()
-        for col in range(self.table_widget.columnCount()):
-            header.setSectionResizeMode(col, QHeaderView.ResizeMode.Interactive)
-
-        self.table_widget.updateGeometry()
-        self.table_widget.repaint()
+        self.store.max_records = memory_records()
+        self.model.append(reverse_row(reverse_data), self.store.add(reverse_data))
     # Mensaje de información cuando la API de Cartociudad no devuelve resultados para la búsqueda por coordenadas
     def update_table_with_no_response(self) -> None:
         msg_box = QMessageBox()
@@ -298,26 +292,22 @@ class ReverseCoding:
         msg_box.exec()
     # Limpia la tabla de resultados de búsqueda por coordenadas
     def clear_table(self) -> None:
-        self.table_widget.setRowCount(0)
-        self.results.clear()
-        self.reverse_results.clear()
+        self.model.clear()
+        self.store.clear()
     # Borra las filas seleccionadas de la tabla de resultados de búsqueda por coordenadas
     def clear_selection(self) -> None:
-        selected_rows = self.table_widget.selectionModel().selectedRows()
-        for index in sorted(selected_rows, reverse=True):
-            self.table_widget.removeRow(index.row())
-            if index.row() < len(self.results):
-                del self.results[index.row()]
-            if index.row() < len(self.reverse_results):
-                del self.reverse_results[index.row()]
+        rows = [index.row() for index in self.table_widget.selectionModel().selectedRows()]
+        self.store.remove(self.model.payload(row) for row in rows)
+        self.model.remove_rows(rows)
     # Crea una capa a partir de las filas seleccionadas en la tabla de resultados de búsqueda por coordenadas
     def create_reverse_layer(self, base_layer_name, geometry_type, data_list):
-        excluded_attributes = ['state', 'stateMsg', 'countryCode', 'x', 'y', 'noNumber']
+        if accumulate_enabled():
+            self.add_to_accumulated_layer(data_list)
+            return
+
+        excluded_attributes = REVERSE_EXCLUDED_KEYS
 
-        root = QgsProject.instance().layerTreeRoot()
-        group = root.findGroup("Resultados_reverse")
-        if not group:
-            group = root.addGroup("Resultados_reverse")
+        group = layer_group(REVERSE_GROUP)
 
         last_layer = None
 
@@ -357,28 +347,11 @@ class ReverseCoding:
             layer = QgsVectorLayer("Point?crs=EPSG:4326", layer_name, "memory")
             pr = layer.dataProvider()
 
-            fields = QgsFields()
-            for key, value in data.items():
-                if key in excluded_attributes or key == "geom":
-                    continue
-                if isinstance(value, int):
-                    field_type = QMetaType.Type.Int
-                elif isinstance(value, float):
-                    field_type = QMetaType.Type.Double
-                elif isinstance(value, bool):
-                    field_type = QMetaType.Type.Bool
-                else:
-                    field_type = QMetaType.Type.QString
-                fields.append(QgsField(key, type=field_type))
-
-            pr.addAttributes(fields)
+            schema = compiled_schema('reverse', data, excluded_attributes)
+            pr.addAttributes(schema.fields)
             layer.updateFields()
 
-            base_path = os.path.dirname(__file__)
-            qml_path = os.path.join(base_path, 'estilos', 'Reverse.qml')
-            if os.path.exists(qml_path):
-                layer.loadNamedStyle(qml_path)
-                layer.triggerRepaint()
+            apply_style(layer, REVERSE_GROUP)
 
             print("geom WKT:", data.get("geom"))
 
@@ -387,10 +360,7 @@ class ReverseCoding:
                 print("No se encontró geometría WKT en los datos.")
                 continue
 
-            feature = QgsFeature()
-            feature.setGeometry(QgsGeometry.fromWkt(geom_wkt))
-            feature.setAttributes([data.get(field.name(), "") for field in fields])
-            pr.addFeature(feature)
+            pr.addFeatures([schema.feature(QgsGeometry.fromWkt(geom_wkt), data)])
             layer.updateExtents()
 
             QgsProject.instance().addMapLayer(layer, False)
@@ -402,42 +372,18 @@ class ReverseCoding:
 
         if last_layer is not None:
             self.zoom_to_layer(last_layer)
-    #Crea los atributos de la capa a partir de los datos obtenidos de la API de Cartociudad para la búsqueda por coordenadas
-    def create_attributes_from_json(self, location: Dict[str, Union[str, int, float]]) -> None:
-        self.fields = QgsFields()
-        excluded_attributes = ['stateMsg', 'state', 'countryCode']
-
-        for attribute, value in location.items():
-            if attribute != 'geom' and attribute not in excluded_attributes:
-                if isinstance(value, int):
-                    field_type = QMetaType.Type.Int
-                elif isinstance(value, float):
-                    field_type = QMetaType.Type.Double
-                elif isinstance(value, bool):
-                    field_type = QMetaType.Type.Bool
-                else:
-                    field_type = QMetaType.Type.QString
-                self.fields.append(QgsField(attribute, type=field_type))
-    #Añade una característica a la capa creada a partir de los datos obtenidos de la API de Cartociudad 
-    def add_feature_to_layer(self, attributes: Dict[str, Union[str, int, float]], layer_name: str) -> None:
-        layer = self.layers[layer_name]
-        if layer and layer.isValid():
-            feature = QgsFeature()
-            feature.setFields(self.fields)
-
-            for attribute, value in attributes.items():
-                if attribute in ['stateMsg', 'state', 'countryCode']:
-                    continue
-
-                if attribute == 'geom':
-                    geom = QgsGeometry.fromWkt(value)
-                    feature.setGeometry(geom)
-                else:
-                    feature.setAttribute(attribute, value if value is not None else '')
-
-            pr = layer.dataProvider()
-            pr.addFeature(feature)
-            layer.updateExtents()
+    # Modo acumulado: añade todas las filas seleccionadas a una única capa de resultados con un solo addFeatures
+    def add_to_accumulated_layer(self, data_list) -> None:
+        layer = None
+        for data in data_list:
+            if not data or not data.get("geom"):
+                continue
+            layer = self.accumulator.add(
+                REVERSE_GROUP, '', QgsGeometry.fromWkt(data["geom"]), data, REVERSE_EXCLUDED_KEYS
+            )
+        self.accumulator.flush()
+        if layer is not None:
+            self.zoom_to_layer(layer)
     # Reproyecta el extent de la capa al sistema de referencia del proyecto para poder hacer zoom 
     def reproject_extent(
         self,
@@ -0,0 +1,229 @@
+# Caché espacial de las respuestas de reverseGeocode: una consulta reutiliza la respuesta guardada de cualquier punto
+# a menos de la tolerancia, en lugar de depender de que la URL (lon/lat con todos sus decimales) sea idéntica.
+# También registra las peticiones en curso, para que los puntos cercanos que llegan mientras tanto esperen a esa
+# respuesta en lugar de lanzar la suya
+
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Declaración de constantes
+DEFAULT_TOLERANCE_M = 5.0
+DEFAULT_MAX_ENTRIES = 10000
+TOUCH_BATCH = 500
+METERS_PER_DEGREE = 111320.0
+
+Point = Tuple[float, float]
+Cell = Tuple[int, int]
+
+
+# Distancia aproximada en metros entre dos puntos lon/lat (proyección equirectangular, suficiente a escala de metros)
+def distance_m(a: Point, b: Point) -> float:
+    dx = (b[0] - a[0]) * math.cos(math.radians((a[1] + b[1]) / 2)) * METERS_PER_DEGREE
+    dy = (b[1] - a[1]) * METERS_PER_DEGREE
+    return math.hypot(dx, dy)
+
+
+# Rejilla de celdas del tamaño de la tolerancia: en latitud cada fila mide lo mismo y en longitud la anchura de la
+# celda se ajusta a la latitud de la fila, así un punto dentro de la tolerancia siempre está en las 3x3 celdas vecinas
+class Grid:
+    def __init__(self, tolerance_m: float) -> None:
+        self.step = tolerance_m / METERS_PER_DEGREE
+
+    def _width(self, row: int) -> float:
+        return self.step / max(math.cos(math.radians((row + 0.5) * self.step)), 0.01)
+
+    def cell(self, lon: float, lat: float) -> Cell:
+        row = math.floor(lat / self.step)
+        return math.floor(lon / self._width(row)), row
+
+    def neighbours(self, lon: float, lat: float) -> List[Cell]:
+        center = math.floor(lat / self.step)
+        cells = []
+        for row in (center - 1, center, center + 1):
+            column = math.floor(lon / self._width(row))
+            cells.extend(((column - 1, row), (column, row), (column + 1, row)))
+        return cells
+
+
+# Respuestas por punto en memoria (rejilla + orden LRU) y en SQLite para conservarlas entre sesiones.
+# Cuando se supera el número máximo de puntos se expulsan los de uso más antiguo de ambos sitios. Los aciertos
+# solo actualizan el orden en memoria; la fecha de uso en disco se escribe por lotes (en put, cada TOUCH_BATCH
+# aciertos y al cerrar)
+class ReverseCache:
+    def __init__(
+        self,
+        path: str,
+        tolerance_m: float = DEFAULT_TOLERANCE_M,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        self.path = path
+        self.tolerance = tolerance_m
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.grid = Grid(tolerance_m)
+        self.cells: Dict[Cell, List[Point]] = {}
+        self.entries: 'OrderedDict[Point, bytes]' = OrderedDict()
+        self.touched: Dict[Point, float] = {}
+        self.pending_cells: Dict[Cell, List[Point]] = {}
+        self.pending: Dict[Point, Any] = {}
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS points ('
+            'lon REAL NOT NULL, lat REAL NOT NULL, body BLOB NOT NULL, accessed REAL NOT NULL, '
+            'PRIMARY KEY (lon, lat))'
+        )
+        # Se cargan en memoria los puntos de uso más reciente y se descartan los que ya no caben
+        limit = max_entries if max_entries > 0 else -1
+        self._conn.execute(
+            'DELETE FROM points WHERE rowid NOT IN (SELECT rowid FROM points ORDER BY accessed DESC LIMIT ?)', (limit,)
+        )
+        self._conn.commit()
+        rows = self._conn.execute('SELECT lon, lat, body FROM points ORDER BY accessed').fetchall()
+        for lon, lat, body in rows:
+            self._add((lon, lat), bytes(body))
+
+    # Respuesta del punto guardado más cercano a menos de la tolerancia, o None
+    def get(self, lon: float, lat: float) -> Optional[bytes]:
+        point = (float(lon), float(lat))
+        with self._lock:
+            return self._get(point)
+
+    # Como get, pero si el punto no está guardado busca una petición en curso a menos de la tolerancia.
+    # Devuelve (respuesta, None) si está guardado, (None, token de la petición en curso) para unirse a ella o
+    # (None, None) si no hay ninguna; en ese caso token queda registrado como la petición en curso del punto
+    # hasta que se llame a release
+    def claim(self, lon: float, lat: float, token: Any) -> Tuple[Optional[bytes], Any]:
+        point = (float(lon), float(lat))
+        with self._lock:
+            body = self._get(point)
+            if body is not None:
+                return body, None
+            nearest = self._nearest(self.pending_cells, point)
+            if nearest is not None:
+                return None, self.pending[nearest]
+            self.pending[point] = token
+            self.pending_cells.setdefault(self.grid.cell(*point), []).append(point)
+            return None, None
+
+    # Da por terminada la petición en curso de un punto registrada con claim
+    def release(self, lon: float, lat: float, token: Any) -> None:
+        point = (float(lon), float(lat))
+        with self._lock:
+            if self.pending.get(point) is not token:
+                return
+            del self.pending[point]
+            self._unindex(self.pending_cells, point)
+
+    # Guarda la respuesta de un punto y expulsa los puntos de uso más antiguo si se supera el máximo
+    def put(self, lon: float, lat: float, body: bytes) -> None:
+        point = (float(lon), float(lat))
+        with self._lock:
+            if point in self.entries:
+                self.entries.move_to_end(point)
+                self.entries[point] = body
+            else:
+                self._add(point, body)
+            self.touched.pop(point, None)
+            self._write_touched()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO points (lon, lat, body, accessed) VALUES (?, ?, ?, ?)',
+                (point[0], point[1], sqlite3.Binary(body), time.time())
+            )
+            if self.max_entries > 0 and len(self.entries) > self.max_entries:
+                self._evict(len(self.entries) - self.max_entries)
+            self._conn.commit()
+
+    # Cambia la tolerancia reconstruyendo la rejilla, porque el tamaño de las celdas depende de ella
+    def set_tolerance(self, tolerance_m: float) -> None:
+        with self._lock:
+            if tolerance_m == self.tolerance:
+                return
+            self.tolerance = tolerance_m
+            self.grid = Grid(tolerance_m)
+            self.cells = {}
+            for point in self.entries:
+                self.cells.setdefault(self.grid.cell(*point), []).append(point)
+            self.pending_cells = {}
+            for point in self.pending:
+                self.pending_cells.setdefault(self.grid.cell(*point), []).append(point)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM points')
+            self._conn.commit()
+            self._conn.execute('VACUUM')
+            self.cells = {}
+            self.entries.clear()
+            self.touched.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+            self._conn.close()
+
+    def _get(self, point: Point) -> Optional[bytes]:
+        nearest = self._nearest(self.cells, point)
+        if nearest is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(nearest)
+        self.touched[nearest] = time.time()
+        if len(self.touched) >= TOUCH_BATCH:
+            self._write_touched()
+            self._conn.commit()
+        self.hits += 1
+        return self.entries[nearest]
+
+    # Punto de una rejilla (guardados o en curso) más cercano a menos de la tolerancia, o None
+    def _nearest(self, cells: Dict[Cell, List[Point]], point: Point) -> Optional[Point]:
+        nearest = None
+        best = self.tolerance
+        for cell in self.grid.neighbours(*point):
+            for candidate in cells.get(cell, ()):
+                distance = distance_m(point, candidate)
+                if distance <= best:
+                    nearest, best = candidate, distance
+        return nearest
+
+    def _add(self, point: Point, body: bytes) -> None:
+        self.entries[point] = body
+        self.cells.setdefault(self.grid.cell(*point), []).append(point)
+
+    def _unindex(self, cells: Dict[Cell, List[Point]], point: Point) -> None:
+        cell = self.grid.cell(*point)
+        points = cells[cell]
+        points.remove(point)
+        if not points:
+            del cells[cell]
+
+    # Escribe en disco las fechas de uso pendientes; el commit lo hace quien llama
+    def _write_touched(self) -> None:
+        if not self.touched:
+            return
+        self._conn.executemany(
+            'UPDATE points SET accessed = ? WHERE lon = ? AND lat = ?',
+            [(accessed, lon, lat) for (lon, lat), accessed in self.touched.items()]
+        )
+        self.touched.clear()
+
+    def _evict(self, count: int) -> None:
+        evicted = []
+        for _ in range(count):
+            point, _ = self.entries.popitem(last=False)
+            self._unindex(self.cells, point)
+            self.touched.pop(point, None)
+            evicted.append(point)
+        self._conn.executemany('DELETE FROM points WHERE lon = ? AND lat = ?', evicted)
@@ -0,0 +1,146 @@
+# Almacén de los resultados de la búsqueda por coordenadas. Cada respuesta se guarda una sola vez como un registro
+# compacto (claves compartidas entre registros, valores en tupla y punto como dos números) y la tabla y las capas
+# lo referencian por su identificador. Con un límite de registros en memoria, los más antiguos se vuelcan a disco
+
+import json
+import re
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Declaración de constantes
+DEFAULT_MEMORY_RECORDS = 5000
+QUERY_BATCH = 500
+POINT_WKT = re.compile(r'^\s*POINT\s*\(\s*(\S+)\s+(\S+)\s*\)\s*$', re.IGNORECASE)
+
+
+# Registro de una respuesta: values es None cuando sus valores están volcados a disco; geom solo se guarda
+# como texto si no es un punto simple
+class ReverseRecord:
+    __slots__ = ('id', 'keys', 'values', 'x', 'y', 'geom')
+
+    def __init__(
+        self,
+        record_id: int,
+        keys: Tuple[str, ...],
+        values: Optional[Tuple[Any, ...]],
+        x: Optional[float],
+        y: Optional[float],
+        geom: Optional[str]
+    ) -> None:
+        self.id = record_id
+        self.keys = keys
+        self.values = values
+        self.x = x
+        self.y = y
+        self.geom = geom
+
+
+class ReverseResultStore:
+    def __init__(self, max_records: int = DEFAULT_MEMORY_RECORDS) -> None:
+        self.max_records = max_records
+        self.records: Dict[int, ReverseRecord] = {}
+        self.in_memory: 'OrderedDict[int, None]' = OrderedDict()
+        self.key_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self.next_id = 1
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    # Guarda una respuesta de reverseGeocode y devuelve su identificador
+    def add(self, data: Dict[str, Any]) -> int:
+        keys = tuple(data)
+        keys = self.key_sets.setdefault(keys, keys)
+        x = y = geom = None
+        wkt = data.get('geom')
+        match = POINT_WKT.match(wkt) if isinstance(wkt, str) else None
+        if match is not None:
+            try:
+                x, y = float(match.group(1)), float(match.group(2))
+            except ValueError:
+                geom = wkt
+        else:
+            geom = wkt
+        values = tuple(None if key == 'geom' else data[key] for key in keys)
+
+        record_id = self.next_id
+        self.next_id += 1
+        self.records[record_id] = ReverseRecord(record_id, keys, values, x, y, geom)
+        self.in_memory[record_id] = None
+        if 0 < self.max_records < len(self.in_memory):
+            self._spill(len(self.in_memory) - self.max_records)
+        return record_id
+
+    # Respuesta completa de un registro, leída de disco si estaba volcada
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        found = self.get_many([record_id])
+        return found[0] if found else None
+
+    # Respuestas de varios registros en el orden pedido; los volcados se leen con consultas de QUERY_BATCH
+    def get_many(self, record_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        records = [self.records[record_id] for record_id in record_ids if record_id in self.records]
+        spilled = [record.id for record in records if record.values is None]
+        stored: Dict[int, Tuple[List[Any], Optional[str]]] = {}
+        for start in range(0, len(spilled), QUERY_BATCH):
+            chunk = spilled[start:start + QUERY_BATCH]
+            marks = ', '.join('?' for _ in chunk)
+            rows = self._conn.execute(f'SELECT id, data FROM records WHERE id IN ({marks})', chunk).fetchall()
+            stored.update((record_id, json.loads(text)) for record_id, text in rows)
+
+        results = []
+        for record in records:
+            if record.values is not None:
+                values, geom = record.values, record.geom
+            else:
+                values, geom = stored[record.id]
+            data = dict(zip(record.keys, values))
+            if 'geom' in data:
+                data['geom'] = f'POINT({record.x!r} {record.y!r})' if record.x is not None else geom
+            results.append(data)
+        return results
+
+    # Elimina registros de la memoria y, si estaban volcados, también del disco
+    def remove(self, record_ids: Iterable[int]) -> None:
+        spilled = []
+        for record_id in record_ids:
+            record = self.records.pop(record_id, None)
+            if record is None:
+                continue
+            if record.values is None:
+                spilled.append((record_id,))
+            else:
+                del self.in_memory[record_id]
+        if spilled:
+            self._conn.executemany('DELETE FROM records WHERE id = ?', spilled)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        self.records.clear()
+        self.in_memory.clear()
+        self.key_sets.clear()
+        self.close()
+
+    # Cierra la base de datos temporal; SQLite la borra al cerrar la conexión
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # Vuelca a disco los registros más antiguos que siguen en memoria: al menos count y una décima parte del
+    # límite, para no escribir en disco en cada respuesta una vez alcanzado
+    def _spill(self, count: int) -> None:
+        if self._conn is None:
+            # Con nombre vacío SQLite crea una base de datos temporal en disco privada de la conexión
+            self._conn = sqlite3.connect('')
+            self._conn.execute('CREATE TABLE records (id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+        rows = []
+        for _ in range(min(len(self.in_memory), max(count, self.max_records // 10))):
+            record_id, _ = self.in_memory.popitem(last=False)
+            record = self.records[record_id]
+            rows.append((record_id, json.dumps([record.values, record.geom], ensure_ascii=False)))
+            record.values = None
+            record.geom = None
+        self._conn.executemany('INSERT INTO records (id, data) VALUES (?, ?)', rows)
+        self._conn.commit()
@@ -0,0 +1,217 @@
+# Dialogo de configuración del plugin
+
+import os
+import time
+
+from qgis.PyQt.QtWidgets import (
+    QDialog, QVBoxLayout, QFormLayout, QCheckBox, QDoubleSpinBox, QSpinBox, QLabel, QPushButton,
+    QDialogButtonBox, QGroupBox, QMessageBox
+)
+from qgis.PyQt.QtCore import QSettings
+from qgis import processing
+
+from .cache import DEFAULT_TTL_DAYS, DEFAULT_MAX_MB
+from .network import SETTINGS_PREFIX, DEFAULT_RATE, DEFAULT_MAX_IN_FLIGHT, geocoder_client
+from .reverse_store import DEFAULT_MEMORY_RECORDS
+from .reverse_cache import DEFAULT_TOLERANCE_M, DEFAULT_MAX_ENTRIES
+from .boundaries import boundary_pack_path
+
+
+# Configuración de los límites de peticiones al servicio, de la caché de respuestas
+# (activación, caducidad, tamaño máximo, tolerancia por coordenadas, estadísticas y vaciado), del modo de las capas de resultados y del
+# número de resultados por coordenadas que se guardan en memoria, y construcción del paquete de límites
+# administrativos
+class SettingsDialog(QDialog):
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle("Configuración - Geocoder CartoCiudad")
+        layout = QVBoxLayout(self)
+        settings = QSettings()
+
+        cache_group = QGroupBox("Caché de respuestas (candidates, find y reverseGeocode)")
+        form = QFormLayout(cache_group)
+
+        self.cache_enabled = QCheckBox("Guardar las respuestas en disco")
+        self.cache_enabled.setChecked(settings.value(f'{SETTINGS_PREFIX}/cache_enabled', True, type=bool))
+        form.addRow(self.cache_enabled)
+
+        self.cache_ttl = QDoubleSpinBox()
+        self.cache_ttl.setRange(0, 3650)
+        self.cache_ttl.setDecimals(1)
+        self.cache_ttl.setSuffix(" días")
+        self.cache_ttl.setSpecialValueText("Sin caducidad")
+        self.cache_ttl.setValue(settings.value(f'{SETTINGS_PREFIX}/cache_ttl_days', DEFAULT_TTL_DAYS, type=float))
+        form.addRow("Caducidad:", self.cache_ttl)
+
+        self.cache_max = QDoubleSpinBox()
+        self.cache_max.setRange(1, 10240)
+        self.cache_max.setDecimals(0)
+        self.cache_max.setSuffix(" MB")
+        self.cache_max.setValue(settings.value(f'{SETTINGS_PREFIX}/cache_max_mb', DEFAULT_MAX_MB, type=float))
+        form.addRow("Tamaño máximo:", self.cache_max)
+
+        self.reverse_tolerance = QDoubleSpinBox()
+        self.reverse_tolerance.setRange(0, 1000)
+        self.reverse_tolerance.setDecimals(1)
+        self.reverse_tolerance.setSuffix(" m")
+        self.reverse_tolerance.setSpecialValueText("Desactivada")
+        self.reverse_tolerance.setToolTip(
+            "La búsqueda por coordenadas reutiliza la respuesta de un punto ya consultado a menos de esta distancia"
+        )
+        self.reverse_tolerance.setValue(
+            settings.value(f'{SETTINGS_PREFIX}/reverse_tolerance_m', DEFAULT_TOLERANCE_M, type=float)
+        )
+        form.addRow("Tolerancia por coordenadas:", self.reverse_tolerance)
+
+        self.reverse_entries = QSpinBox()
+        self.reverse_entries.setRange(0, 1000000)
+        self.reverse_entries.setSingleStep(1000)
+        self.reverse_entries.setSpecialValueText("Sin límite")
+        self.reverse_entries.setValue(
+            settings.value(f'{SETTINGS_PREFIX}/reverse_cache_entries', DEFAULT_MAX_ENTRIES, type=int)
+        )
+        form.addRow("Puntos guardados:", self.reverse_entries)
+
+        self.stats_label = QLabel()
+        form.addRow("Estadísticas:", self.stats_label)
+
+        clear_button = QPushButton("Vaciar caché")
+        clear_button.clicked.connect(self.clear_cache)
+        form.addRow(clear_button)
+
+        layout.addWidget(cache_group)
+
+        limits_group = QGroupBox("Límites de peticiones al servicio")
+        limits_form = QFormLayout(limits_group)
+
+        self.rate = QDoubleSpinBox()
+        self.rate.setRange(0, 1000)
+        self.rate.setDecimals(1)
+        self.rate.setSuffix(" peticiones/s")
+        self.rate.setSpecialValueText("Sin límite")
+        self.rate.setValue(settings.value(f'{SETTINGS_PREFIX}/rate_per_second', DEFAULT_RATE, type=float))
+        limits_form.addRow("Ritmo máximo:", self.rate)
+
+        self.max_in_flight = QSpinBox()
+        self.max_in_flight.setRange(0, 64)
+        self.max_in_flight.setSpecialValueText("Sin límite")
+        self.max_in_flight.setValue(
+            settings.value(f'{SETTINGS_PREFIX}/max_in_flight', DEFAULT_MAX_IN_FLIGHT, type=int)
+        )
+        limits_form.addRow("Peticiones simultáneas:", self.max_in_flight)
+
+        layout.addWidget(limits_group)
+
+        layers_group = QGroupBox("Capas de resultados")
+        layers_form = QFormLayout(layers_group)
+
+        self.accumulate_layers = QCheckBox("Acumular los resultados en una capa por tipo de elemento")
+        self.accumulate_layers.setToolTip(
+            "Añade cada resultado a una capa única de su tipo (Viales, Portales_pk, Municipios...) "
+            "en lugar de crear una capa por resultado"
+        )
+        self.accumulate_layers.setChecked(
+            settings.value(f'{SETTINGS_PREFIX}/accumulate_layers', False, type=bool)
+        )
+        layers_form.addRow(self.accumulate_layers)
+
+        self.reverse_memory = QSpinBox()
+        self.reverse_memory.setRange(0, 1000000)
+        self.reverse_memory.setSingleStep(1000)
+        self.reverse_memory.setSpecialValueText("Sin límite")
+        self.reverse_memory.setToolTip(
+            "Resultados de la búsqueda por coordenadas que se mantienen en memoria; "
+            "los más antiguos se guardan en un archivo temporal"
+        )
+        self.reverse_memory.setValue(
+            settings.value(f'{SETTINGS_PREFIX}/reverse_memory_records', DEFAULT_MEMORY_RECORDS, type=int)
+        )
+        layers_form.addRow("Resultados por coordenadas en memoria:", self.reverse_memory)
+
+        layout.addWidget(layers_group)
+
+        boundaries_group = QGroupBox("Límites administrativos (consultas sin conexión)")
+        boundaries_form = QFormLayout(boundaries_group)
+
+        self.boundaries_label = QLabel()
+        self.boundaries_label.setWordWrap(True)
+        boundaries_form.addRow("Paquete:", self.boundaries_label)
+
+        self.build_button = QPushButton("Construir paquete desde el servicio...")
+        self.build_button.setToolTip(
+            "Abre el algoritmo de Processing que crea el paquete con los polígonos de find de cada unidad"
+        )
+        self.build_button.clicked.connect(self.build_boundaries)
+        boundaries_form.addRow(self.build_button)
+
+        layout.addWidget(boundaries_group)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.update_stats()
+        self.update_boundaries()
+
+    # Muestra el número de entradas, el tamaño y la tasa de aciertos de la caché
+    def update_stats(self) -> None:
+        cache = geocoder_client().cache
+        if cache is None:
+            self.stats_label.setText("Caché desactivada")
+            return
+        stats = cache.stats()
+        total = stats['hits'] + stats['misses']
+        rate = 100.0 * stats['hits'] / total if total else 0.0
+        text = (
+            f"{stats['entries']} respuestas, {stats['bytes'] / (1024 * 1024):.1f} MB\n"
+            f"{stats['hits']} aciertos, {stats['misses']} fallos ({rate:.0f} % de aciertos)"
+        )
+        reverse_cache = geocoder_client().reverse_cache
+        if reverse_cache is not None:
+            text += (
+                f"\nPor coordenadas: {len(reverse_cache.entries)} puntos, "
+                f"{reverse_cache.hits} aciertos en esta sesión"
+            )
+        self.stats_label.setText(text)
+
+    def clear_cache(self) -> None:
+        cache = geocoder_client().cache
+        if cache is not None:
+            cache.clear()
+        reverse_cache = geocoder_client().reverse_cache
+        if reverse_cache is not None:
+            reverse_cache.clear()
+        self.update_stats()
+        QMessageBox.information(self, "Caché de respuestas", "Se ha vaciado la caché.")
+
+    # Muestra si hay paquete de límites administrativos y su fecha
+    def update_boundaries(self) -> None:
+        path = boundary_pack_path()
+        if not os.path.exists(path):
+            self.boundaries_label.setText("No construido")
+            return
+        modified = time.strftime('%d/%m/%Y', time.localtime(os.path.getmtime(path)))
+        self.boundaries_label.setText(f"{os.path.getsize(path) / (1024 * 1024):.1f} MB, actualizado el {modified}")
+
+    # Abre el algoritmo que construye el paquete con find; al cerrarlo se actualiza el estado del paquete
+    def build_boundaries(self) -> None:
+        processing.execAlgorithmDialog('cartociudad:buildboundaries', {})
+        self.update_boundaries()
+
+    # Guarda la configuración y la aplica al cliente de red
+    def accept(self) -> None:
+        settings = QSettings()
+        settings.setValue(f'{SETTINGS_PREFIX}/cache_enabled', self.cache_enabled.isChecked())
+        settings.setValue(f'{SETTINGS_PREFIX}/cache_ttl_days', self.cache_ttl.value())
+        settings.setValue(f'{SETTINGS_PREFIX}/cache_max_mb', self.cache_max.value())
+        settings.setValue(f'{SETTINGS_PREFIX}/reverse_tolerance_m', self.reverse_tolerance.value())
+        settings.setValue(f'{SETTINGS_PREFIX}/reverse_cache_entries', self.reverse_entries.value())
+        settings.setValue(f'{SETTINGS_PREFIX}/rate_per_second', self.rate.value())
+        settings.setValue(f'{SETTINGS_PREFIX}/max_in_flight', self.max_in_flight.value())
+        settings.setValue(f'{SETTINGS_PREFIX}/accumulate_layers', self.accumulate_layers.isChecked())
+        settings.setValue(f'{SETTINGS_PREFIX}/reverse_memory_records', self.reverse_memory.value())
+        geocoder_client().reload_settings()
+        super().accept()